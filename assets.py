@@ -0,0 +1,158 @@
+import os
+import pygame
+
+'''
+The assets module loads and keeps everything the game window draws that
+does not change from frame to frame: the piece images, the board's
+background and grid lines, and the fonts and rendered lines of text. Images
+are loaded with pygame.image.load the first time they are asked for (not
+when the module is imported) and converted to the display's pixel format
+with convert_alpha, so that blitting them is a plain copy. They are found
+next to this file, whatever directory the game is started from.
+
+Everything that depends on the size of the window is made once per size and
+kept: the piece images scaled to fit a square, and the background with its
+squares and lines drawn at that size. Only the MAX_SIZES sizes used most
+recently are kept, so dragging the edge of the window does not keep every
+size it passed through. Fonts and rendered lines of text are kept too, and
+are dropped all at once if more than MAX_TEXTS of them pile up.
+'''
+
+IMAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_FILES = {'CPU': 'cpu_piece.png', 'CPU_KING': 'cpu_king.PNG',
+               'USER': 'user_piece.PNG', 'USER_KING': 'user_king.PNG'}
+MAX_SIZES = 4
+MAX_TEXTS = 64
+
+RED = (255, 0, 0)
+BLACK = (0, 0, 0)
+YELLOW = (255, 233, 0)
+
+images = {}
+sized = {}
+fonts = {}
+texts = {}
+
+
+'''
+This function converts a surface to the display's pixel format, keeping its
+transparency. Before the display is set up it is returned unchanged.
+'''
+def for_display(image):
+    if pygame.display.get_surface() is None:
+        return image
+    return image.convert_alpha()
+
+
+def load_image(type):
+    image = images.get(type)
+    if image is None:
+        image = for_display(pygame.image.load(
+            os.path.join(IMAGE_DIR, IMAGE_FILES[type])))
+        images[type] = image
+    return image
+
+
+'''
+This function returns the dictionary of things drawn at the given square
+size, making it the most recently used size and forgetting the least
+recently used one if there are more than MAX_SIZES.
+'''
+def size_cache(square):
+    cache = sized.pop(square, None)
+    if cache is None:
+        cache = {}
+        if len(sized) >= MAX_SIZES:
+            del sized[next(iter(sized))]
+    sized[square] = cache
+    return cache
+
+
+'''
+A piece is drawn inset from the edges of its square by this many pixels.
+'''
+def icon_offset(square):
+    return square // 20
+
+
+'''
+This function returns the image of a piece of the given type ('USER',
+'CPU', 'USER_KING' or 'CPU_KING') scaled to fit a square of the given size,
+or at its own size if square is None.
+'''
+def get_icon(type, square=None):
+    if square is None:
+        return load_image(type)
+    cache = size_cache(square)
+    icon = cache.get(type)
+    if icon is None:
+        image = load_image(type)
+        size = square - 2 * icon_offset(square)
+        if image.get_size() == (size, size):
+            icon = image
+        else:
+            icon = for_display(pygame.transform.smoothscale(image,
+                                                            (size, size)))
+        cache[type] = icon
+    return icon
+
+
+'''
+This function returns the board drawn at the given square size as two
+surfaces: the background (the red and black squares with the yellow lines
+over them) and the lines on their own on a transparent layer, so that they
+can be drawn back over a highlighted square.
+'''
+def board_layers(square):
+    cache = size_cache(square)
+    layers = cache.get('board')
+    if layers is not None:
+        return layers
+    size = 8 * square
+    background = pygame.Surface((size, size))
+    background.fill(BLACK)
+    for i in range(8):
+        for j in range(8):
+            if (i + j) % 2 == 0:
+                background.fill(RED,
+                                rect=(j * square, i * square, square, square))
+    thin = max(1, square // 50)
+    thick = max(2, square // 20)
+    lines = pygame.Surface((size, size), pygame.SRCALPHA)
+    for i in range(square, size, square):
+        pygame.draw.line(lines, YELLOW, (0, i), (size, i), thin)
+        pygame.draw.line(lines, YELLOW, (i, 0), (i, size), thin)
+    pygame.draw.line(lines, YELLOW, (0, 0), (0, size), thick)
+    pygame.draw.line(lines, YELLOW, (0, size), (size, size), thick)
+    pygame.draw.line(lines, YELLOW, (size, size), (size, 0), thick)
+    pygame.draw.line(lines, YELLOW, (size, 0), (0, 0), thick)
+    background.blit(lines, (0, 0))
+    if pygame.display.get_surface() is not None:
+        background = background.convert()
+        lines = lines.convert_alpha()
+    layers = (background, lines)
+    cache['board'] = layers
+    return layers
+
+
+def get_font(size, bold=False):
+    font = fonts.get((size, bold))
+    if font is None:
+        if len(fonts) >= MAX_TEXTS:
+            fonts.clear()
+        font = pygame.font.SysFont('verdana', size, bold=bold)
+        fonts[(size, bold)] = font
+    return font
+
+
+'''
+This function returns text rendered in black in the given font size.
+'''
+def get_text(text, size, bold=False):
+    rendered = texts.get((text, size, bold))
+    if rendered is None:
+        if len(texts) >= MAX_TEXTS:
+            texts.clear()
+        rendered = get_font(size, bold).render(text, True, BLACK)
+        texts[(text, size, bold)] = rendered
+    return rendered
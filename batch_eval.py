@@ -0,0 +1,180 @@
+import sys
+import time
+import random
+import numpy as np
+from bitboard import BitBoard, ROWS, FORWARD, OPPOSITE, step, FULL
+from position_io import RECORD_SIZE, pack_position
+from evaluation import FEATURES, BACK_RANK, Evaluator
+
+'''
+The batch_eval module scores many positions at once with NumPy. It needs
+numpy (pip install numpy); nothing else in the game imports it unless asked
+to.
+
+Positions are held as an (n, 4) array of uint32: the user, CPU and kings
+masks and a flags word whose lowest bit is 1 when it is the CPU's turn.
+This is the packed record of position_io.py, so a file of packed positions
+can be evaluated straight from its memory map (see from_buffer). The
+features are those of evaluation.py, worked out on the masks of every
+position at once with shifts, ANDs and population counts, and the score is
+their sum weighted as in evaluation.Evaluator, from the point of view of the
+side to move as in search.evaluate.
+'''
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(a):
+        return np.bitwise_count(a).astype(np.int64)
+else:
+    def popcount(a):
+        a = a - ((a >> 1) & 0x55555555)
+        a = (a & 0x33333333) + ((a >> 2) & 0x33333333)
+        a = (a + (a >> 4)) & 0x0F0F0F0F
+        return ((a * 0x01010101) & FULL) >> 24
+
+
+def encode(bitboards):
+    return np.array([(b.user, b.cpu, b.kings, b.side == 'CPU')
+                     for b in bitboards], dtype=np.uint32).reshape(-1, 4)
+
+
+'''
+This function returns a packed position buffer (bytes, a memory map or a
+memoryview of one) as an (n, 4) array without copying it.
+'''
+def from_buffer(buffer):
+    count = len(buffer) // RECORD_SIZE
+    return np.frombuffer(buffer, dtype='<u4',
+                         count=count * 4).reshape(count, 4)
+
+
+def mobility(own, kings, empty, side):
+    moves = 0
+    for d in range(4):
+        candidates = own if d in FORWARD[side] else own & kings
+        moves = moves + popcount(candidates & step(empty, OPPOSITE[d]))
+    return moves
+
+
+'''
+This function returns an (n, len(FEATURES)) int64 array of the terms of
+each position in positions, an (n, 4) uint32 array.
+'''
+def features(positions):
+    user = positions[:, 0]
+    cpu = positions[:, 1]
+    kings = positions[:, 2]
+    not_kings = ~kings
+    user_men = user & not_kings
+    cpu_men = cpu & not_kings
+    empty = ~(user | cpu)
+    out = np.empty((len(positions), len(FEATURES)), dtype=np.int64)
+    out[:, 0] = popcount(user_men) - popcount(cpu_men)
+    out[:, 1] = popcount(user & kings) - popcount(cpu & kings)
+    advance = 0
+    for r in range(8):
+        advance = advance + (7 - r) * popcount(user_men & ROWS[r]) - \
+            r * popcount(cpu_men & ROWS[r])
+    out[:, 2] = advance
+    out[:, 3] = popcount(user_men & BACK_RANK['USER']) - \
+        popcount(cpu_men & BACK_RANK['CPU'])
+    out[:, 4] = mobility(user, kings, empty, 'USER') - \
+        mobility(cpu, kings, empty, 'CPU')
+    return out
+
+
+'''
+The BatchEvaluator class is an evaluation.Evaluator that can also score
+many positions at once. evaluate_batch scores an (n, 4) array of positions,
+evaluate (from Evaluator) scores one BitBoard and child_scores scores every
+position reached by moves from a BitBoard in one batch, which the search
+uses to evaluate all the children of a node at once (see Search.negamax).
+'''
+
+
+class BatchEvaluator(Evaluator):
+    def __init__(self, weights=None):
+        Evaluator.__init__(self, weights)
+        self.array = np.array(self.vector, dtype=np.int64)
+        self.batches = 0
+        self.positions = 0
+
+    def evaluate_batch(self, positions):
+        self.batches += 1
+        self.positions += len(positions)
+        scores = features(positions) @ self.array
+        return np.where(positions[:, 3] & 1, -scores, scores)
+
+    '''
+    This function returns a dictionary mapping the hash of each position
+    reached by one of moves from bitboard to its score for the side to move
+    there.
+    '''
+    def child_scores(self, bitboard, moves):
+        rows = []
+        keys = []
+        for move in moves:
+            undo = bitboard.make_move(move)
+            rows.append((bitboard.user, bitboard.cpu, bitboard.kings,
+                         bitboard.side == 'CPU'))
+            keys.append(bitboard.key)
+            bitboard.unmake_move(undo)
+        positions = np.array(rows, dtype=np.uint32)
+        return dict(zip(keys, self.evaluate_batch(positions).tolist()))
+
+
+'''
+This function returns count positions reached by playing random moves from
+the start, for benchmarking.
+'''
+def sample_positions(count, seed=0):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        bitboard = BitBoard(0xFFF00000, 0x00000FFF)
+        for ply in range(rng.randrange(60)):
+            moves = bitboard.generate_moves(bitboard.side)
+            if not moves:
+                break
+            bitboard.make_move(rng.choice(moves))
+        positions.append(bitboard)
+    return positions
+
+
+'''
+Running this file compares the throughput of the batch evaluator with the
+same terms worked out one position at a time, and with the search's own
+material-only evaluate, e.g. python batch_eval.py 100000. It then searches
+the start position to a fixed depth with and without batched leaf
+evaluation.
+'''
+if __name__ == '__main__':
+    from search import Search, evaluate
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bitboards = sample_positions(count)
+    evaluator = BatchEvaluator()
+    packed = b''.join(pack_position(b) for b in bitboards)
+
+    start = time.perf_counter()
+    batch = evaluator.evaluate_batch(from_buffer(packed))
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scalar = [evaluator.evaluate(b, b.side) for b in bitboards]
+    scalar_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for b in bitboards:
+        evaluate(b, b.side)
+    material_seconds = time.perf_counter() - start
+    assert batch.tolist() == scalar
+    for name, seconds in (('batch', batch_seconds),
+                          ('scalar', scalar_seconds),
+                          ('material only', material_seconds)):
+        print('%-14s %10.0f positions/s' % (name, count / seconds))
+
+    for label, settings in (('scalar leaves', {}),
+                            ('batched leaves', {'batch_leaves': True})):
+        engine = Search(max_depth=8, evaluator=BatchEvaluator(), **settings)
+        engine.best_move(BitBoard(0xFFF00000, 0x00000FFF), 'USER')
+        print('search depth 8, %-14s %8d nodes  %6.2f s  %7d nodes/s' %
+              (label, engine.stats['nodes'], engine.stats['seconds'],
+               engine.stats['nps']))
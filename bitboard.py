@@ -0,0 +1,339 @@
+'''
+The bitboard module contains a compact representation of a checkers position.
+Pieces can only ever stand on the 32 dark squares, so each dark square is given
+an index from 0 to 31 (four per row, starting from the CPU's back row) and a
+whole position is described by three 32-bit masks: one for the user's pieces,
+one for the CPU's pieces and one marking which of those pieces are kings.
+Simple moves and jumps for every piece of a side are found at once by shifting
+these masks one diagonal step and masking off the squares that would otherwise
+wrap around the edge of the board.
+'''
+
+from zobrist import PIECE_KEYS, SIDE_KEY, KIND_INDEX, position_key
+
+FULL = 0xFFFFFFFF
+
+ROWS = [0xF << (4 * r) for r in range(8)]
+EVEN_ROWS = ROWS[0] | ROWS[2] | ROWS[4] | ROWS[6]
+ODD_ROWS = ROWS[1] | ROWS[3] | ROWS[5] | ROWS[7]
+LEFT_EDGE = sum(1 << (4 * r) for r in (1, 3, 5, 7))
+RIGHT_EDGE = sum(1 << (4 * r + 3) for r in (0, 2, 4, 6))
+
+DOWN_LEFT = 0
+DOWN_RIGHT = 1
+UP_LEFT = 2
+UP_RIGHT = 3
+OPPOSITE = (UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT)
+
+'''
+Moving a square one diagonal step changes its index by a different amount on
+even and odd rows, so every direction is described by two (mask, shift)
+pairs. The mask keeps only the squares that have a neighbour in that
+direction. A positive shift moves towards the user's side of the board.
+'''
+STEPS = (
+    ((EVEN_ROWS, 4), (ODD_ROWS & ~LEFT_EDGE & ~ROWS[7], 3)),
+    ((EVEN_ROWS & ~RIGHT_EDGE, 5), (ODD_ROWS & ~ROWS[7], 4)),
+    ((EVEN_ROWS & ~ROWS[0], -4), (ODD_ROWS & ~LEFT_EDGE, -5)),
+    ((EVEN_ROWS & ~RIGHT_EDGE & ~ROWS[0], -3), (ODD_ROWS, -4)),
+)
+
+'''
+The directions each type of piece may move in. Men only move forward
+(down the board for the CPU, up for the user); kings move both ways.
+'''
+DIRECTIONS = {'CPU': (DOWN_LEFT, DOWN_RIGHT),
+              'USER': (UP_LEFT, UP_RIGHT),
+              'CPU_KING': (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT),
+              'USER_KING': (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT)}
+FORWARD = {'CPU': (DOWN_LEFT, DOWN_RIGHT), 'USER': (UP_LEFT, UP_RIGHT)}
+PROMOTION_ROW = {'CPU': ROWS[7], 'USER': ROWS[0]}
+
+
+'''
+This function moves every square in mask one diagonal step in the given
+direction. Squares without a neighbour in that direction are dropped.
+'''
+def step(mask, direction):
+    (bits_a, shift_a), (bits_b, shift_b) = STEPS[direction]
+    if shift_a > 0:
+        return (mask & bits_a) << shift_a | (mask & bits_b) << shift_b
+    return (mask & bits_a) >> -shift_a | (mask & bits_b) >> -shift_b
+
+
+'''
+These functions convert between (row, col) board coordinates and square
+indices.
+'''
+def square_index(row, col):
+    return row * 4 + col // 2
+
+
+def square_coords(sq):
+    row = sq >> 2
+    return row, 2 * (sq & 3) + (1 - row % 2)
+
+
+'''
+This generator yields the index of every set bit of mask in increasing order,
+which is the same row-by-row order the Board class scans its array in.
+'''
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+'''
+NEIGHBOURS[d][sq] is the square one step from sq in direction d and
+JUMPS[d][sq] the square two steps away, or -1 if it is off the board.
+'''
+NEIGHBOURS = tuple(tuple(step(1 << sq, d).bit_length() - 1
+                         for sq in range(32)) for d in range(4))
+JUMPS = tuple(tuple(NEIGHBOURS[d][n] if n >= 0 else -1
+                    for n in NEIGHBOURS[d]) for d in range(4))
+
+
+'''
+This function returns the squares a move stands on in turn, from src through
+the landing square of each jump to dst. The path is worked out from the
+captured mask, so two capture sequences with the same ends that take
+different pieces get different paths.
+'''
+def jump_path(move):
+    src, dst, captured = move
+
+    def extend(at, left):
+        if not left:
+            return [at] if at == dst else None
+        for d in range(4):
+            over = NEIGHBOURS[d][at]
+            if over >= 0 and JUMPS[d][at] >= 0 and left >> over & 1:
+                rest = extend(JUMPS[d][at], left & ~(1 << over))
+                if rest:
+                    return [at] + rest
+        return None
+    return extend(src, captured) or [src, dst]
+
+
+'''
+The BitBoard class holds the three masks described above, the side to move
+and the position's Zobrist hash (see zobrist.py), and generates and applies
+moves on them. Moves are (src, dst, captured) tuples where captured is a mask
+of the squares whose pieces are removed by the move.
+'''
+
+
+class BitBoard:
+    def __init__(self, user=0, cpu=0, kings=0, side='USER'):
+        self.user = user
+        self.cpu = cpu
+        self.kings = kings
+        self.side = side
+        self.key = position_key(user, cpu, kings, side)
+
+    '''
+    Builds a BitBoard from an 8x8 array of Piece objects (or None).
+    '''
+    @classmethod
+    def from_grid(cls, grid, side='USER'):
+        bitboard = cls(side=side)
+        for i in range(8):
+            for j in range(8):
+                if grid[i][j] is not None:
+                    bitboard.put(square_index(i, j), grid[i][j].get_type())
+        return bitboard
+
+    def copy(self):
+        return BitBoard(self.user, self.cpu, self.kings, self.side)
+
+    def __eq__(self, other):
+        return (self.user, self.cpu, self.kings, self.side) == \
+            (other.user, other.cpu, other.kings, other.side)
+
+    def empty(self):
+        return ~(self.user | self.cpu) & FULL
+
+    def pieces(self, side):
+        return self.user if side == 'USER' else self.cpu
+
+    '''
+    This function returns the type of the piece on square sq ('USER', 'CPU',
+    'USER_KING' or 'CPU_KING'), or None if the square is empty.
+    '''
+    def kind_at(self, sq):
+        bit = 1 << sq
+        if self.user & bit:
+            return 'USER_KING' if self.kings & bit else 'USER'
+        if self.cpu & bit:
+            return 'CPU_KING' if self.kings & bit else 'CPU'
+        return None
+
+    def put(self, sq, kind):
+        self.remove(sq)
+        bit = 1 << sq
+        if kind.startswith('USER'):
+            self.user |= bit
+        else:
+            self.cpu |= bit
+        if kind.endswith('KING'):
+            self.kings |= bit
+        self.key ^= PIECE_KEYS[KIND_INDEX[kind]][sq]
+
+    def remove(self, sq):
+        kind = self.kind_at(sq)
+        if kind is None:
+            return
+        clear = ~(1 << sq)
+        self.user &= clear
+        self.cpu &= clear
+        self.kings &= clear
+        self.key ^= PIECE_KEYS[KIND_INDEX[kind]][sq]
+
+    '''
+    This function does the bulk of the move generation. For each of the four
+    directions it returns a mask of the side's pieces that can make a simple
+    move in that direction and a mask of those that can jump in it. A piece
+    can step towards d if the square one step away is empty, i.e. if it lies
+    one step "backwards" from an empty square, and it can jump if one step
+    backwards from an empty square there is an opponent and one more step
+    backwards there is the piece itself.
+    '''
+    def movers(self, side):
+        own = self.pieces(side)
+        opponent = self.cpu if side == 'USER' else self.user
+        empty = self.empty()
+        steps = [0, 0, 0, 0]
+        jumps = [0, 0, 0, 0]
+        for d in range(4):
+            candidates = own if d in FORWARD[side] else own & self.kings
+            if not candidates:
+                continue
+            back = OPPOSITE[d]
+            behind_empty = step(empty, back)
+            steps[d] = candidates & behind_empty
+            jumps[d] = candidates & step(behind_empty & opponent, back)
+        return steps, jumps
+
+    '''
+    This function returns every capture sequence the piece on square sq can
+    make, as (src, dst, captured) moves. After each jump the piece must keep
+    jumping while it can, so only sequences that cannot be extended are
+    returned. A piece cannot be jumped twice and stays on the board (so it
+    cannot be landed on) until the move is over, and a man that reaches the
+    far row is crowned and its move ends there.
+    '''
+    def jump_sequences(self, sq, side):
+        bit = 1 << sq
+        opponent = self.cpu if side == 'USER' else self.user
+        occupied = (self.user | self.cpu) & ~bit
+        king = self.kings & bit
+        directions = DIRECTIONS['USER_KING'] if king else FORWARD[side]
+        promotion_row = 0 if king else PROMOTION_ROW[side]
+        sequences = []
+
+        def extend(at, captured):
+            extended = False
+            for d in directions:
+                landing = JUMPS[d][at]
+                if landing < 0:
+                    continue
+                over = 1 << NEIGHBOURS[d][at]
+                if opponent & over and not captured & over and \
+                        not occupied >> landing & 1:
+                    extended = True
+                    if promotion_row >> landing & 1:
+                        sequences.append((sq, landing, captured | over))
+                    else:
+                        extend(landing, captured | over)
+            if not extended and captured:
+                sequences.append((sq, at, captured))
+        extend(sq, 0)
+        if len(sequences) > 1:
+            sequences = list(dict.fromkeys(sequences))
+        return sequences
+
+    '''
+    This function returns every legal move of the side as a list of
+    (src, dst, captured) tuples. Capturing is compulsory: if any piece can
+    jump, only the full capture sequences are returned. The pieces able to
+    move or jump at all are found with the masks from movers, so only those
+    pieces are looked at individually.
+    '''
+    def generate_moves(self, side):
+        steps, jumps = self.movers(side)
+        jumpers = jumps[0] | jumps[1] | jumps[2] | jumps[3]
+        moves = []
+        if jumpers:
+            for sq in bits(jumpers):
+                moves.extend(self.jump_sequences(sq, side))
+            return moves
+        for d in range(4):
+            for sq in bits(steps[d]):
+                moves.append((sq, NEIGHBOURS[d][sq], 0))
+        return moves
+
+    '''
+    This function returns the simple (non-capturing) moves of the piece on
+    square sq, ignoring whether a capture elsewhere is compulsory.
+    '''
+    def simple_moves(self, sq):
+        kind = self.kind_at(sq)
+        occupied = self.user | self.cpu
+        moves = []
+        for d in DIRECTIONS[kind]:
+            n = NEIGHBOURS[d][sq]
+            if n >= 0 and not occupied >> n & 1:
+                moves.append((sq, n, 0))
+        return moves
+
+    '''
+    make_move applies a (src, dst, captured) move, passes the turn to the
+    other side and returns a record that unmake_move uses to restore the
+    position exactly. A man that reaches the far row is crowned. The hash is
+    updated incrementally: the keys of the moving piece on its old square and
+    of every captured piece are XORed out, the key of the piece (crowned or
+    not) on its new square is XORed in, and SIDE_KEY is flipped.
+    '''
+    def make_move(self, move):
+        src, dst, captured = move
+        undo = (self.user, self.cpu, self.kings, self.key, self.side)
+        src_bit = 1 << src
+        dst_bit = 1 << dst
+        kings = self.kings
+        key = self.key ^ SIDE_KEY
+        if self.user & src_bit:
+            index = 0
+            self.user ^= src_bit ^ dst_bit
+            opponent = 1
+            self.cpu &= ~captured
+            crowned = dst_bit & PROMOTION_ROW['USER']
+            self.side = 'CPU'
+        else:
+            index = 1
+            self.cpu ^= src_bit ^ dst_bit
+            opponent = 0
+            self.user &= ~captured
+            crowned = dst_bit & PROMOTION_ROW['CPU']
+            self.side = 'USER'
+        while captured:
+            low = captured & -captured
+            sq = low.bit_length() - 1
+            key ^= PIECE_KEYS[opponent + 2 if kings & low else opponent][sq]
+            captured ^= low
+        kings &= ~move[2]
+        if kings & src_bit:
+            key ^= PIECE_KEYS[index + 2][src] ^ PIECE_KEYS[index + 2][dst]
+            kings ^= src_bit ^ dst_bit
+        elif crowned:
+            key ^= PIECE_KEYS[index][src] ^ PIECE_KEYS[index + 2][dst]
+            kings |= dst_bit
+        else:
+            key ^= PIECE_KEYS[index][src] ^ PIECE_KEYS[index][dst]
+        self.kings = kings
+        self.key = key
+        return undo
+
+    def unmake_move(self, undo):
+        self.user, self.cpu, self.kings, self.key, self.side = undo
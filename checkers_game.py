@@ -1,172 +1,312 @@
 import pygame
 import sys
 import os
-import time
-from PIL import Image
 from checker_board import Board
+from renderer import BoardRenderer
+from move_provider import MoveProvider
+import assets
+import tablebase
+import opening_book
+import metrics
+
+'''
+The CPU strength can be given on the command line (EASY, MEDIUM, HARD,
+PARALLEL, which is HARD searched on every core, or MCTS, a Monte Carlo tree
+search player), followed by the frame rate cap, e.g.
+python checkers_game.py hard 30. The
+defaults are EASY and 30 frames per second.
+'''
+cpu_strength = sys.argv[1].upper() if len(sys.argv) > 1 else 'EASY'
+fps = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+'''
+The CPU's move is delayed by this many milliseconds so that it does not
+happen too fast and the user does not miss it. The CPU works out its move
+during the delay on a background thread; if it is still thinking after
+CPU_THINK_LIMIT seconds it plays the best move it has found so far.
+'''
+CPU_DELAY_MS = 1000
+CPU_THINK_LIMIT = 5.0
+
+'''
+With PONDER on, the CPU keeps thinking while the user does: once its move
+has been played it works out its answers to the user's likely replies in
+the background (see move_provider.py), so that when the user plays one of
+them the CPU's move is ready at once and only CPU_DELAY_MS is waited.
+'''
+PONDER = True
+
+'''
+The moves of a replay are shown this many milliseconds apart.
+'''
+REPLAY_DELAY_MS = 700
 
 '''
 This sets the position of the game window.
 '''
 os.environ['SDL_VIDEO_WINDOW_POS'] = '200, 100'
 
+'''
+Timing of the game's methods is turned on by environment variables (see
+metrics.py).
+'''
+metrics.enable_from_env()
+
 pygame.init()
 
 '''
-The dimensions of the pygame surface and the caption are set.
+The dimensions of the pygame surface and the caption are set. The window can
+be resized; the board is drawn as large as fits in it.
 '''
-surface = pygame.display.set_mode((800, 800))
+surface = pygame.display.set_mode((800, 800), pygame.RESIZABLE)
 pygame.display.set_caption('Checkers')
+clock = pygame.time.Clock()
 
 '''
-Setup for the title screen text
+The text of the title and game over screens, as (text, bold, y) lines. The
+text and its position are given for an 800 by 800 window and scaled to the
+window's size when drawn; big bold lines are drawn at 100 points and the
+rest at 60. Each line is rendered once per size (see assets.py), not on
+every frame.
 '''
-start = True
-start_font = pygame.font.SysFont('verdana', 100, bold=True)
-start_text = start_font.render('CHECKERS', True, (0, 0, 0))
-start_rect = start_text.get_rect()
-start_rect.center = (400, 300)
-dir_font = pygame.font.SysFont('verdana', 60)
-dir_text = dir_font.render('Press Space to Play', True, (0, 0, 0))
-dir_rect = dir_text.get_rect()
-dir_rect.center = (400, 400)
+title_screen = [('CHECKERS', True, 300), ('Press Space to Play', False, 400)]
+replay_line = ('Press Space to Play Again', False, 400)
+watch_line = ('Press R to Watch a Replay', False, 500)
+win_screens = {'USER': [('YOU WIN!', True, 300), replay_line, watch_line],
+               'CPU': [('CPU WINS!', True, 300), replay_line, watch_line],
+               'DRAW': [('DRAW!', True, 300), replay_line, watch_line]}
+
+
+def draw_text_screen(lines):
+    global text_screen
+    text_screen = lines
+    width, height = surface.get_size()
+    scale = min(width, height) / 800
+    surface.fill((255, 255, 255))
+    for text, bold, y in lines:
+        rendered = assets.get_text(text, max(8, int((100 if bold else 60) *
+                                                    scale)), bold)
+        surface.blit(rendered, rendered.get_rect(
+            center=(width // 2, height // 2 + int((y - 400) * scale))))
+    pygame.display.flip()
+
 
 '''
-This block allows the start window to change to the gameplay when the space
-bar is pressed.
+This function is called when the window has been resized. The board is
+fitted to the new size, and a title or game over screen is drawn again.
 '''
-while start:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                start = False
-
-        surface.fill((255, 255, 255))
-        surface.blit(start_text, start_rect)
-        surface.blit(dir_text, dir_rect)
-        pygame.display.update()
-
-surface.fill((0, 0, 0))
-board = Board()
-board.initialize_game()
-
-game_in_progress = True
-turn = 'USER'
-selected_piece = False
-click = 0
-saved_pos = {}
-mouse_clicked = True
-
-'''
-This is the main game loop. The loop starts by checking to see if the game is
-over (if either the user or CPU has run out of pieces). If the current turn is
-the user's, then the logic below allows for the player to click on only a red
-piece and have the available moves for that piece be highlighted in blue. If
-the user clicks one of the newly highlighted squares, the update_board method
-from the Board class is called to change the state of the game board. If it is
-the CPU's turn, the move is determined by cpu_next_move() in the Board class.
-A delay of 1 second is added so that the CPU's move does not occur too fast
-and the user does not miss it. If either the user or the CPU wins, a new screen
-appears declaring the winner and prompts the user to press the space bar if
-they choose to play a new game. Otherwise, they can exit out of the window,
-which terminates the program. Note that this loop is where the redrawing for
-each of the screens occurs, which calls various methods from checker_board.py.
-'''
-while game_in_progress:
-    if board.num_user_pieces == 0 or board.num_cpu_pieces == 0:
-        game_in_progress = False
-    if turn == 'USER':
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONUP:
-                if click == 2:
-                    click = 0
-                if click == 1:
-                    x1, y1 = event.pos
-                    new_row = y1 // 100
-                    new_col = x1 // 100
-                    new_piece = board.get_board_val(new_row, new_col)
-                    if new_piece is not None and \
-                       (new_piece.get_type() == 'USER' or
-                            piece.get_type() == 'USER_KING'):
-                        click = 0
-                    if (((new_row, new_col), False) in positions or
-                            ((new_row, new_col), True) in positions):
-                        board.board = board.update_board(
-                            saved_pos.get('original_row'),
-                            saved_pos.get('original_col'), new_row, new_col)
-                        board.reset_squares(surface)
-                        board.draw(surface)
-                        saved_pos = {}
-                        click = 2
-                        turn = 'CPU'
-                if click == 0:
-                    x, y = event.pos
-                    row = y // 100
-                    col = x // 100
-                    saved_pos.update({'original_row': row})
-                    saved_pos.update({'original_col': col})
-                    piece = board.get_board_val(row, col)
-                    type = piece.get_type()
-                    check_user = type == 'USER' or type == 'USER_KING'
-                    if piece is not None and (check_user):
-                        board.reset_squares(surface)
-                        click = 1
-                        positions = board.space_available(piece)
-                        for position in positions:
-                            row = position[0][0]
-                            col = position[0][1]
-                            b = (0, 186, 255)
-                            c = col * 100
-                            r = row * 100
-                            surface.fill(b, rect=(c, r, 100, 100))
-    elif turn == 'CPU':
-        if board.num_cpu_pieces != 0:
-            time.sleep(1)
-            move = board.cpu_next_move()
-            board.update_board(move[0], move[1], move[2], move[3])
-            board.reset_squares(surface)
-            board.draw(surface)
-            turn = 'USER'
-    surface.fill((0, 65, 0), rect=(800, 0, 400, 800))
-    board.draw(surface)
-    pygame.display.flip()
+def resize_window():
+    global surface
+    surface = pygame.display.get_surface()
+    renderer.resize(surface)
+    if scene in ('TITLE', 'GAME_OVER'):
+        draw_text_screen(text_screen)
+
+
+def quit_game():
+    provider.cancel()
+    print('frames:', renderer.stats.summary())
+    if PONDER:
+        print('ponder: %d hits, %d misses' % (provider.ponder_hits,
+                                              provider.ponder_misses))
+    metrics.finish()
+    pygame.quit()
+    sys.exit()
+
+
+'''
+This function starts a new game: a fresh board, the user to move and nothing
+selected. The CPU's engine is kept from the last game, so that a PARALLEL
+engine's worker processes are only started once.
+'''
+def new_game():
+    global board, turn, selected, highlights, cpu_move_at, cpu_move, scene
+    provider.cancel()
+    engine = board.engine if board is not None else None
+    board = Board(cpu_strength, tablebase=endgame_tables, book=book)
+    board.engine = engine
+    board.initialize_game()
+    renderer.invalidate()
+    turn = 'USER'
+    selected = None
+    highlights = set()
+    cpu_move_at = None
+    cpu_move = None
+    scene = 'PLAYING'
 
+
+'''
+This function handles a click on the board during the user's turn. Clicking
+one of the user's pieces selects it and highlights the spaces it can move to
+in blue; clicking a highlighted space makes that move and hands the turn to
+the CPU. The CPU starts thinking straight away, and its move is played no
+sooner than CPU_DELAY_MS later.
+'''
+def handle_click(pos):
+    global selected, highlights, turn, cpu_move_at
+    square = renderer.square_at(pos)
+    if square is None:
+        return
+    row, col = square
+    if selected is not None and (row, col) in highlights:
+        board.update_board(selected[0], selected[1], row, col)
+        selected = None
+        highlights = set()
+        turn = 'CPU'
+        cpu_move_at = pygame.time.get_ticks() + CPU_DELAY_MS
+        if board.check_game_over() is None:
+            provider.request(board)
+        return
+    piece = board.get_board_val(row, col)
+    if piece is not None and piece.is_user:
+        selected = (row, col)
+        highlights = {position[0] for position in board.space_available(piece)}
+
+
+def check_game_over():
+    global scene
     winner = board.check_game_over()
-    win_font = pygame.font.SysFont('verdana', 100, bold=True)
+    if winner is not None:
+        scene = 'GAME_OVER'
+        draw_text_screen(win_screens[winner])
+
+
+'''
+This function is called after moves were undone or redone. The game carries
+on from the board's position: whoever is to move has the turn, nothing is
+selected, and if it is the CPU's turn it starts thinking (or, if it is the
+user's, pondering).
+'''
+def resume():
+    global turn, selected, highlights, cpu_move_at, cpu_move, scene
+    renderer.invalidate()
+    turn = board.bitboard.side
+    selected = None
+    highlights = set()
+    cpu_move = None
+    scene = 'PLAYING'
+    if turn == 'CPU':
+        cpu_move_at = pygame.time.get_ticks() + CPU_DELAY_MS
+        if board.check_game_over() is None:
+            provider.request(board)
+    elif PONDER and board.check_game_over() is None:
+        provider.ponder(board)
+
+
+'''
+The left arrow key takes back the user's last move (and the CPU's reply to
+it, if it has been played), and the right arrow key plays them again. Both
+also work from the game over screen, to take back the last moves of a game.
+'''
+def undo():
+    provider.cancel()
+    if board.undo_move() is None:
+        return
+    while board.bitboard.side == 'CPU' and board.undo_move() is not None:
+        pass
+    resume()
+
 
-    if winner == 'USER':
-        win_text = win_font.render('YOU WIN!', True, (0, 0, 0))
+def redo():
+    provider.cancel()
+    if board.redo_move() is None:
+        return
+    while board.bitboard.side == 'CPU' and board.redo_move() is not None:
+        pass
+    resume()
+
+
+'''
+This function starts a replay of the game that just ended: every move is
+taken back and the moves are then played again one at a time, REPLAY_DELAY_MS
+apart, until the game over screen comes back.
+'''
+def start_replay():
+    global scene, replay_at
+    provider.cancel()
+    while board.undo_move() is not None:
+        pass
+    renderer.invalidate()
+    scene = 'REPLAY'
+    replay_at = pygame.time.get_ticks() + REPLAY_DELAY_MS
+
+
+renderer = BoardRenderer(surface)
+provider = MoveProvider(CPU_THINK_LIMIT)
+endgame_tables = tablebase.load()
+book = opening_book.load()
+board = None
+turn = 'USER'
+selected = None
+highlights = set()
+cpu_move_at = None
+cpu_move = None
+replay_at = None
+text_screen = None
+scene = 'TITLE'
+draw_text_screen(title_screen)
+
+'''
+This is the main loop. The game is always in one of four scenes: the title
+screen (TITLE), a game in progress (PLAYING), the screen declaring the
+winner (GAME_OVER) or a replay of the game that ended (REPLAY). Pressing
+space on any screen but a game in progress starts a new game, and R on the
+game over screen starts the replay. While the game waits for the user (or
+for any key on the other screens) the loop sleeps in pygame.event.wait until
+something happens. While the CPU's move is pending the loop runs at most fps
+times per second and polls the MoveProvider, which searches on a background
+thread, so the window keeps handling events however long the CPU thinks;
+while the user thinks it ponders on the same thread (see PONDER). The board
+is drawn by the BoardRenderer, which only redraws the squares that changed
+and leaves the screen alone otherwise. Closing the window at any time
+terminates the program.
+'''
+while True:
+    if scene == 'REPLAY' or (scene == 'PLAYING' and turn == 'CPU'):
+        events = pygame.event.get()
     else:
-        win_text = win_font.render('CPU WINS!', True, (0, 0, 0))
-
-    win_rect = win_text.get_rect()
-    win_rect.center = (400, 300)
-    replay_font = pygame.font.SysFont('verdana', 60)
-    bl = (0, 0, 0)
-    replay_text = replay_font.render('Press Space to Play Again', True, bl)
-    replay_rect = replay_text.get_rect()
-    replay_rect.center = (400, 400)
-
-    while not game_in_progress:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    board = Board()
-                    board.initialize_game()
-                    surface.fill((0, 0, 0))
-                    turn = 'USER'
-                    game_in_progress = True
-                    break
-            surface.fill((255, 255, 255))
-            surface.blit(win_text, win_rect)
-            surface.blit(replay_text, replay_rect)
-            pygame.display.update()
+        events = [pygame.event.wait()] + pygame.event.get()
+    for event in events:
+        if event.type == pygame.QUIT:
+            quit_game()
+        if event.type == pygame.VIDEORESIZE:
+            resize_window()
+        if event.type == pygame.KEYDOWN and scene in ('PLAYING', 'GAME_OVER'):
+            if event.key == pygame.K_LEFT:
+                undo()
+            elif event.key == pygame.K_RIGHT and turn == 'USER':
+                redo()
+        if scene != 'PLAYING':
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                new_game()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_r \
+                    and scene == 'GAME_OVER':
+                start_replay()
+        elif turn == 'USER' and event.type == pygame.MOUSEBUTTONUP:
+            handle_click(event.pos)
+
+    if scene == 'REPLAY':
+        if pygame.time.get_ticks() >= replay_at:
+            replay_at += REPLAY_DELAY_MS
+            if board.redo_move() is None:
+                check_game_over()
+        if scene == 'REPLAY':
+            renderer.render(board)
+
+    if scene == 'PLAYING':
+        if turn == 'CPU':
+            if cpu_move is None:
+                cpu_move = provider.poll()
+            if board.check_game_over() is not None:
+                turn = 'USER'
+            elif cpu_move is not None and \
+                    pygame.time.get_ticks() >= cpu_move_at:
+                board.update_board(cpu_move[0], cpu_move[1], cpu_move[2],
+                                   cpu_move[3])
+                cpu_move = None
+                turn = 'USER'
+                if PONDER and board.check_game_over() is None:
+                    provider.ponder(board)
+        renderer.render(board, highlights)
+        check_game_over()
+    clock.tick(fps)
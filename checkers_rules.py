@@ -0,0 +1,440 @@
+import random
+from piece import Piece, USER_KING, CPU_KING
+from bitboard import BitBoard, square_index, square_coords, bits
+from legal_moves import MoveCache
+from position_io import from_fen, to_fen, unpack_position, pack_position
+from search import STRENGTHS, make_engine
+from evaluation import default_evaluator
+from repetition import PositionHistory
+
+'''
+The Board class contains all of the logic for the checkers game (specific
+functions will be detailed below). It imports no graphics code, so it can be
+used to play games without pygame or a display; checker_board.Board adds the
+drawing functions on top of it. A Board object contains information such as
+the board array, the number of user and cpu pieces remaining and the winner.
+The board array of Piece objects is what the game draws and what callers read
+through get_board_val, but move generation and move validation are done on a
+BitBoard that is kept in step with it (see bitboard.py). The legal moves of
+the side to move are kept in a MoveCache (see legal_moves.py) so that they
+are only worked out once per turn. The rules are those of English draughts:
+capturing is compulsory and a piece that has jumped must keep jumping while
+it can. A side that cannot move loses, and the game is drawn when a position
+comes about for the third time or when 80 plies pass without a capture or a
+man moving; the positions of the game are kept in a PositionHistory (see
+repetition.py) for this.
+'''
+
+
+class Board:
+    '''
+    This is the constructor to instantiate a Board object by initializing the
+    instance variables defined above. cpu_strength is one of the keys of
+    search.STRENGTHS and decides how cpu_next_move picks its move. rng is the
+    random.Random used to break ties between equally good moves; passing one
+    created from a fixed seed makes the CPU's choices repeatable. tablebase
+    is an optional tablebase.Tablebase that cpu_next_move plays from once
+    few enough pieces are left, and book an optional
+    opening_book.OpeningBook that it plays from while the position is in it.
+    '''
+    def __init__(self, cpu_strength='EASY', rng=None, tablebase=None,
+                 book=None):
+        self.board = None
+        self.rng = rng if rng is not None else random.Random()
+        self.bitboard = BitBoard()
+        self.num_user_pieces = 12
+        self.num_cpu_pieces = 12
+        self.winner = None
+        self.cpu_strength = cpu_strength
+        self.engine = None
+        self.last_search_stats = None
+        self.move_cache = MoveCache()
+        self.tablebase = tablebase
+        self.book = book
+        self.evaluator = default_evaluator()
+        self.undo_stack = []
+        self.redo_stack = []
+        self.position_history = PositionHistory(self.bitboard.key)
+
+    '''
+    This function is called whenever a new game is started. Its responsibility
+    is to initialize the board array by setting the correct indices to either
+    CPU or USER piece objects based on how a real Checkers game starts.
+    '''
+    def initialize_game(self):
+        board_arr = [[None for i in range(8)] for j in range(8)]
+        for i in range(8):
+            for j in range(0, 8, 2):
+                if i < 3:
+                    if i % 2 == 0:
+                        board_arr[i][j + 1] = Piece('CPU', i, j + 1)
+                    else:
+                        board_arr[i][j] = Piece('CPU', i, j)
+                elif i > 4:
+                    if i % 2 == 0:
+                        board_arr[i][j + 1] = Piece('USER', i, j + 1)
+                    else:
+                        board_arr[i][j] = Piece('USER', i, j)
+        self.board = board_arr
+        self.bitboard = BitBoard.from_grid(board_arr)
+        self.move_cache.reset()
+        self.undo_stack = []
+        self.redo_stack = []
+        self.position_history = PositionHistory(self.bitboard.key)
+
+    '''
+    This function sets the board to the position held in a BitBoard,
+    including whose turn it is, e.g. to start from a stored position rather
+    than from the start of a game.
+    '''
+    def set_position(self, bitboard):
+        board_arr = [[None for i in range(8)] for j in range(8)]
+        for sq in bits(bitboard.user | bitboard.cpu):
+            row, col = square_coords(sq)
+            board_arr[row][col] = Piece(bitboard.kind_at(sq), row, col)
+        self.board = board_arr
+        self.bitboard = bitboard.copy()
+        self.num_user_pieces = bitboard.user.bit_count()
+        self.num_cpu_pieces = bitboard.cpu.bit_count()
+        self.winner = None
+        self.move_cache.reset()
+        self.undo_stack = []
+        self.redo_stack = []
+        self.position_history = PositionHistory(self.bitboard.key)
+
+    '''
+    These functions create a board holding a stored position, either as FEN
+    text or as a packed 16-byte record (see position_io.py), and write the
+    board's position back out in either form.
+    '''
+    @classmethod
+    def from_fen(cls, text, cpu_strength='EASY', rng=None):
+        board = cls(cpu_strength, rng)
+        board.set_position(from_fen(text))
+        return board
+
+    @classmethod
+    def from_packed(cls, data, cpu_strength='EASY', rng=None):
+        board = cls(cpu_strength, rng)
+        board.set_position(unpack_position(data))
+        return board
+
+    def to_fen(self):
+        return to_fen(self.bitboard)
+
+    def to_packed(self):
+        return pack_position(self.bitboard)
+
+    '''
+    This function returns a copy of the board that can be changed (or
+    searched on another thread) without affecting this one. The copy has its
+    own Piece objects and bitboard but shares this board's engine and random
+    number generator (and tablebase and opening book). It starts with no
+    moves to undo or redo, but with a copy of the game's position history.
+    '''
+    def copy(self):
+        other = Board(self.cpu_strength, self.rng, self.tablebase, self.book)
+        other.board = [[None if piece is None else
+                        Piece(piece.code, piece.row, piece.col)
+                        for piece in row]
+                       for row in self.board]
+        other.bitboard = self.bitboard.copy()
+        other.num_user_pieces = self.num_user_pieces
+        other.num_cpu_pieces = self.num_cpu_pieces
+        other.winner = self.winner
+        other.engine = self.engine
+        other.position_history = self.position_history.copy()
+        return other
+
+    '''
+    This function returns the element at the specified row and column of the
+    board array. If a piece does not exist at the given indices, this function
+    will return None.
+    '''
+    def get_board_val(self, row, col):
+        return self.board[row][col]
+
+    '''
+    This function returns true if the specified indices, i and j correspond to
+    a position that exists within the boundaries of the Checkers board.
+    '''
+    def in_bounds(self, i, j):
+        return i < 8 and j < 8 and i > -1 and j > -1
+
+    '''
+    This function takes in indices i and j and returns a boolean describing
+    wether or not a position is valid for a piece to move to. That is, the
+    new position must exist within the boundaries of the Checkers board and
+    not be occupied by another piece.
+    '''
+    def valid_pos(self, i, j):
+        return self.in_bounds(i, j) and self.board[i][j] is None
+
+    '''
+    This function returns the legal moves of the side whose turn it is as
+    (src, dst, captured) tuples of square indices (see bitboard.py). The list
+    comes from the move cache and must not be changed by the caller.
+    '''
+    def legal_moves(self):
+        return self.move_cache.legal_moves(self.bitboard)
+
+    '''
+    This function returns a list of tuples of the form
+    ((row, col), True/False). It will be called when a piece is clicked on and
+    its purpose is to return all of the available spaces that the currently
+    selected piece is allowed to move to. Moreover, the value True in the
+    tuple indicates that the move is a jump whereas False indicates that there
+    is no jump. For a multi-jump the space is where the piece finally lands.
+    The moves are taken from the legal moves of the piece's side, so a piece
+    that cannot capture gets no spaces when another piece of its side can.
+    '''
+    def space_available(self, piece):
+        sq = square_index(piece.get_row(), piece.get_col())
+        side = 'USER' if piece.is_user else 'CPU'
+        if side == self.bitboard.side:
+            moves = self.legal_moves()
+        else:
+            moves = self.bitboard.generate_moves(side)
+        return [(square_coords(dst), captured != 0)
+                for src, dst, captured in moves if src == sq]
+
+    '''
+    This function returns the legal move that takes the piece on
+    (old_row, old_col) to (new_row, new_col), or None if there is none. If
+    two capture sequences end on the same square, the one that takes more
+    pieces is chosen.
+    '''
+    def find_move(self, old_row, old_col, new_row, new_col):
+        src = square_index(old_row, old_col)
+        dst = square_index(new_row, new_col)
+        found = None
+        for move in self.legal_moves():
+            if move[0] == src and move[1] == dst and \
+                    (found is None or
+                     move[2].bit_count() > found[2].bit_count()):
+                found = move
+        return found
+
+    '''
+    This function is used by the CPU to calculate a score given a particular
+    piece and a move for that piece. The move is played on the bitboard and
+    the position it leads to is scored for the piece's side by the board's
+    evaluator (see evaluation.py), whose weights value crowning, captures
+    and position, and can be tuned with tuner.py. A ValueError is raised if
+    the piece has no legal move to the given square.
+    '''
+    def get_move_score(self, piece, move):
+        found = self.find_move(piece.get_row(), piece.get_col(), move[0],
+                               move[1])
+        if found is None:
+            raise ValueError('no legal move from %s to %s' %
+                             ((piece.get_row(), piece.get_col()), move))
+        undo = self.bitboard.make_move(found)
+        score = self.evaluator.evaluate(
+            self.bitboard, 'USER' if piece.is_user else 'CPU')
+        self.bitboard.unmake_move(undo)
+        return score
+
+    '''
+    The purpose of this function is to determine an optimal next move for the
+    CPU. This is done by going through the CPU's legal moves (from the move
+    cache) and assigning scores with get_move_score. The function then
+    considers all of the moves with the maximum score. If there is more then
+    one move with the highest score, then a random one is chosen. At the
+    MEDIUM and HARD strengths the move is chosen by the alpha-beta engine
+    instead (see search_next_move). At any strength, once there are few
+    enough pieces left for the board's tablebase, the move is chosen at
+    random from the ones it says are best, and while the position is in the
+    board's opening book the move comes from the book. If the CPU has no
+    legal move, None is returned.
+    '''
+    def cpu_next_move(self):
+        if not self.legal_moves():
+            return None
+        tablebase = self.tablebase
+        if tablebase is not None and self.num_user_pieces + \
+                self.num_cpu_pieces <= tablebase.max_pieces:
+            moves = tablebase.best_moves(self.bitboard, self.legal_moves())
+            if moves is not None:
+                move = moves[self.rng.randrange(len(moves))]
+                return square_coords(move[0]) + square_coords(move[1])
+        if self.book is not None:
+            move = self.book.choose(self.bitboard, self.legal_moves(),
+                                    self.rng)
+            if move is not None:
+                return square_coords(move[0]) + square_coords(move[1])
+        if STRENGTHS[self.cpu_strength] is not None:
+            return self.search_next_move()
+        d = {}
+        scores = []
+        for src, dst, captured in self.legal_moves():
+            pos = square_coords(src)
+            p = self.get_board_val(pos[0], pos[1])
+            space = (square_coords(dst), captured != 0)
+            score = self.get_move_score(p, space[0])
+            scores.append(score)
+            d.setdefault(pos, {})[space] = score
+        max_score = max(scores)
+        max_score_moves = []
+        for i in list(d.keys()):
+            for j in list(d.get(i).keys()):
+                if d.get(i).get(j) == max_score:
+                    max_score_moves.append((i, j[0]))
+
+        n = len(max_score_moves)
+        random_index = self.rng.randrange(n)
+        move = max_score_moves[random_index]
+
+        old_row = move[0][0]
+        old_col = move[0][1]
+
+        new_row = move[1][0]
+        new_col = move[1][1]
+
+        return old_row, old_col, new_row, new_col
+
+    '''
+    This function asks the alpha-beta engine in search.py for the CPU's move
+    and returns it in the same form as cpu_next_move. The engine is kept
+    between moves so that its move ordering tables carry over, and the
+    statistics of the last search (nodes, depth, nodes per second) are saved
+    in last_search_stats.
+    '''
+    def search_next_move(self):
+        src, dst, captured = self.get_engine().best_move(
+            self.bitboard, 'CPU', self.legal_moves(), self.position_history)
+        self.last_search_stats = self.engine.stats
+        old_row, old_col = square_coords(src)
+        new_row, new_col = square_coords(dst)
+        return old_row, old_col, new_row, new_col
+
+    '''
+    This function returns the board's alpha-beta engine, creating it the
+    first time, or None at the EASY strength, which does not use one. At the
+    PARALLEL strength the engine is a parallel_search.ParallelSearch and
+    at MCTS an mcts.MCTS, which keeps its tree from one move to the next.
+    '''
+    def get_engine(self):
+        if self.engine is None and STRENGTHS[self.cpu_strength] is not None:
+            self.engine = make_engine(STRENGTHS[self.cpu_strength])
+        return self.engine
+
+    '''
+    After each move is made, the update_board function is called to alter the
+    board based on where each piece is. The move must be one of the legal
+    moves of the side whose turn it is (otherwise nothing happens); for a
+    multi-jump, (new_row, new_col) is where the piece finally lands. The move
+    is played with make_move and its undo record pushed on the undo stack, so
+    that undo_move can take it back; a new move clears the moves that were
+    waiting to be redone.
+    '''
+    def update_board(self, old_row, old_col, new_row, new_col):
+        move = self.find_move(old_row, old_col, new_row, new_col)
+        if move is not None:
+            self.undo_stack.append(self.make_move(move))
+            self.redo_stack.clear()
+        return self.board
+
+    '''
+    make_move plays a (src, dst, captured) move on the board array and the
+    bitboard and returns a record that unmake_move uses to restore the
+    position exactly. Jumped pieces are taken off the board array and the
+    number of user or CPU pieces is decremented for each of them, and a man
+    that reaches the far row is crowned in place. Nothing is copied: the
+    record holds the move, the moving piece, the pieces it captured, whether
+    it was crowned, the piece counts and winner from before the move, the
+    bitboard's own undo record and the legal moves from before the move. The
+    bitboard update also updates its Zobrist hash (bitboard.key) for the
+    move, any capture or crowning, and the change of turn, and the squares
+    the move changed are passed to the move cache, and the new position is
+    added to the position history.
+    '''
+    def make_move(self, move):
+        board = self.board
+        src, dst, captured = move
+        old_row, old_col = square_coords(src)
+        new_row, new_col = square_coords(dst)
+        piece = board[old_row][old_col]
+        taken = []
+        for sq in bits(captured):
+            row, col = square_coords(sq)
+            taken.append(board[row][col])
+            board[row][col] = None
+        irreversible = captured or not piece.is_king
+        undo = (move, piece, taken, piece.code,
+                self.num_user_pieces, self.num_cpu_pieces, self.winner,
+                self.bitboard.make_move(move), self.move_cache.moves)
+        if piece.is_user:
+            self.num_cpu_pieces -= len(taken)
+            if new_row == 0 and not piece.is_king:
+                piece.set_code(USER_KING)
+        else:
+            self.num_user_pieces -= len(taken)
+            if new_row == 7 and not piece.is_king:
+                piece.set_code(CPU_KING)
+        board[old_row][old_col] = None
+        piece.set_location(new_row, new_col)
+        board[new_row][new_col] = piece
+        self.move_cache.invalidate(1 << src | 1 << dst | captured)
+        self.position_history.push(self.bitboard.key, irreversible)
+        return undo
+
+    def unmake_move(self, undo):
+        move, piece, taken, code, self.num_user_pieces, \
+            self.num_cpu_pieces, self.winner, bitboard_undo, moves = undo
+        board = self.board
+        src, dst, captured = move
+        old_row, old_col = square_coords(src)
+        self.position_history.pop()
+        board[piece.row][piece.col] = None
+        piece.set_location(old_row, old_col)
+        if piece.code != code:
+            piece.set_code(code)
+        board[old_row][old_col] = piece
+        for other in taken:
+            board[other.row][other.col] = other
+        self.bitboard.unmake_move(bitboard_undo)
+        self.move_cache.invalidate(1 << src | 1 << dst | captured)
+        self.move_cache.moves = moves
+
+    '''
+    These functions take back the last move played with update_board and
+    play it again. Each returns the (src, dst, captured) move, or None if
+    there is nothing to undo or redo.
+    '''
+    def undo_move(self):
+        if not self.undo_stack:
+            return None
+        undo = self.undo_stack.pop()
+        self.unmake_move(undo)
+        self.redo_stack.append(undo[0])
+        return undo[0]
+
+    def redo_move(self):
+        if not self.redo_stack:
+            return None
+        move = self.redo_stack.pop()
+        self.undo_stack.append(self.make_move(move))
+        return move
+
+    '''
+    This function checks if the game is over and returns the winner ('USER',
+    'CPU' or 'DRAW'), or None while the game goes on. If the number of user
+    pieces is 0, then the CPU is set as the winner and vice versa; a side
+    whose turn it is but who has no legal move has also lost. The game is
+    drawn by threefold repetition or the no-progress rule. Every check is a
+    lookup: the legal moves come from the move cache and the draws from the
+    position history.
+    '''
+    def check_game_over(self):
+        if self.winner is not None:
+            return self.winner
+        if self.num_user_pieces == 0:
+            self.winner = 'CPU'
+        elif self.num_cpu_pieces == 0:
+            self.winner = 'USER'
+        elif not self.legal_moves():
+            self.winner = 'CPU' if self.bitboard.side == 'USER' else 'USER'
+        elif self.position_history.is_draw():
+            self.winner = 'DRAW'
+        return self.winner
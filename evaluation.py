@@ -0,0 +1,150 @@
+import os
+import json
+from bitboard import ROWS, FULL, step, DOWN_LEFT, DOWN_RIGHT, UP_LEFT, \
+    UP_RIGHT
+
+'''
+The evaluation module contains the weighted feature evaluation the CPU uses
+to judge positions. A position is described by a few features, each the
+difference between the user's and the CPU's count of something:
+  man        men
+  king       kings
+  advance    rows the men have come from their own back row
+  back_rank  men still on their own back row (they stop the other side
+             crowning)
+  mobility   simple moves the side could make (piece and direction pairs)
+The score is the weighted sum of the features, from the point of view of
+the side asked about. Mobility is left out of the default weights (it made
+the one-ply EASY CPU leave pieces where they could be taken) but can be
+given a weight by tuning. The weights come from WEIGHTS_PATH, a small JSON
+file written by tuner.py, if it exists, and otherwise from DEFAULT_WEIGHTS.
+batch_eval.py works out the same features for many positions at once with
+NumPy.
+'''
+
+FEATURES = ('man', 'king', 'advance', 'back_rank', 'mobility')
+DEFAULT_WEIGHTS = {'man': 100, 'king': 160, 'advance': 2, 'back_rank': 6,
+                   'mobility': 0}
+BACK_RANK = {'USER': ROWS[7], 'CPU': ROWS[0]}
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'weights.json')
+
+'''
+USER_ADVANCE[b][byte] is the advance of the user's men whose squares are
+the bits of byte, taken as byte b of a mask (rows 2b and 2b + 1), and
+CPU_ADVANCE the same for the CPU's men, so the advance of a whole side is
+four table lookups.
+'''
+USER_ADVANCE = [[(7 - 2 * b) * (byte & 0xF).bit_count() +
+                 (6 - 2 * b) * (byte >> 4).bit_count()
+                 for byte in range(256)] for b in range(4)]
+CPU_ADVANCE = [[2 * b * (byte & 0xF).bit_count() +
+                (2 * b + 1) * (byte >> 4).bit_count()
+                for byte in range(256)] for b in range(4)]
+
+
+'''
+This function returns the features of bitboard as a tuple in the order of
+FEATURES.
+'''
+def features(bitboard):
+    kings = bitboard.kings
+    user = bitboard.user
+    cpu = bitboard.cpu
+    user_men = user & ~kings
+    cpu_men = cpu & ~kings
+    user_kings = user & kings
+    cpu_kings = cpu & kings
+    empty = ~(user | cpu) & FULL
+    below_empty_left = step(empty, UP_RIGHT)
+    below_empty_right = step(empty, UP_LEFT)
+    above_empty_left = step(empty, DOWN_RIGHT)
+    above_empty_right = step(empty, DOWN_LEFT)
+    user_moves = (
+        (user & above_empty_left).bit_count() +
+        (user & above_empty_right).bit_count() +
+        (user_kings & below_empty_left).bit_count() +
+        (user_kings & below_empty_right).bit_count())
+    cpu_moves = (
+        (cpu & below_empty_left).bit_count() +
+        (cpu & below_empty_right).bit_count() +
+        (cpu_kings & above_empty_left).bit_count() +
+        (cpu_kings & above_empty_right).bit_count())
+    advance = (USER_ADVANCE[0][user_men & 0xFF] +
+               USER_ADVANCE[1][user_men >> 8 & 0xFF] +
+               USER_ADVANCE[2][user_men >> 16 & 0xFF] +
+               USER_ADVANCE[3][user_men >> 24] -
+               CPU_ADVANCE[0][cpu_men & 0xFF] -
+               CPU_ADVANCE[1][cpu_men >> 8 & 0xFF] -
+               CPU_ADVANCE[2][cpu_men >> 16 & 0xFF] -
+               CPU_ADVANCE[3][cpu_men >> 24])
+    return (user_men.bit_count() - cpu_men.bit_count(),
+            user_kings.bit_count() - cpu_kings.bit_count(),
+            advance,
+            (user_men & BACK_RANK['USER']).bit_count() -
+            (cpu_men & BACK_RANK['CPU']).bit_count(),
+            user_moves - cpu_moves)
+
+
+'''
+The Evaluator class scores positions with a set of weights (a dictionary
+keyed by the names in FEATURES; missing ones take their default).
+'''
+
+
+class Evaluator:
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.vector = tuple(self.weights[name] for name in FEATURES)
+
+    def evaluate(self, bitboard, side):
+        man, king, advance, back_rank, mobility = features(bitboard)
+        w = self.vector
+        score = (w[0] * man + w[1] * king + w[2] * advance +
+                 w[3] * back_rank + w[4] * mobility)
+        return score if side == 'USER' else -score
+
+
+def load_weights(path=WEIGHTS_PATH):
+    with open(path) as f:
+        weights = json.load(f)
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError('unknown features in %s: %s' %
+                         (path, ', '.join(sorted(unknown))))
+    return weights
+
+
+def save_weights(weights, path=WEIGHTS_PATH):
+    with open(path, 'w') as f:
+        json.dump({name: weights[name] for name in FEATURES}, f, indent=2)
+        f.write('\n')
+
+
+tuned = None
+
+
+'''
+This function returns the Evaluator with the weights in WEIGHTS_PATH, or
+None if there is no such file. It is read once, the first time it is
+needed.
+'''
+def tuned_evaluator():
+    global tuned
+    if tuned is None and os.path.exists(WEIGHTS_PATH):
+        tuned = Evaluator(load_weights())
+    return tuned
+
+
+default = None
+
+
+'''
+This function returns the Evaluator the CPU judges moves with: the tuned
+one if there is a weights file and one with DEFAULT_WEIGHTS otherwise.
+'''
+def default_evaluator():
+    global default
+    if default is None:
+        default = tuned_evaluator() or Evaluator()
+    return default
@@ -0,0 +1,245 @@
+import os
+import json
+import random
+import asyncio
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from checkers_rules import Board
+from bitboard import square_coords
+from search import STRENGTHS
+import tablebase
+import opening_book
+
+'''
+The game_server module hosts many games at once over a line-delimited JSON
+protocol, on a TCP port or a Unix socket. It needs no display: every session
+holds its own rules-only Board (see checkers_rules.py).
+
+Each request is one JSON object on its own line and gets one JSON object
+back on its own line, with "ok": true and the result, or "ok": false and an
+"error". A request may carry an "id", which is copied into its response.
+The commands are:
+  {"cmd": "new_game", "strength": "HARD"}    starts a session; returns its
+                                             "session" id and "state"
+  {"cmd": "move", "session": S, "from": [row, col], "to": [row, col]}
+                                             plays the user's move
+  {"cmd": "cpu_move", "session": S}          works out and plays the CPU's
+                                             move; returns it as "move"
+  {"cmd": "state", "session": S}             returns the "state"
+  {"cmd": "end", "session": S}               closes the session
+A state holds the position as FEN (see position_io.py), whose turn it is,
+the winner ("USER", "CPU" or "DRAW"; null while the game goes on), the
+pieces left, the plies played and the legal moves of the side to move as
+[old_row, old_col, new_row, new_col] lists.
+
+The CPU's moves are worked out on a shared pool of worker processes. Each
+worker keeps one engine per strength, so the engines' tables are reused
+between sessions. At most max_pending moves are queued or running at once;
+a connection asking for another waits until one finishes, and since each
+connection handles its requests in order it stops reading until then, so
+clients that send too much are slowed down rather than queued without
+limit.
+
+Example: python game_server.py --port 8765 --workers 4
+'''
+
+worker_engines = {}
+worker_tables = None
+worker_book = None
+
+
+def init_worker():
+    global worker_tables, worker_book
+    worker_tables = tablebase.load()
+    worker_book = opening_book.load()
+
+
+'''
+This function runs in a worker process and returns the CPU's move in the
+position given as FEN, at the given strength. positions is the game's
+repetition.PositionHistory, so that the engine knows which positions would
+repeat.
+'''
+def cpu_move_job(fen, strength, seed, positions):
+    board = Board.from_fen(fen, strength, random.Random(seed))
+    board.position_history = positions
+    board.tablebase = worker_tables
+    board.book = worker_book
+    if strength not in worker_engines:
+        worker_engines[strength] = board.get_engine()
+    board.engine = worker_engines[strength]
+    return board.cpu_next_move()
+
+
+class ServerError(Exception):
+    pass
+
+
+'''
+A Session is one game: its Board, the number of plies played and a lock so
+that two requests for the same game are handled one after the other.
+'''
+
+
+class Session:
+    def __init__(self, strength):
+        self.board = Board(strength)
+        self.board.initialize_game()
+        self.plies = 0
+        self.lock = asyncio.Lock()
+
+    def winner(self):
+        return self.board.check_game_over()
+
+    def state(self):
+        board = self.board
+        return {'fen': board.to_fen(), 'turn': board.bitboard.side,
+                'winner': self.winner(),
+                'user_pieces': board.num_user_pieces,
+                'cpu_pieces': board.num_cpu_pieces, 'plies': self.plies,
+                'moves': [list(square_coords(src) + square_coords(dst))
+                          for src, dst, captured in board.legal_moves()]}
+
+    def play(self, move, side):
+        if self.winner() is not None:
+            raise ServerError('the game is over')
+        if self.board.bitboard.side != side:
+            raise ServerError("it is not the %s's turn" % side.lower())
+        if (move[0] + move[1]) % 2 == 0 or (move[2] + move[3]) % 2 == 0 or \
+                self.board.find_move(*move) is None:
+            raise ServerError('illegal move')
+        self.board.update_board(*move)
+        self.plies += 1
+
+
+class GameServer:
+    def __init__(self, workers=None, max_pending=None, max_sessions=10000):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers,
+                                            initializer=init_worker)
+        self.pending = asyncio.Semaphore(max_pending or 2 * self.workers)
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.rng = random.Random()
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle_line(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_line(self, line):
+        self.requests += 1
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ServerError('a request must be a JSON object')
+            handler = getattr(self, 'cmd_' + str(request.get('cmd')), None)
+            if handler is None:
+                raise ServerError('unknown command: %s' % request.get('cmd'))
+            response = await handler(request)
+            response['ok'] = True
+        except (ServerError, ValueError, TypeError, KeyError) as e:
+            response = {'ok': False, 'error': str(e)}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    def session(self, request):
+        session = self.sessions.get(request.get('session'))
+        if session is None:
+            raise ServerError('no such session')
+        return session
+
+    async def cmd_new_game(self, request):
+        strength = str(request.get('strength', 'EASY')).upper()
+        if strength not in STRENGTHS or strength == 'PARALLEL':
+            raise ServerError('unknown strength: ' + strength)
+        if len(self.sessions) >= self.max_sessions:
+            raise ServerError('too many sessions')
+        session_id = next(self.ids)
+        self.sessions[session_id] = session = Session(strength)
+        return {'session': session_id, 'state': session.state()}
+
+    async def cmd_move(self, request):
+        session = self.session(request)
+        move = tuple(request['from']) + tuple(request['to'])
+        if len(move) != 4:
+            raise ServerError('from and to must be [row, col]')
+        async with session.lock:
+            session.play(move, 'USER')
+            return {'state': session.state()}
+
+    async def cmd_cpu_move(self, request):
+        session = self.session(request)
+        async with session.lock:
+            if session.winner() is not None:
+                raise ServerError('the game is over')
+            if session.board.bitboard.side != 'CPU':
+                raise ServerError("it is not the cpu's turn")
+            async with self.pending:
+                move = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, cpu_move_job, session.board.to_fen(),
+                    session.board.cpu_strength, self.rng.getrandbits(32),
+                    session.board.position_history)
+            session.play(move, 'CPU')
+            return {'move': list(move), 'state': session.state()}
+
+    async def cmd_state(self, request):
+        return {'state': self.session(request).state()}
+
+    async def cmd_end(self, request):
+        self.session(request)
+        del self.sessions[request['session']]
+        return {}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def serve(host, port, unix, workers, max_pending):
+    server = GameServer(workers, max_pending)
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle_connection,
+                                                   unix)
+        print('listening on', unix)
+    else:
+        listener = await asyncio.start_server(server.handle_connection,
+                                              host, port)
+        print('listening on %s:%d' % (host, port))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve many checkers games over line-delimited JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes working out CPU moves')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='CPU moves queued or running at once')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers,
+                          args.max_pending))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,88 @@
+from bitboard import bits, step
+
+'''
+The legal_moves module contains the MoveCache class, which keeps the list of
+legal moves for the side to move so that it is worked out once per ply and
+then shared by everything that needs it (the GUI highlighting, validating a
+move in update_board and the CPU choosing its move).
+
+Between plies the cache is updated rather than rebuilt. The simple moves of
+a piece only depend on the piece and on its four neighbouring squares, so
+they are cached per square and, after a move, only the squares the move
+changed and their neighbours are regenerated. Captures are found for the
+whole side at once from the bitboard masks, and because capturing is
+compulsory, capture sequences are only expanded when there is one.
+'''
+
+
+'''
+This function returns mask together with every square one diagonal step
+away from a square in mask.
+'''
+def with_neighbours(mask):
+    return mask | step(mask, 0) | step(mask, 1) | step(mask, 2) | \
+        step(mask, 3)
+
+
+class MoveCache:
+    def __init__(self):
+        self.simple = [None] * 32
+        self.moves = None
+        self.builds = 0
+        self.hits = 0
+        self.piece_generations = 0
+        self.pieces_reused = 0
+        self.capture_expansions = 0
+
+    '''
+    This function marks every square as changed, e.g. for a new game.
+    '''
+    def reset(self):
+        self.simple = [None] * 32
+        self.moves = None
+
+    '''
+    This function is called after a move with a mask of the squares the move
+    changed (where the piece came from, where it went and what it captured).
+    '''
+    def invalidate(self, changed):
+        simple = self.simple
+        for sq in bits(with_neighbours(changed)):
+            simple[sq] = None
+        self.moves = None
+
+    '''
+    This function returns the legal moves of the side to move in bitboard as
+    (src, dst, captured) tuples, building the list only if the position has
+    changed since the last call.
+    '''
+    def legal_moves(self, bitboard):
+        if self.moves is not None:
+            self.hits += 1
+            return self.moves
+        self.builds += 1
+        side = bitboard.side
+        steps, jumps = bitboard.movers(side)
+        jumpers = jumps[0] | jumps[1] | jumps[2] | jumps[3]
+        moves = []
+        if jumpers:
+            for sq in bits(jumpers):
+                self.capture_expansions += 1
+                moves.extend(bitboard.jump_sequences(sq, side))
+        else:
+            simple = self.simple
+            for sq in bits(steps[0] | steps[1] | steps[2] | steps[3]):
+                if simple[sq] is None:
+                    self.piece_generations += 1
+                    simple[sq] = bitboard.simple_moves(sq)
+                else:
+                    self.pieces_reused += 1
+                moves.extend(simple[sq])
+        self.moves = moves
+        return moves
+
+    def stats(self):
+        return {'builds': self.builds, 'hits': self.hits,
+                'piece_generations': self.piece_generations,
+                'pieces_reused': self.pieces_reused,
+                'capture_expansions': self.capture_expansions}
@@ -0,0 +1,116 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+
+'''
+The load_client module is a load generator for game_server.py. It opens a
+number of connections to the server and on each plays games one after
+another, the user's side making random legal moves and the CPU's moves being
+asked of the server, then reports the latency of the requests (p50 and p99,
+separately for the user's moves and the CPU's moves) and the number of games
+finished per second.
+
+Example: python load_client.py --port 8765 --clients 16 --games 4
+'''
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    async def request(self, **request):
+        self.next_id += 1
+        request['id'] = self.next_id
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        return response
+
+
+async def connect(host, port, unix):
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    return Client(reader, writer)
+
+
+'''
+This function plays games games on one connection and adds the time each
+request took to latencies, a dictionary of lists keyed by command.
+'''
+async def play(client, games, strength, max_plies, rng, latencies):
+    clock = time.perf_counter
+    finished = 0
+    for game in range(games):
+        response = await client.request(cmd='new_game', strength=strength)
+        session = response['session']
+        state = response['state']
+        while state['winner'] is None and state['plies'] < max_plies:
+            if state['turn'] == 'USER':
+                move = rng.choice(state['moves'])
+                start = clock()
+                response = await client.request(
+                    cmd='move', session=session, **{'from': move[:2]},
+                    to=move[2:])
+                latencies['move'].append(clock() - start)
+            else:
+                start = clock()
+                response = await client.request(cmd='cpu_move',
+                                                session=session)
+                latencies['cpu_move'].append(clock() - start)
+            state = response['state']
+        await client.request(cmd='end', session=session)
+        finished += 1
+    client.writer.close()
+    return finished
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run(host, port, unix, clients, games, strength, max_plies, seed):
+    latencies = {'move': [], 'cpu_move': []}
+    connections = [await connect(host, port, unix) for i in range(clients)]
+    start = time.perf_counter()
+    finished = await asyncio.gather(*[
+        play(client, games, strength, max_plies, random.Random(seed + i),
+             latencies) for i, client in enumerate(connections)])
+    elapsed = time.perf_counter() - start
+    return sum(finished), elapsed, latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play many games against game_server.py at once and '
+                    'report move latency and games per second.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--games', type=int, default=4,
+                        help='games played one after another per client')
+    parser.add_argument('--strength', default='EASY')
+    parser.add_argument('--max-plies', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    games, elapsed, latencies = asyncio.run(run(
+        args.host, args.port, args.unix, args.clients, args.games,
+        args.strength, args.max_plies, args.seed))
+    print('%d games in %.2f s (%.2f games/s)' %
+          (games, elapsed, games / elapsed))
+    for name, values in latencies.items():
+        print('%-8s %6d requests  p50 %7.2f ms  p99 %7.2f ms' %
+              (name, len(values), 1000 * percentile(values, 0.5),
+               1000 * percentile(values, 0.99)))
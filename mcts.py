@@ -0,0 +1,499 @@
+import os
+import math
+import time
+import random
+import argparse
+from multiprocessing import Pool
+from bitboard import BitBoard, STEPS, OPPOSITE, NEIGHBOURS, JUMPS, FULL, \
+    ROWS
+from search import other_side
+
+'''
+The mcts module contains MCTS, a Monte Carlo tree search player for the MCTS
+strength. Instead of searching every move to a fixed depth it grows a tree
+of the positions it has found most promising: each iteration walks down the
+tree choosing children by the UCT formula, adds one new position to it,
+plays a random game (a playout) from there and counts the result in every
+position on the way back up. The move played is the root move visited most.
+
+Playouts do not use BitBoard.generate_moves or the Board's list-of-tuples
+API. playout works on the three masks as plain integers, picks a random
+piece and direction straight from the movers' bit masks and follows a
+capture sequence one random jump at a time, so it builds no move lists at
+all. A playout that reaches max_playout_plies is scored by material.
+
+The tree is kept from move to move. When best_move is next called, the new
+position is looked for among the grandchildren of the old root (the CPU's
+move and the user's reply) and, if found, becomes the root with everything
+learned about it so far; the rest of the tree is released. (So when the
+MoveProvider ponders several of the user's replies, each one after the first
+starts from a new tree.) Released nodes go on a free list and are reused,
+and no more than max_nodes nodes are ever made, so the tree's memory is
+bounded: once they are all in use the tree stops growing and iterations play
+out from its leaves.
+
+With workers greater than 1, playouts run on a pool of worker processes.
+Each step selects a batch of leaves (a virtual loss counted on the way down
+steers the later selections of the batch away from the earlier ones), sends
+playouts_per_leaf playouts of each to the pool and counts the results when
+they come back.
+
+Example: python mcts.py --seconds 2 --workers 1 2 4
+'''
+
+UP_MOVES = (2, 3)
+DOWN_MOVES = (0, 1)
+
+
+'''
+This function plays a random game from the position given by the three
+masks, with side to move, and returns its result for the user: 1 for a win,
+0 for a loss and 1/2 for a draw. A side with no moves has lost. After
+max_plies plies the side with more material (kings counting as two men) is
+taken to have won.
+'''
+def playout(user, cpu, kings, side, rng, max_plies=80):
+    randrange = rng.randrange
+    user_turn = side == 'USER'
+    for ply in range(max_plies):
+        if user_turn:
+            own, opponent, forward = user, cpu, UP_MOVES
+            promotion = ROWS[0]
+        else:
+            own, opponent, forward = cpu, user, DOWN_MOVES
+            promotion = ROWS[7]
+        empty = ~(user | cpu) & FULL
+        own_kings = own & kings
+        steps = [0, 0, 0, 0]
+        jumps = [0, 0, 0, 0]
+        jump_count = 0
+        step_count = 0
+        for d in range(4):
+            candidates = own if d in forward else own_kings
+            if not candidates:
+                continue
+            (bits_a, shift_a), (bits_b, shift_b) = STEPS[OPPOSITE[d]]
+            if shift_a > 0:
+                behind = (empty & bits_a) << shift_a | \
+                    (empty & bits_b) << shift_b
+                target = behind & opponent
+                behind_jump = (target & bits_a) << shift_a | \
+                    (target & bits_b) << shift_b
+            else:
+                behind = (empty & bits_a) >> -shift_a | \
+                    (empty & bits_b) >> -shift_b
+                target = behind & opponent
+                behind_jump = (target & bits_a) >> -shift_a | \
+                    (target & bits_b) >> -shift_b
+            jumps[d] = candidates & behind_jump
+            jump_count += jumps[d].bit_count()
+            if not jump_count:
+                steps[d] = candidates & behind
+                step_count += steps[d].bit_count()
+
+        if jump_count:
+            n = randrange(jump_count)
+            d = 0
+            while jumps[d].bit_count() <= n:
+                n -= jumps[d].bit_count()
+                d += 1
+            mask = jumps[d]
+            for i in range(n):
+                mask &= mask - 1
+            sq = (mask & -mask).bit_length() - 1
+            king = kings >> sq & 1
+            directions = (0, 1, 2, 3) if king else forward
+            occupied = (user | cpu) & ~(1 << sq)
+            captured = 0
+            at = sq
+            while True:
+                captured |= 1 << NEIGHBOURS[d][at]
+                at = JUMPS[d][at]
+                if not king and promotion >> at & 1:
+                    break
+                options = []
+                for e in directions:
+                    landing = JUMPS[e][at]
+                    if landing < 0:
+                        continue
+                    over = 1 << NEIGHBOURS[e][at]
+                    if opponent & over and not captured & over and \
+                            not occupied >> landing & 1:
+                        options.append(e)
+                if not options:
+                    break
+                d = options[randrange(len(options))]
+            dst = at
+        elif step_count:
+            n = randrange(step_count)
+            d = 0
+            while steps[d].bit_count() <= n:
+                n -= steps[d].bit_count()
+                d += 1
+            mask = steps[d]
+            for i in range(n):
+                mask &= mask - 1
+            sq = (mask & -mask).bit_length() - 1
+            dst = NEIGHBOURS[d][sq]
+            captured = 0
+        else:
+            return 0.0 if user_turn else 1.0
+
+        moved = 1 << sq | 1 << dst
+        if user_turn:
+            user ^= moved
+            cpu &= ~captured
+        else:
+            cpu ^= moved
+            user &= ~captured
+        kings &= ~captured
+        if kings >> sq & 1:
+            kings ^= moved
+        elif promotion >> dst & 1:
+            kings |= 1 << dst
+        user_turn = not user_turn
+
+    material = (user.bit_count() + (user & kings).bit_count() -
+                cpu.bit_count() - (cpu & kings).bit_count())
+    if material > 0:
+        return 1.0
+    if material < 0:
+        return 0.0
+    return 0.5
+
+
+'''
+This function runs in a worker process. It plays count playouts from one
+position and returns the sum of their results for the user.
+'''
+def run_playouts(args):
+    user, cpu, kings, side, count, max_plies, seed = args
+    rng = random.Random(seed)
+    return sum(playout(user, cpu, kings, side, rng, max_plies)
+               for i in range(count))
+
+
+'''
+A Node is one position in the tree, reached from its parent by move. wins
+is the total result of the playouts through it for the side that made move,
+and visits their number. untried holds the legal moves that do not have a
+child yet; it is None until the node is first selected.
+'''
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self):
+        self.reset(None, None)
+
+    def reset(self, move, parent):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+
+class MCTS:
+    def __init__(self, time_limit=1.0, max_playouts=None, max_nodes=100000,
+                 exploration=1.4, max_playout_plies=80, workers=1,
+                 playouts_per_leaf=8, rng=None):
+        self.time_limit = time_limit
+        self.max_playouts = max_playouts
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.max_playout_plies = max_playout_plies
+        self.workers = workers or os.cpu_count() or 1
+        self.playouts_per_leaf = playouts_per_leaf if self.workers > 1 else 1
+        self.rng = rng or random.Random()
+        self.pool = Pool(self.workers) if self.workers > 1 else None
+        self.root = None
+        self.root_position = None
+        self.free = []
+        self.nodes = 0
+        self.stop_requested = False
+        self.stats = {}
+
+    '''
+    This function returns a node for move, reusing a released one if there
+    is one, or None if max_nodes nodes are already in use.
+    '''
+    def new_node(self, move, parent):
+        if self.free:
+            node = self.free.pop()
+        elif self.nodes < self.max_nodes:
+            node = Node()
+            self.nodes += 1
+        else:
+            return None
+        node.reset(move, parent)
+        return node
+
+    '''
+    This function puts node and everything below it, except keep and its
+    subtree, on the free list.
+    '''
+    def release(self, node, keep=None):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is keep:
+                continue
+            stack.extend(node.children)
+            node.reset(None, None)
+            self.free.append(node)
+
+    '''
+    This function makes the root the node for bitboard, keeping its subtree
+    if bitboard is the old root or one or two plies below it, and starting
+    a new tree otherwise. It returns the number of visits kept.
+    '''
+    def advance(self, bitboard):
+        found = None
+        if self.root is not None:
+            position = self.root_position
+            if position == bitboard:
+                found = self.root
+            for child in self.root.children:
+                if found is not None:
+                    break
+                undo = position.make_move(child.move)
+                if position == bitboard:
+                    found = child
+                for grandchild in child.children:
+                    if found is not None:
+                        break
+                    grandchild_undo = position.make_move(grandchild.move)
+                    if position == bitboard:
+                        found = grandchild
+                    position.unmake_move(grandchild_undo)
+                position.unmake_move(undo)
+            self.release(self.root, found)
+        if found is None:
+            found = self.new_node(None, None)
+        found.parent = None
+        self.root = found
+        self.root_position = bitboard.copy()
+        return found.visits
+
+    '''
+    This function returns the best (src, dst, captured) move for side, or
+    None if side has no moves, running iterations until the time limit, the
+    playout limit or stop. The legal moves can be passed in as moves if the
+    caller already has them. positions is accepted so that MCTS can stand in
+    for Search, but is not used: playouts end after max_playout_plies
+    whether or not they repeat.
+    '''
+    def best_move(self, bitboard, side, moves=None, positions=None):
+        start = time.perf_counter()
+        self.stop_requested = False
+        bitboard = bitboard.copy()
+        bitboard.side = side
+        reused = self.advance(bitboard)
+        root = self.root
+        if root.untried is None:
+            root.untried = list(moves) if moves is not None else \
+                bitboard.generate_moves(side)
+        if len(root.untried) + len(root.children) <= 1:
+            only = root.untried or [child.move for child in root.children]
+            self.stats = {'playouts': 0, 'nodes': self.nodes - len(self.free),
+                          'seconds': 0.0, 'pps': 0, 'reused': reused}
+            return only[0] if only else None
+
+        deadline = None
+        if self.time_limit is not None:
+            deadline = start + self.time_limit
+        batch = 2 * self.workers if self.pool is not None else 1
+        playouts = 0
+        while not self.stop_requested:
+            if self.max_playouts is not None and \
+                    playouts >= self.max_playouts:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            playouts += self.iterate(bitboard, batch)
+
+        elapsed = time.perf_counter() - start
+        best = max(root.children, key=lambda child: child.visits)
+        self.stats = {'playouts': playouts,
+                      'nodes': self.nodes - len(self.free), 'seconds': elapsed,
+                      'pps': int(playouts / elapsed) if elapsed else 0,
+                      'reused': reused,
+                      'score': best.wins / best.visits if best.visits else 0}
+        return best.move
+
+    '''
+    This function selects batch leaves, plays out each of them
+    playouts_per_leaf times (on the pool if there is one) and counts the
+    results in the tree. It returns the number of playouts played.
+    '''
+    def iterate(self, bitboard, batch):
+        count = self.playouts_per_leaf
+        leaves = [self.select(bitboard, count) for i in range(batch)]
+        tasks = [(user, cpu, kings, side, count, self.max_playout_plies,
+                  self.rng.getrandbits(32))
+                 for path, side, user, cpu, kings in leaves
+                 if user is not None]
+        if self.pool is not None:
+            results = iter(self.pool.map(run_playouts, tasks))
+        else:
+            results = (playout(user, cpu, kings, side, self.rng,
+                               self.max_playout_plies)
+                       for user, cpu, kings, side, count, max_plies, seed
+                       in tasks)
+        for path, side, user, cpu, kings in leaves:
+            if user is None:
+                user_wins = count if side == 'CPU' else 0
+            else:
+                user_wins = next(results)
+            self.backup(path, side, user_wins, count)
+        return len(tasks) * count
+
+    '''
+    This function walks down from the root, choosing children by UCT and
+    adding a child for an untried move at the first node that has one, and
+    returns the path taken, the side to move at its end and that position's
+    masks (None if the side to move has no moves, so the game is over).
+    visits is added to every node on the way down at once, as a virtual
+    loss, so that the other selections of a batch go elsewhere.
+    '''
+    def select(self, bitboard, visits):
+        node = self.root
+        node.visits += visits
+        path = [node]
+        undos = []
+        while True:
+            if node.untried is None:
+                node.untried = bitboard.generate_moves(bitboard.side)
+            if node.untried:
+                untried = node.untried
+                i = self.rng.randrange(len(untried))
+                child = self.new_node(untried[i], node)
+                if child is not None:
+                    untried[i] = untried[-1]
+                    untried.pop()
+                    node.children.append(child)
+                    undos.append(bitboard.make_move(child.move))
+                    child.visits += visits
+                    path.append(child)
+                    break
+            if not node.children:
+                break
+            node = self.choose(node)
+            undos.append(bitboard.make_move(node.move))
+            node.visits += visits
+            path.append(node)
+        side = bitboard.side
+        if node.untried is None:
+            node.untried = bitboard.generate_moves(side)
+        if node.untried or node.children:
+            leaf = (path, side, bitboard.user, bitboard.cpu, bitboard.kings)
+        else:
+            leaf = (path, side, None, None, None)
+        while undos:
+            bitboard.unmake_move(undos.pop())
+        return leaf
+
+    '''
+    This function returns the child of node with the highest UCT value: its
+    average result for the side to move at node plus an exploration term
+    that grows for children visited less than their siblings.
+    '''
+    def choose(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            visits = child.visits
+            value = child.wins / visits + \
+                exploration * math.sqrt(log_visits / visits)
+            if value > best_value:
+                best_value = value
+                best = child
+        return best
+
+    '''
+    This function adds the results of count playouts (user_wins of them won
+    by the user) to the nodes of path, side being the side to move at its
+    last node. Each node is credited from the point of view of the side that
+    moved into it. Their visits were already counted by select.
+    '''
+    def backup(self, path, side, user_wins, count):
+        mover = other_side(side)
+        for node in reversed(path):
+            node.wins += user_wins if mover == 'USER' else count - user_wins
+            mover = other_side(mover)
+
+    '''
+    This function returns the (src, dst) move the tree expects to be played
+    from bitboard, the position after the move best_move chose: the most
+    visited reply under that move, or None if it has none. It is what the
+    MoveProvider ponders first, as Search.expected_reply is.
+    '''
+    def expected_reply(self, bitboard):
+        if self.root is None:
+            return None
+        position = self.root_position
+        for child in self.root.children:
+            undo = position.make_move(child.move)
+            found = position == bitboard
+            position.unmake_move(undo)
+            if found and child.children:
+                reply = max(child.children, key=lambda node: node.visits)
+                return reply.move[:2]
+        return None
+
+    '''
+    This function can be called from another thread to end the current
+    search early. best_move then returns the most visited move so far.
+    '''
+    def stop(self):
+        self.stop_requested = True
+
+    '''
+    This function shuts down the worker processes, if there are any.
+    '''
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+
+'''
+This function plays playouts from position for the given number of seconds,
+one after another on this process, and returns how many it played.
+'''
+def bench_playouts(position, seconds, rng):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        playout(position.user, position.cpu, position.kings, position.side,
+                rng)
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time random playouts and the MCTS player with '
+                    'different numbers of worker processes.')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, nargs='*',
+                        default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    start_position = BitBoard(0xFFF00000, 0x00000FFF, 0, 'CPU')
+    count = bench_playouts(start_position, args.seconds, random.Random(0))
+    print('bare playouts:  %7d playouts/s' % (count / args.seconds))
+    for workers in sorted(set(args.workers)):
+        engine = MCTS(time_limit=args.seconds, workers=workers,
+                      rng=random.Random(0))
+        engine.best_move(start_position, 'CPU')
+        stats = engine.stats
+        print('%2d workers:     %7d playouts/s  %6d playouts  %6d nodes' %
+              (workers, stats['pps'], stats['playouts'], stats['nodes']))
+        engine.close()
+    print('(%d CPU cores available)' % (os.cpu_count() or 1))
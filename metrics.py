@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import threading
+
+'''
+The metrics module is an opt-in record of where the game's time goes. When
+it is enabled it wraps the methods it measures (the Board's
+space_available, update_board and cpu_next_move, the drawing of the board
+and the flips of the display) in functions that time every call, keeps a
+count, total and maximum for each, and records the statistics of every
+search the CPU runs (nodes, depth, nodes per second and transposition table
+hits). It can print a summary every few seconds and write everything it saw
+as a timeline that chrome://tracing or Perfetto can open.
+
+Nothing is wrapped until enable is called, and disable puts the original
+methods back, so leaving this module in costs nothing when it is off.
+
+It is switched on with environment variables, e.g.
+  CHECKERS_METRICS=5 CHECKERS_TRACE=trace.json python checkers_game.py
+CHECKERS_METRICS is the number of seconds between summaries (0 for a
+summary only at the end) and CHECKERS_TRACE the file the timeline is
+written to when the program ends.
+'''
+
+enabled = False
+recorder = None
+wrapped = []
+reporter = None
+last_search_stats = None
+
+
+'''
+The Recorder class holds what has been measured. The timeline keeps at most
+max_events events so that a long game does not use ever more memory; the
+totals keep counting after that.
+'''
+
+
+class Recorder:
+    def __init__(self, max_events=200000):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.max_events = max_events
+        self.totals = {}
+        self.counters = {}
+        self.events = []
+        self.dropped = 0
+
+    def record(self, name, category, start, end, args=None):
+        seconds = end - start
+        with self.lock:
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, seconds, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+                if seconds > total[2]:
+                    total[2] = seconds
+            if len(self.events) < self.max_events:
+                event = {'name': name, 'cat': category, 'ph': 'X',
+                         'ts': (start - self.start) * 1e6,
+                         'dur': seconds * 1e6, 'pid': os.getpid(),
+                         'tid': threading.get_ident()}
+                if args:
+                    event['args'] = args
+                self.events.append(event)
+            else:
+                self.dropped += 1
+
+    '''
+    This function records the values of a set of counters (e.g. the
+    statistics of one search) for the summary, and a counter event for the
+    timeline. The summary shows the running total of each value, except for
+    the keys in averaged (rates and depths, which mean nothing added up),
+    whose mean and maximum it shows instead.
+    '''
+    def count(self, name, values, averaged=()):
+        with self.lock:
+            counters = self.counters.setdefault(name, {})
+            for key, value in values.items():
+                counter = counters.get(key)
+                if counter is None:
+                    counters[key] = [1, value, value, key in averaged]
+                else:
+                    counter[0] += 1
+                    counter[1] += value
+                    if value > counter[2]:
+                        counter[2] = value
+            if len(self.events) < self.max_events:
+                self.events.append({
+                    'name': name, 'ph': 'C', 'pid': os.getpid(),
+                    'ts': (time.perf_counter() - self.start) * 1e6,
+                    'args': values})
+
+    def summary(self):
+        with self.lock:
+            lines = ['%-18s %8s %10s %9s %9s' %
+                     ('', 'calls', 'total ms', 'mean ms', 'max ms')]
+            for name, (calls, seconds, longest) in sorted(
+                    self.totals.items()):
+                lines.append('%-18s %8d %10.1f %9.3f %9.3f' %
+                             (name, calls, 1000 * seconds,
+                              1000 * seconds / calls, 1000 * longest))
+            for name, counters in sorted(self.counters.items()):
+                values = []
+                for key, (calls, total, largest, averaged) in sorted(
+                        counters.items()):
+                    if averaged:
+                        values.append('%s mean %.1f max %d' %
+                                      (key, total / calls, largest))
+                    else:
+                        values.append('%s %d' % (key, total))
+                lines.append('%s: %s' % (name, ', '.join(values)))
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        with self.lock:
+            trace = {'traceEvents': list(self.events),
+                     'displayTimeUnit': 'ms',
+                     'otherData': {'dropped_events': self.dropped}}
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+
+'''
+This function replaces owner.attribute (a method of a class or a function
+of a module) with a version that records each call under name. after, if
+given, is called with the call's arguments and result once it returns.
+'''
+def instrument(owner, attribute, name, category, after=None):
+    function = getattr(owner, attribute)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            recorder.record(name, category, start, time.perf_counter())
+        if after is not None:
+            after(args, result)
+        return result
+    timed.__wrapped__ = function
+    setattr(owner, attribute, timed)
+    wrapped.append((owner, attribute, function))
+
+
+'''
+These keys of a search's statistics are recorded for every search. The
+summary adds up the counts and shows the mean and maximum of
+SEARCH_AVERAGES.
+'''
+SEARCH_STATS = ('nodes', 'depth', 'nps', 'tt_hits', 'tt_misses', 'playouts')
+SEARCH_AVERAGES = ('depth', 'nps')
+
+
+def record_search(args, result):
+    global last_search_stats
+    stats = args[0].last_search_stats
+    if stats is not None and stats is not last_search_stats:
+        last_search_stats = stats
+        recorder.count('search', {key: stats[key] for key in SEARCH_STATS
+                                  if key in stats}, SEARCH_AVERAGES)
+
+
+'''
+This function turns the metrics on and wraps the methods they measure. The
+drawing and display methods are only wrapped if pygame is already in use,
+so enabling metrics does not load it. If summary_interval is a number of
+seconds, a summary is printed to stderr that often.
+'''
+def enable(summary_interval=None, max_events=200000):
+    global enabled, recorder, reporter
+    if enabled:
+        return
+    from checkers_rules import Board
+    recorder = Recorder(max_events)
+    instrument(Board, 'space_available', 'space_available', 'rules')
+    instrument(Board, 'update_board', 'update_board', 'rules')
+    instrument(Board, 'cpu_next_move', 'cpu_next_move', 'cpu',
+               record_search)
+    if 'pygame' in sys.modules:
+        import pygame
+        from checker_board import Board as DrawnBoard
+        from renderer import BoardRenderer
+        instrument(DrawnBoard, 'draw', 'draw', 'draw')
+        instrument(BoardRenderer, 'render', 'render', 'draw')
+        instrument(pygame.display, 'flip', 'flip', 'frame')
+        instrument(pygame.display, 'update', 'display_update', 'frame')
+    enabled = True
+    if summary_interval:
+        reporter = threading.Event()
+        threading.Thread(target=report_every,
+                         args=(summary_interval, reporter),
+                         daemon=True).start()
+
+
+def report_every(seconds, stopped):
+    while not stopped.wait(seconds):
+        print(recorder.summary(), file=sys.stderr)
+
+
+'''
+This function puts the original methods back and stops the summaries. What
+was recorded stays in recorder.
+'''
+def disable():
+    global enabled, reporter
+    while wrapped:
+        owner, attribute, function = wrapped.pop()
+        setattr(owner, attribute, function)
+    if reporter is not None:
+        reporter.set()
+        reporter = None
+    enabled = False
+
+
+'''
+This function enables the metrics if CHECKERS_METRICS or CHECKERS_TRACE is
+set, and returns whether it did.
+'''
+def enable_from_env():
+    interval = os.environ.get('CHECKERS_METRICS')
+    if interval is None and 'CHECKERS_TRACE' not in os.environ:
+        return False
+    enable(float(interval) if interval else None)
+    return True
+
+
+'''
+This function is called when the program ends. If the metrics are on it
+prints the final summary, writes the timeline to CHECKERS_TRACE if that is
+set and turns the metrics off.
+'''
+def finish():
+    if not enabled:
+        return
+    disable()
+    print(recorder.summary(), file=sys.stderr)
+    path = os.environ.get('CHECKERS_TRACE')
+    if path:
+        recorder.write_trace(path)
+        print('trace written to', path, file=sys.stderr)
@@ -0,0 +1,227 @@
+import time
+import threading
+
+'''
+The move_provider module lets the game ask for the CPU's move without
+waiting for it. The MoveProvider runs Board.cpu_next_move on a worker thread,
+on a copy of the board, while the main loop keeps handling events, and the
+main loop polls it until the move is ready. The move it hands back is in the
+usual (old_row, old_col, new_row, new_col) form and is applied to the real
+board with Board.update_board as before.
+
+While the user thinks, the MoveProvider can ponder: starting from the
+position after the CPU's move, it plays each of the user's replies on a
+copy of the board, most likely first, and works out the CPU's answer to it
+on the same worker thread, keeping the answers by the Zobrist key of the
+position the reply leads to. When the user's move is then asked for with
+request, an answer that is already there is handed back at once (a ponder
+hit), and if the user played the reply being searched at that moment, that
+search simply carries on as the request. Otherwise the answers are thrown
+away and the move is searched as usual, with the engine's transposition
+table (or MCTS tree) still holding what pondering found.
+'''
+
+
+class MoveProvider:
+    '''
+    time_limit is the longest, in seconds, a search may run before it is
+    told to stop and return the best move it has found so far. None leaves
+    it to the engine's own limits.
+    '''
+    def __init__(self, time_limit=None):
+        self.time_limit = time_limit
+        self.lock = threading.Lock()
+        self.request_id = 0
+        self.engine = None
+        self.thread = None
+        self.deadline = None
+        self.move = None
+        self.error = None
+        self.stats = None
+        self.ponder_id = 0
+        self.pondered = {}
+        self.pondering = None
+        self.ponder_request = None
+        self.ponder_started = False
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    '''
+    This function starts working out the CPU's move for board in the
+    background. If pondering has already answered the position, or is
+    answering it right now, that answer is used. Otherwise any request or
+    pondering that is still running is cancelled first, and its thread is
+    waited for since it may be using the same engine.
+    '''
+    def request(self, board):
+        key = board.bitboard.key
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+            self.move = None
+            self.error = None
+            self.stats = None
+            self.ponder_id += 1
+            pondered_turn = self.ponder_started
+            self.ponder_started = False
+            pondered = self.pondered.get(key)
+            self.pondered = {}
+            searching = pondered is None and self.pondering == key
+            if searching:
+                self.ponder_request = request_id
+            elif pondered is not None:
+                self.move, self.stats = pondered
+        if pondered is not None or searching:
+            self.ponder_hits += 1
+            self.deadline = None
+            if searching and self.time_limit is not None:
+                self.deadline = time.perf_counter() + self.time_limit
+            if pondered is not None and self.busy() and \
+                    self.engine is not None:
+                self.engine.stop()
+            return
+        if pondered_turn:
+            self.ponder_misses += 1
+        self.cancel()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+        self.engine = board.get_engine()
+        self.deadline = None
+        if self.time_limit is not None:
+            self.deadline = time.perf_counter() + self.time_limit
+        self.thread = threading.Thread(target=self.run,
+                                       args=(board.copy(), request_id),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, board, request_id):
+        move = None
+        error = None
+        try:
+            move = board.cpu_next_move()
+        except Exception as e:
+            error = e
+        with self.lock:
+            if request_id == self.request_id:
+                self.move = move
+                self.error = error
+                self.stats = board.last_search_stats
+
+    '''
+    This function starts pondering on board, the position after the CPU's
+    move with the user to move. Any request that is still running is
+    cancelled first.
+    '''
+    def ponder(self, board):
+        self.cancel()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            self.ponder_id += 1
+            ponder_id = self.ponder_id
+            self.ponder_started = True
+        self.engine = board.get_engine()
+        self.deadline = None
+        self.thread = threading.Thread(target=self.run_ponder,
+                                       args=(board.copy(), ponder_id),
+                                       daemon=True)
+        self.thread.start()
+
+    '''
+    This function answers the user's replies one after another until they
+    have all been answered or pondering is stopped. An answer cut short by
+    a stop is not kept, unless the user played that reply, in which case it
+    is the answer to the request.
+    '''
+    def run_ponder(self, board, ponder_id):
+        for move in self.predicted_moves(board):
+            undo = board.make_move(move)
+            if board.check_game_over() is not None:
+                board.unmake_move(undo)
+                continue
+            key = board.bitboard.key
+            with self.lock:
+                if ponder_id != self.ponder_id:
+                    return
+                self.pondering = key
+            answer = None
+            error = None
+            try:
+                answer = board.cpu_next_move()
+            except Exception as e:
+                error = e
+            with self.lock:
+                self.pondering = None
+                if self.ponder_request is not None:
+                    if self.ponder_request == self.request_id:
+                        self.move = answer
+                        self.error = error
+                        self.stats = board.last_search_stats
+                    self.ponder_request = None
+                    return
+                if ponder_id != self.ponder_id or error is not None:
+                    return
+                self.pondered[key] = (answer, board.last_search_stats)
+            board.unmake_move(undo)
+
+    '''
+    This function returns the user's legal moves on board in the order they
+    are pondered: the reply the engine expected when it chose the CPU's
+    move (see expected_reply in search.py), then the rest from best to worst
+    for the user by the board's evaluator.
+    '''
+    def predicted_moves(self, board):
+        bitboard = board.bitboard
+        scores = {}
+        for move in board.legal_moves():
+            undo = bitboard.make_move(move)
+            scores[move] = board.evaluator.evaluate(bitboard, 'USER')
+            bitboard.unmake_move(undo)
+        expected = None
+        if board.engine is not None:
+            expected = board.engine.expected_reply(bitboard)
+        return sorted(scores, key=lambda move: (move[:2] != expected,
+                                                -scores[move]))
+
+    '''
+    This function returns the move once it is ready and None until then.
+    Once the deadline has passed it tells the engine to stop, so the best
+    move found so far arrives shortly after. If the search failed, its
+    exception is raised here, on the caller's thread.
+    '''
+    def poll(self):
+        with self.lock:
+            move = self.move
+            error = self.error
+            self.move = None
+            self.error = None
+        if error is not None:
+            raise error
+        if move is None and self.deadline is not None and \
+                time.perf_counter() >= self.deadline and \
+                self.engine is not None:
+            self.engine.stop()
+        return move
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    '''
+    This function abandons the current request, e.g. when the window is
+    closed or a new game is started. The search is told to stop and whatever
+    it returns is thrown away.
+    '''
+    def cancel(self):
+        with self.lock:
+            self.request_id += 1
+            self.ponder_id += 1
+            self.pondered = {}
+            self.ponder_request = None
+            self.ponder_started = False
+            self.move = None
+            self.error = None
+        if self.busy() and self.engine is not None:
+            self.engine.stop()
@@ -0,0 +1,257 @@
+import os
+import mmap
+import time
+import bisect
+import random
+import struct
+import argparse
+from bitboard import square_coords
+from position_io import GameWriter, read_games, resolve_move
+from simulation import play_game, make_policy
+
+'''
+The opening_book module builds and reads the CPU's opening book: for the
+positions reached in the first plies of a set of games, the moves that were
+played from them, how often and how the games ended.
+
+The book is built from game records (see position_io.py), either imported or
+made by self-play, and saved as a file of fixed-size entries sorted by the
+position's Zobrist hash (bitboard.key) and then by move. Each entry holds the
+hash, the move's from and to squares, the number of games that played it and
+how many of those the side making the move went on to win and to lose. The
+hashes of the entries can be read from a memory map as one array of 64-bit
+integers, so a lookup is a binary search (bisect) over the file and the book
+is never loaded into memory.
+
+Examples:
+  python opening_book.py --self-play 200 --records openings.pdn
+  python opening_book.py --records openings.pdn --out opening.book
+'''
+
+MAGIC = b'CKOB'
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<QBBxxIII')
+BOOK_PLIES = 12
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'opening.book')
+
+
+'''
+The BookBuilder class collects the moves played in the first plies of games
+and writes them out as a book.
+'''
+
+
+class BookBuilder:
+    def __init__(self, plies=BOOK_PLIES):
+        self.plies = plies
+        self.positions = {}
+        self.games = 0
+
+    '''
+    This function adds one game, given its starting BitBoard, its moves as
+    read_games gives them and its winner ('USER', 'CPU', 'DRAW' or None).
+    '''
+    def add_game(self, start, moves, winner):
+        bitboard = start.copy()
+        self.games += 1
+        for squares in moves[:self.plies]:
+            move = resolve_move(bitboard, squares)
+            if move is None:
+                return
+            stats = self.positions.setdefault(bitboard.key, {}) \
+                .setdefault(move[:2], [0, 0, 0])
+            stats[0] += 1
+            if winner == bitboard.side:
+                stats[1] += 1
+            elif winner in ('USER', 'CPU'):
+                stats[2] += 1
+            bitboard.make_move(move)
+
+    def add_records(self, path):
+        for game in read_games(path):
+            self.add_game(game['start'], game['moves'], game['winner'])
+
+    '''
+    This function writes the book to path, leaving out moves played in
+    fewer than min_games games, and returns the number of entries.
+    '''
+    def save(self, path=DEFAULT_PATH, min_games=1):
+        entries = []
+        for key, moves in self.positions.items():
+            for (src, dst), (games, wins, losses) in moves.items():
+                if games >= min_games:
+                    entries.append((key, src, dst, games, wins, losses))
+        entries.sort()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(entries)))
+            for entry in entries:
+                f.write(ENTRY.pack(*entry))
+        return len(entries)
+
+
+'''
+The OpeningBook class reads a book written by BookBuilder. lookup returns
+the entries for a position as (src, dst, games, wins, losses) tuples, and
+choose picks one of the position's legal moves from the book, or returns
+None if the position is not in it.
+'''
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_PATH):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(path + ' is not an opening book')
+        words = memoryview(self.map)[HEADER.size:
+                                     HEADER.size + self.count * ENTRY.size]
+        self.keys = words.cast('Q')[::ENTRY.size // 8]
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key):
+        self.probes += 1
+        i = bisect.bisect_left(self.keys, key)
+        entries = []
+        while i < self.count and self.keys[i] == key:
+            entry = ENTRY.unpack_from(self.map, HEADER.size + i * ENTRY.size)
+            entries.append(entry[1:])
+            i += 1
+        if entries:
+            self.hits += 1
+        return entries
+
+    '''
+    The move is picked at random, each book move being weighted by the
+    number of games it was played in times its score for the side playing
+    it (a win counting 1 and a draw 1/2, with one extra win and one extra
+    loss added so that rarely played moves are not over- or under-rated).
+    Book moves that are not legal in the position (possible only if two
+    positions share a hash) are ignored.
+    '''
+    def choose(self, bitboard, moves, rng=random):
+        legal = {(move[0], move[1]): move for move in moves}
+        choices = []
+        weights = []
+        for src, dst, games, wins, losses in self.lookup(bitboard.key):
+            if (src, dst) in legal:
+                draws = games - wins - losses
+                choices.append(legal[(src, dst)])
+                weights.append(games * (wins + draws / 2 + 1) / (games + 2))
+        if not choices:
+            return None
+        return rng.choices(choices, weights)[0]
+
+    def close(self):
+        self.keys.release()
+        self.map.close()
+        self.file.close()
+
+
+'''
+This function returns an OpeningBook for the file at path, or None if there
+is no such file (the book is optional).
+'''
+def load(path=DEFAULT_PATH):
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+'''
+This function returns a policy that plays random legal moves and after
+that plays as policy does.
+'''
+def random_start(policy, moves, rng):
+    played = [0]
+
+    def opening_policy(board, side):
+        if played[0] < moves:
+            played[0] += 1
+            src, dst, captured = rng.choice(board.legal_moves())
+            return square_coords(src) + square_coords(dst)
+        return policy(board, side)
+    return opening_policy
+
+
+'''
+This function plays games between two policies (see simulation.make_policy)
+and appends their records to path. Each side plays its first random_moves
+moves at random so that the games do not all follow the same line.
+'''
+def self_play(path, games, user='search:4', cpu='search:4', random_moves=2,
+              seed=0, max_plies=200):
+    with GameWriter(path) as writer:
+        for game in range(games):
+            rng = random.Random(seed * 1000003 + game)
+            policy_user, ignored = make_policy(user, 'USER', rng)
+            policy_cpu, cpu_strength = make_policy(cpu, 'CPU', rng)
+            play_game(random_start(policy_user, random_moves, rng),
+                      random_start(policy_cpu, random_moves, rng),
+                      max_plies, cpu_strength, rng.randrange(2 ** 32),
+                      writer)
+
+
+'''
+This function times count lookups of positions from the book and of
+positions that are not in it, and returns the average microseconds per
+lookup of each.
+'''
+def bench_lookup(book, count=100000, seed=0):
+    rng = random.Random(seed)
+    present = [book.keys[rng.randrange(len(book))] for i in range(count)]
+    absent = [rng.getrandbits(64) for i in range(count)]
+    times = []
+    for keys in (present, absent):
+        start = time.perf_counter()
+        for key in keys:
+            book.lookup(key)
+        times.append(1e6 * (time.perf_counter() - start) / count)
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build an opening book from self-play or game records.')
+    parser.add_argument('--self-play', type=int, default=0, metavar='GAMES',
+                        help='play this many games and add them to --records')
+    parser.add_argument('--user', default='search:4')
+    parser.add_argument('--cpu', default='search:4')
+    parser.add_argument('--random-moves', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--records', nargs='*', default=[],
+                        help='game record files to build the book from')
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES)
+    parser.add_argument('--min-games', type=int, default=2)
+    parser.add_argument('--out', default=DEFAULT_PATH)
+    parser.add_argument('--bench', action='store_true',
+                        help='time lookups in the book at --out')
+    args = parser.parse_args()
+
+    if args.self_play:
+        if not args.records:
+            parser.error('--self-play needs a --records file to write to')
+        start = time.perf_counter()
+        self_play(args.records[0], args.self_play, args.user, args.cpu,
+                  args.random_moves, args.seed)
+        print('played %d games in %.1f s' %
+              (args.self_play, time.perf_counter() - start))
+    if args.records:
+        builder = BookBuilder(args.plies)
+        for path in args.records:
+            builder.add_records(path)
+        entries = builder.save(args.out, args.min_games)
+        print('%d positions from %d games, %d entries written to %s' %
+              (len(builder.positions), builder.games, entries, args.out))
+    if args.bench:
+        book = load(args.out)
+        if book is None:
+            parser.error('no opening book at ' + args.out)
+        found, missing = bench_lookup(book)
+        print('%.2f us per lookup found, %.2f us per lookup not found' %
+              (found, missing))
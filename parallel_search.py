@@ -0,0 +1,258 @@
+import os
+import time
+import argparse
+import multiprocessing
+from multiprocessing import Pool, TimeoutError
+from bitboard import BitBoard
+from search import Search, SearchStopped, WIN, INFINITY, MAN_VALUE
+
+'''
+The parallel_search module contains ParallelSearch, which searches the CPU's
+move on several processes at once by splitting the root moves between them.
+It has the same best_move, stop and stats as search.Search, so
+Board.get_engine can use either.
+
+The search still deepens one ply at a time. At each depth every root move
+is sent to the process pool as its own task: a worker plays the move and
+searches the position after it with its own Search (whose transposition
+table and history carry over from task to task, and whose killer moves
+carry over between the tasks of one best_move), and sends back the score
+and the number of nodes. Once every move has a score at a depth that
+depth's best move is kept and the next depth starts, with the moves sent in
+order of their last scores. When the time budget runs out or stop is
+called, the workers are told to stop through a shared Event and the best
+move of the last finished depth is played.
+
+Root moves are not searched with a full window. Each depth starts with its
+bound ASPIRATION below the last depth's best score, and the parent raises
+the bound, held in a shared Value, to every better exact score that comes
+back; a worker starting a move reads the bound and only needs to show that
+the move is no better. If no move beats the starting bound, the depth is
+searched again from -INFINITY.
+
+Example: python parallel_search.py --depth 8 --workers 1 2 4 8
+'''
+
+ASPIRATION = MAN_VALUE // 2
+
+worker_engine = None
+stop_event = None
+best_score = None
+
+
+'''
+The Search used in the worker processes: as well as its own limits it stops
+when the parent sets stop_event.
+'''
+
+
+class WorkerSearch(Search):
+    def check_limits(self):
+        if stop_event.is_set():
+            raise SearchStopped()
+        Search.check_limits(self)
+
+
+def init_worker(tt_size_mb, event, value):
+    global worker_engine, stop_event, best_score
+    worker_engine = WorkerSearch(tt_size_mb=tt_size_mb)
+    worker_engine.search_id = None
+    stop_event = event
+    best_score = value
+
+
+'''
+This function runs in a worker process. It searches one root move to depth
+and returns the move, its score (None if the search was stopped), whether
+the score is exact rather than a bound no higher than the best so far, and
+the number of nodes searched. deadline is a time.time() value, so that it
+means the same in every process, positions the game's PositionHistory (or
+None), and search_id tells the worker when a new best_move has started, so
+that it clears its killer moves.
+'''
+def search_move(args):
+    user, cpu, kings, side, move, depth, deadline, positions, search_id, \
+        max_depth = args
+    engine = worker_engine
+    if search_id != engine.search_id:
+        engine.search_id = search_id
+        engine.max_depth = max_depth
+        engine.new_search()
+    engine.max_depth = depth
+    engine.time_limit = None
+    if deadline is not None:
+        engine.time_limit = deadline - time.time()
+        if engine.time_limit <= 0:
+            return move, None, False, 0
+    alpha = best_score.value
+    try:
+        score = engine.score_move(BitBoard(user, cpu, kings, side), side,
+                                  move, depth, positions, alpha)
+    except SearchStopped:
+        return move, None, False, engine.nodes
+    return move, score, score > alpha, engine.nodes
+
+
+class ParallelSearch:
+    def __init__(self, max_depth=64, time_limit=None, tt_size_mb=16,
+                 workers=None):
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.workers = workers or os.cpu_count() or 1
+        self.stop_event = multiprocessing.Event()
+        self.best_score = multiprocessing.Value('i', -INFINITY)
+        self.pool = Pool(self.workers, init_worker,
+                         (tt_size_mb, self.stop_event, self.best_score))
+        self.search_id = 0
+        self.stop_requested = False
+        self.stats = {}
+
+    '''
+    This function returns the best (src, dst, captured) move for side, or
+    None if side has no moves, searching until max_depth or the time limit.
+    positions is the game's repetition.PositionHistory, as for Search.
+    '''
+    def best_move(self, bitboard, side, moves=None, positions=None):
+        start = time.perf_counter()
+        self.stop_requested = False
+        self.stop_event.clear()
+        self.search_id += 1
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.time() + self.time_limit
+
+        if moves is None:
+            moves = bitboard.generate_moves(side)
+        moves = list(moves)
+        best = moves[0] if moves else None
+        score = 0
+        completed = 0
+        nodes = 0
+        for depth in range(1, self.max_depth + 1):
+            if len(moves) <= 1:
+                break
+            alpha = -INFINITY if depth == 1 else score - ASPIRATION
+            scores, depth_nodes = self.search_depth(bitboard, side, moves,
+                                                    depth, deadline,
+                                                    positions, alpha)
+            nodes += depth_nodes
+            if scores is not None and not any(
+                    exact for value, exact in scores.values()):
+                scores, depth_nodes = self.search_depth(
+                    bitboard, side, moves, depth, deadline, positions)
+                nodes += depth_nodes
+            if scores is None:
+                break
+            moves.sort(key=lambda move: scores[move], reverse=True)
+            best = moves[0]
+            score = scores[best][0]
+            completed = depth
+            if abs(score) >= WIN - self.max_depth:
+                break
+
+        elapsed = time.perf_counter() - start
+        self.stats = {'nodes': nodes, 'depth': completed, 'score': score,
+                      'seconds': elapsed, 'workers': self.workers,
+                      'nps': int(nodes / elapsed) if elapsed else 0}
+        return best
+
+    '''
+    This function searches every root move to depth on the pool, with the
+    shared bound starting at alpha, and returns a dictionary of their
+    (score, exact) pairs and the nodes searched, or None for the scores if
+    the search was stopped before every move had one. Exact scores sort
+    ahead of bounds equal to them.
+    '''
+    def search_depth(self, bitboard, side, moves, depth, deadline,
+                     positions=None, alpha=-INFINITY):
+        self.best_score.value = alpha
+        tasks = [(bitboard.user, bitboard.cpu, bitboard.kings, side, move,
+                  depth, deadline, positions, self.search_id, self.max_depth)
+                 for move in moves]
+        results = self.pool.imap_unordered(search_move, tasks)
+        scores = {}
+        nodes = 0
+        stopped = False
+        for i in range(len(tasks)):
+            while True:
+                if self.stop_requested or \
+                        (deadline is not None and time.time() >= deadline):
+                    self.stop_event.set()
+                    stopped = True
+                try:
+                    move, score, exact, move_nodes = results.next(
+                        None if stopped else 0.05)
+                    break
+                except TimeoutError:
+                    pass
+            nodes += move_nodes
+            if score is None:
+                stopped = True
+                self.stop_event.set()
+            else:
+                scores[move] = (score, exact)
+                if exact and score > self.best_score.value:
+                    self.best_score.value = score
+        return None if stopped else scores, nodes
+
+    '''
+    The transposition tables are in the worker processes, so there is no
+    expected reply to give (see Search.expected_reply).
+    '''
+    def expected_reply(self, bitboard):
+        return None
+
+    '''
+    This function can be called from another thread to end the current
+    search early, as Search.stop does.
+    '''
+    def stop(self):
+        self.stop_requested = True
+
+    '''
+    This function shuts down the worker processes.
+    '''
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+'''
+This function searches position to a fixed depth with each number of
+workers and returns a list of (workers, seconds, nodes) tuples.
+'''
+def benchmark(position, depth, worker_counts):
+    results = []
+    for workers in worker_counts:
+        engine = ParallelSearch(max_depth=depth, workers=workers)
+        engine.best_move(position.copy(), position.side)
+        results.append((workers, engine.stats['seconds'],
+                        engine.stats['nodes']))
+        engine.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time the parallel root-split search with different '
+                    'numbers of worker processes.')
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='*',
+                        default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    start_position = BitBoard(0xFFF00000, 0x00000FFF, 0, 'CPU')
+    serial = Search(max_depth=args.depth)
+    serial.best_move(start_position.copy(), 'CPU')
+    print('serial search:  %8d nodes  %6.2f s  %7d nodes/s' %
+          (serial.stats['nodes'], serial.stats['seconds'],
+           serial.stats['nps']))
+    results = benchmark(start_position, args.depth,
+                        sorted(set(args.workers)))
+    base = results[0][1]
+    for workers, seconds, nodes in results:
+        print('%2d workers:     %8d nodes  %6.2f s  %7d nodes/s  '
+              '%7d nodes/s per worker  speedup %.2fx' %
+              (workers, nodes, seconds, nodes / seconds,
+               nodes / seconds / workers, base / seconds))
+    print('(%d CPU cores available)' % (os.cpu_count() or 1))
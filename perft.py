@@ -0,0 +1,305 @@
+import sys
+import copy
+import json
+import time
+import argparse
+import tracemalloc
+from checkers_rules import Board
+from piece import Piece
+from bitboard import BitBoard, square_coords
+
+'''
+The perft module measures and checks the move generation. perft(n) counts
+every sequence of n moves (the leaf nodes of the game tree n plies deep)
+from a position; the counts only depend on the rules, so they also catch any
+change that breaks move generation, and the time they take measures its
+speed. It can run on the full Board (legal_moves, then copy and update_board
+for each move, then check_game_over), on the Board with copy.deepcopy in
+place of Board.copy, on the Board with make_move/unmake_move and no copies
+at all, or directly on the BitBoard (generate moves, make_move/unmake_move).
+Comparing the board, deepcopy and undo engines shows what looking ahead on
+the Board costs each way.
+
+Examples:
+  python perft.py --depth 5
+  python perft.py --depth 5 --save-baseline perft_baseline.json
+  python perft.py --depth 5 --compare perft_baseline.json --threshold 0.15
+  python perft.py --depth 4 --engine deepcopy
+'''
+
+'''
+Positions reached in seeded random games, given as (user, cpu, kings, side
+to move), along with the start of the game.
+'''
+POSITIONS = {
+    'start': (0xFFF00000, 0x00000FFF, 0, 'USER'),
+    'middle_20': (0xF3040800, 0x0011068F, 0, 'USER'),
+    'middle_30': (0x31900000, 0x08009429, 0, 'USER'),
+    'kings_30': (0xD4100001, 0x200A0094, 0x20000001, 'USER'),
+}
+
+
+'''
+The Timer class adds up the time spent in each part of the rules code so
+that a perft run can show where its time went.
+'''
+
+
+class Timer:
+    def __init__(self):
+        self.seconds = {'generate': 0.0, 'apply': 0.0, 'game_over': 0.0}
+        self.calls = {'generate': 0, 'apply': 0, 'game_over': 0}
+
+    def add(self, name, seconds):
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+
+
+'''
+This function counts the leaf nodes depth plies below board, a Board, and
+times the move generation, applying moves and the game over check. Each
+move is played on a copy of the board made by clone. The game over check
+needs the legal moves (a side with none has lost), so they are generated
+under the generate timer first and passed on; the check then finds them in
+the move cache.
+'''
+def board_perft(board, depth, timer, clone=Board.copy, moves=None):
+    clock = time.perf_counter
+    if moves is None:
+        start = clock()
+        moves = board.legal_moves()
+        timer.add('generate', clock() - start)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for src, dst, captured in moves:
+        start = clock()
+        child = clone(board)
+        old_row, old_col = square_coords(src)
+        new_row, new_col = square_coords(dst)
+        child.update_board(old_row, old_col, new_row, new_col)
+        timer.add('apply', clock() - start)
+        start = clock()
+        child_moves = child.legal_moves()
+        timer.add('generate', clock() - start)
+        start = clock()
+        over = child.check_game_over()
+        timer.add('game_over', clock() - start)
+        if over is None:
+            nodes += board_perft(child, depth - 1, timer, clone, child_moves)
+    return nodes
+
+
+def deepcopy_perft(board, depth, timer):
+    return board_perft(board, depth, timer, copy.deepcopy)
+
+
+'''
+The same count on one Board, playing each move with make_move and taking it
+back with unmake_move.
+'''
+def undo_perft(board, depth, timer, moves=None):
+    clock = time.perf_counter
+    if moves is None:
+        start = clock()
+        moves = board.legal_moves()
+        timer.add('generate', clock() - start)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        start = clock()
+        undo = board.make_move(move)
+        timer.add('apply', clock() - start)
+        start = clock()
+        child_moves = board.legal_moves()
+        timer.add('generate', clock() - start)
+        start = clock()
+        over = board.check_game_over()
+        timer.add('game_over', clock() - start)
+        if over is None:
+            nodes += undo_perft(board, depth - 1, timer, child_moves)
+        start = clock()
+        board.unmake_move(undo)
+        timer.add('apply', clock() - start)
+    return nodes
+
+
+'''
+The same count on a BitBoard using make_move and unmake_move.
+'''
+def bitboard_perft(bitboard, depth, timer):
+    clock = time.perf_counter
+    start = clock()
+    moves = bitboard.generate_moves(bitboard.side)
+    timer.add('generate', clock() - start)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        start = clock()
+        undo = bitboard.make_move(move)
+        timer.add('apply', clock() - start)
+        start = clock()
+        over = not bitboard.user or not bitboard.cpu
+        timer.add('game_over', clock() - start)
+        if not over:
+            nodes += bitboard_perft(bitboard, depth - 1, timer)
+        start = clock()
+        bitboard.unmake_move(undo)
+        timer.add('apply', clock() - start)
+    return nodes
+
+
+ENGINES = {'board': board_perft, 'deepcopy': deepcopy_perft,
+           'undo': undo_perft, 'bitboard': bitboard_perft}
+
+
+def make_position(name, engine):
+    user, cpu, kings, side = POSITIONS[name]
+    bitboard = BitBoard(user, cpu, kings, side)
+    if engine == 'bitboard':
+        return bitboard
+    board = Board()
+    board.set_position(bitboard)
+    return board
+
+
+'''
+This function runs perft to the given depth from the named position and
+returns a dictionary of the results. The leaf count and speed come from a
+run without any memory tracing. If memory is True the count is then run a
+second time under tracemalloc to find the peak memory it used and how much
+memory per node was still allocated afterwards, which shows leaks and
+structures that grow with the search.
+'''
+def run(name, depth, engine, memory=False):
+    search = ENGINES[engine]
+    timer = Timer()
+    position = make_position(name, engine)
+    start = time.perf_counter()
+    nodes = search(position, depth, timer)
+    elapsed = time.perf_counter() - start
+    result = {'position': name, 'engine': engine, 'depth': depth,
+              'nodes': nodes, 'seconds': elapsed,
+              'nps': int(nodes / elapsed) if elapsed else 0,
+              'breakdown': {part: {'seconds': timer.seconds[part],
+                                   'calls': timer.calls[part]}
+                            for part in timer.seconds}}
+    if memory:
+        position = make_position(name, engine)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        search(position, depth, Timer())
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_bytes'] = peak - before
+        result['retained_bytes_per_node'] = \
+            (current - before) / nodes if nodes else 0.0
+    return result
+
+
+'''
+This function measures with tracemalloc how much memory a Board holding the
+starting position takes, on average over count boards, and how much of that
+is its Piece objects.
+'''
+def board_memory(count=1000):
+    boards = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        board = Board()
+        board.initialize_game()
+        boards.append(board)
+    board_bytes = (tracemalloc.get_traced_memory()[0] - before) / count
+    before = tracemalloc.get_traced_memory()[0]
+    pieces = [Piece('USER', 0, 0) for i in range(count)]
+    piece_bytes = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    return {'board_bytes': board_bytes, 'piece_bytes': piece_bytes,
+            'pieces_per_board': 24}
+
+
+def report(result):
+    print('%-10s depth %d: %10d nodes  %7.2f s  %9d nodes/s' %
+          (result['position'], result['depth'], result['nodes'],
+           result['seconds'], result['nps']))
+    for part, data in result['breakdown'].items():
+        share = data['seconds'] / result['seconds'] if result['seconds'] \
+            else 0.0
+        print('    %-10s %9d calls  %7.3f s  %5.1f%%' %
+              (part, data['calls'], data['seconds'], 100 * share))
+    if 'peak_bytes' in result:
+        print('    memory: peak %d bytes, %.2f bytes/node retained' %
+              (result['peak_bytes'], result['retained_bytes_per_node']))
+
+
+'''
+This function compares results against a saved baseline. It returns a list
+of problems: a leaf count that differs (the rules changed) or a speed more
+than threshold (a fraction) below the baseline's.
+'''
+def compare(results, baseline, threshold):
+    problems = []
+    for result in results:
+        key = '%s/%s/%d' % (result['engine'], result['position'],
+                            result['depth'])
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        if old['nodes'] != result['nodes']:
+            problems.append('%s: %d nodes, baseline has %d' %
+                            (key, result['nodes'], old['nodes']))
+        elif result['nps'] < old['nps'] * (1 - threshold):
+            problems.append('%s: %d nodes/s, baseline has %d (%.1f%% slower)'
+                            % (key, result['nps'], old['nps'],
+                               100 * (1 - result['nps'] / old['nps'])))
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Count and time move generation to a fixed depth.')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--engine', choices=list(ENGINES), default='board')
+    parser.add_argument('--positions', nargs='*', default=list(POSITIONS),
+                        choices=list(POSITIONS))
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure memory use with tracemalloc')
+    parser.add_argument('--board-memory', action='store_true',
+                        help='report the memory used by one Board')
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    if args.board_memory:
+        sizes = board_memory()
+        print('Board: %.0f bytes, of which %d pieces at %.0f bytes each' %
+              (sizes['board_bytes'], sizes['pieces_per_board'],
+               sizes['piece_bytes']))
+
+    results = []
+    for name in args.positions:
+        result = run(name, args.depth, args.engine, args.memory)
+        report(result)
+        results.append(result)
+
+    if args.save_baseline:
+        baseline = {}
+        for result in results:
+            key = '%s/%s/%d' % (result['engine'], result['position'],
+                                result['depth'])
+            baseline[key] = {'nodes': result['nodes'], 'nps': result['nps']}
+        with open(args.save_baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(results, json.load(f), args.threshold)
+        for problem in problems:
+            print('REGRESSION', problem)
+        if problems:
+            sys.exit(1)
+        print('no regressions against', args.compare)
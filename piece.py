@@ -1,54 +1,67 @@
-import pygame
-from PIL import Image
-
 '''
-Loads the piece images for USER, USER_KING, CPU, CPU_KING and stores them
-in a dictionary that maps a string representing the type of the piece to
-its image
+The type of a piece is stored as a small integer code. TYPE_NAMES gives the
+string each code has always been known by ('USER', 'CPU', 'USER_KING' and
+'CPU_KING'), which get_type still returns, and TYPE_CODES maps the strings
+back to their codes. The codes are laid out so that the low bit is the side
+(0 for the user, 1 for the CPU) and the codes of kings are 2 or more.
 '''
-cp = Image.open('cpu_piece.PNG')
-cpu_piece_pic = pygame.image.fromstring(cp.tobytes(), cp.size, cp.mode)
-ck = Image.open('cpu_king.PNG')
-cpu_king_piece_pic = pygame.image.fromstring(ck.tobytes(), ck.size, ck.mode)
-up = Image.open('user_piece.PNG')
-user_piece_pic = pygame.image.fromstring(up.tobytes(), up.size, up.mode)
-uk = Image.open('user_king.PNG')
-user_king_piece_pic = pygame.image.fromstring(uk.tobytes(), uk.size, uk.mode)
-
-icon_dict = {'CPU': cpu_piece_pic, 'CPU_KING': cpu_king_piece_pic,
-             'USER': user_piece_pic, 'USER_KING': user_king_piece_pic}
+USER = 0
+CPU = 1
+USER_KING = 2
+CPU_KING = 3
+TYPE_NAMES = ('USER', 'CPU', 'USER_KING', 'CPU_KING')
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+FLAGS = tuple((code & 1 == 0, code & 1 == 1, code >= USER_KING)
+              for code in range(4))
 
 '''
 The Piece class allows USER, USER_KING, CPU, and CPU_KING objects to be
-instantiated. It contains information about whether or not the piece is a
-king, the type of the piece, its current position (defined by a row and column
-in the checker board) and an image icon.
+instantiated. It contains the type of the piece, its current position
+(defined by a row and column in the checker board) and the flags is_user,
+is_cpu and is_king, which are worked out once when the piece is created so
+that callers do not have to compare type strings. The class uses __slots__,
+so a piece has no per-instance dictionary. The piece's image is not stored
+on it: get_icon looks it up in assets.py when the game draws the piece, so
+this module can be imported without pygame.
 '''
 
 
 class Piece:
+    __slots__ = ('code', 'row', 'col', 'is_user', 'is_cpu', 'is_king')
+
     '''
-    Constructor for the instance variables descibed above
+    Constructor for the instance variables descibed above. type can be
+    either one of the type strings or its integer code.
     '''
     def __init__(self, type, row, col):
-        self.is_king = False
-        self.type = type
+        if type.__class__ is str:
+            type = TYPE_CODES[type]
+        self.code = type
         self.row = row
         self.col = col
-        self.icon = icon_dict.get(type)
+        self.is_user, self.is_cpu, self.is_king = FLAGS[type]
 
     '''
     Allows objects of type Piece to be compared
     '''
     def __eq__(self, other_piece):
-        return self.__dict__ == other_piece.__dict__
+        return self.code == other_piece.code and \
+            self.row == other_piece.row and self.col == other_piece.col
+
+    '''
+    The type string of the piece, for code that reads piece.type directly.
+    '''
+    @property
+    def type(self):
+        return TYPE_NAMES[self.code]
 
     '''
     The following functions are accessor methods for the piece's icon, current
     row and column, and its type.
     '''
     def get_icon(self):
-        return self.icon
+        from assets import get_icon
+        return get_icon(TYPE_NAMES[self.code])
 
     def get_row(self):
         return self.row
@@ -57,7 +70,7 @@ class Piece:
         return self.col
 
     def get_type(self):
-        return self.type
+        return TYPE_NAMES[self.code]
 
     '''
     This function allows a piece to be assigned a new position defined by
@@ -66,3 +79,11 @@ class Piece:
     def set_location(self, new_row, new_col):
         self.row = new_row
         self.col = new_col
+
+    '''
+    This function changes the piece's type in place (e.g. to crown it, or
+    to take the crown back when a move is undone) and updates its flags.
+    '''
+    def set_code(self, code):
+        self.code = code
+        self.is_user, self.is_cpu, self.is_king = FLAGS[code]
@@ -0,0 +1,248 @@
+import mmap
+import struct
+from bitboard import BitBoard, bits, jump_path
+
+'''
+The position_io module reads and writes positions and games.
+
+Binary positions are 16 bytes each: the user, CPU and kings masks as
+little-endian 32-bit integers followed by a 32-bit flags word whose lowest
+bit is set when it is the CPU's turn. (The flags word could be one byte, but
+keeping every field 4 bytes wide lets a whole file be read as one array of
+32-bit integers.) The other bits of the flags word are free for the caller,
+e.g. tuner.py keeps the result of the game there. A file of positions is
+just these records one after another.
+
+Text positions use the FEN notation of PDN (Portable Draughts Notation),
+e.g. W:W21,22,K23:B1,2 . The squares are numbered 1 to 32 row by row from
+the CPU's back row, left to right (square number = bitboard index + 1), the
+user plays W and the CPU plays B, and the first letter says whose turn it
+is. Kings are marked with a K.
+
+Game records are PDN-like text: a [FEN] tag with the starting position,
+then the moves (21-17 for a move, 22x15 for a capture and 22x15x6 for a
+capture of several pieces, with every landing square written out, numbered
+in pairs), ending with the result (1-0 if the user won, 0-1 if the CPU won,
+1/2-1/2 for a draw or * if the game did not finish). Moves are written as
+they are played, so a record can be streamed to disk during a game.
+'''
+
+RECORD = struct.Struct('<IIII')
+RECORD_SIZE = RECORD.size
+SIDE_FLAG = 1
+
+RESULTS = {'USER': '1-0', 'CPU': '0-1', 'DRAW': '1/2-1/2', None: '*'}
+
+
+def pack_position(bitboard, flags=0):
+    return RECORD.pack(bitboard.user, bitboard.cpu, bitboard.kings,
+                       flags | SIDE_FLAG if bitboard.side == 'CPU' else flags)
+
+
+def unpack_position(data, offset=0):
+    user, cpu, kings, flags = RECORD.unpack_from(data, offset)
+    return BitBoard(user, cpu, kings, 'CPU' if flags & SIDE_FLAG else 'USER')
+
+
+def to_fen(bitboard):
+    fields = []
+    for letter, mask in (('W', bitboard.user), ('B', bitboard.cpu)):
+        squares = [('K' if bitboard.kings >> sq & 1 else '') + str(sq + 1)
+                   for sq in bits(mask)]
+        fields.append(letter + ','.join(squares))
+    return ('B' if bitboard.side == 'CPU' else 'W') + ':' + ':'.join(fields)
+
+
+'''
+This function reads a FEN string written by to_fen (or any PDN FEN using
+the same square numbering) and returns the BitBoard it describes. It raises
+ValueError if the string cannot be read.
+'''
+def from_fen(text):
+    fields = text.strip().strip('"').rstrip('.').split(':')
+    if not fields or fields[0].upper() not in ('W', 'B'):
+        raise ValueError('bad FEN: ' + text)
+    masks = {'W': 0, 'B': 0}
+    kings = 0
+    for field in fields[1:]:
+        letter = field[:1].upper()
+        if letter not in masks:
+            raise ValueError('bad FEN: ' + text)
+        for square in field[1:].split(','):
+            square = square.strip()
+            if not square:
+                continue
+            king = square[0].upper() == 'K'
+            sq = int(square[1:] if king else square) - 1
+            if not 0 <= sq < 32:
+                raise ValueError('bad square in FEN: ' + text)
+            masks[letter] |= 1 << sq
+            if king:
+                kings |= 1 << sq
+    side = 'CPU' if fields[0].upper() == 'B' else 'USER'
+    return BitBoard(masks['W'], masks['B'], kings, side)
+
+
+def move_text(move):
+    src, dst, captured = move
+    if captured:
+        return 'x'.join(str(sq + 1) for sq in jump_path(move))
+    return '%d-%d' % (src + 1, dst + 1)
+
+
+'''
+This function returns the legal (src, dst, captured) move of bitboard that a
+move read by read_games stands for, or None if there is none. When only the
+ends of a capture were written and two capture sequences share them, the one
+that takes more pieces is chosen (as Board.find_move does).
+'''
+def resolve_move(bitboard, squares):
+    src, dst = squares[0], squares[-1]
+    found = None
+    for move in bitboard.generate_moves(bitboard.side):
+        if move[0] != src or move[1] != dst:
+            continue
+        if len(squares) > 2:
+            if jump_path(move) == list(squares):
+                return move
+        elif found is None or move[2].bit_count() > found[2].bit_count():
+            found = move
+    return found
+
+
+'''
+The PositionWriter class appends packed positions to a file.
+'''
+
+
+class PositionWriter:
+    def __init__(self, path, mode='ab'):
+        self.file = open(path, mode)
+
+    def write(self, bitboard, flags=0):
+        self.file.write(pack_position(bitboard, flags))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+The PackedPositions class gives read access to a file of packed positions
+through a memory map. The file is never read into memory as a whole and no
+Python object is made per position: words is a memoryview of the file as
+32-bit integers, so position i's masks are words[4 * i] (user),
+words[4 * i + 1] (CPU), words[4 * i + 2] (kings) and words[4 * i + 3]
+(flags), and column(n) gives a strided view of one field of every position.
+position(i) builds a BitBoard when one is actually needed.
+'''
+
+
+class PackedPositions:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = len(self.map) // RECORD_SIZE
+        self.words = memoryview(self.map)[:self.count * RECORD_SIZE] \
+            .cast('I')
+
+    def __len__(self):
+        return self.count
+
+    def column(self, field):
+        return self.words[field::4]
+
+    def position(self, i):
+        return unpack_position(self.map, i * RECORD_SIZE)
+
+    def close(self):
+        self.words.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+The GameWriter class streams game records to a text file: begin writes the
+tags and starting position, move writes one move (flushed straight away so
+an interrupted game is not lost) and end writes the result.
+'''
+
+
+class GameWriter:
+    def __init__(self, path, mode='a'):
+        self.file = open(path, mode)
+        self.plies = 0
+
+    def begin(self, bitboard, tags=None):
+        for name, value in (tags or {}).items():
+            self.file.write('[%s "%s"]\n' % (name, value))
+        self.file.write('[FEN "%s"]\n' % to_fen(bitboard))
+        self.plies = 0
+        self.first_side = bitboard.side
+
+    def move(self, move):
+        if self.plies % 2 == 0:
+            number = self.plies // 2 + 1
+            if self.first_side == 'CPU' and self.plies == 0:
+                self.file.write('%d... ' % number)
+            else:
+                self.file.write('%d. ' % number)
+        self.file.write(move_text(move) + ' ')
+        self.file.flush()
+        self.plies += 1
+
+    def end(self, winner):
+        self.file.write(RESULTS[winner] + '\n\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+This generator reads the games in a file written by GameWriter. For each it
+yields a dictionary with the tags, the starting BitBoard, the moves as
+tuples of the square indexes written for them (src, any landing squares,
+dst) and the winner ('USER', 'CPU', 'DRAW' or None). resolve_move turns each
+into the full move to play on a BitBoard.
+'''
+def read_games(path):
+    winners = {text: winner for winner, text in RESULTS.items()}
+    tags = {}
+    moves = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                name, value = line[1:-1].split(' ', 1)
+                tags[name] = value.strip('"')
+                continue
+            for token in line.split():
+                if token in winners:
+                    yield {'tags': tags, 'start': from_fen(tags['FEN']),
+                           'moves': moves, 'winner': winners[token]}
+                    tags = {}
+                    moves = []
+                elif not token[0].isdigit() or token.endswith('.'):
+                    continue
+                else:
+                    separator = 'x' if 'x' in token else '-'
+                    moves.append(tuple(int(sq) - 1
+                                       for sq in token.split(separator)))
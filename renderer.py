@@ -0,0 +1,140 @@
+import time
+import pygame
+from bitboard import square_coords
+import assets
+
+'''
+The renderer module draws the board incrementally. The parts of the board
+that never change (the red and black squares and the yellow lines) are drawn
+once into a background surface, and after that only the dark squares whose
+piece or highlight changed since the last frame are redrawn and sent to the
+screen with pygame.display.update, instead of redrawing and flipping the
+whole window on every pass of the main loop.
+
+The board is drawn as large as fits in the window, centred in it. The
+background and the piece images for the current size come from assets.py,
+which makes them once per size, so a resize costs one full redraw and
+nothing is scaled while frames are drawn.
+'''
+
+BLUE = (0, 186, 255)
+MIN_SQUARE = 20
+
+
+'''
+The FrameStats class counts the frames the renderer has drawn and how long
+they took, and how many of them actually sent anything to the screen, so that
+the time spent drawing between moves can be checked.
+'''
+
+
+class FrameStats:
+    def __init__(self):
+        self.frames = 0
+        self.updated_frames = 0
+        self.updated_rects = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def record(self, seconds, rects):
+        self.frames += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        if rects:
+            self.updated_frames += 1
+            self.updated_rects += rects
+
+    def summary(self):
+        average = self.total_seconds / self.frames if self.frames else 0.0
+        return {'frames': self.frames, 'updated_frames': self.updated_frames,
+                'updated_rects': self.updated_rects,
+                'average_ms': 1000 * average,
+                'last_ms': 1000 * self.last_seconds}
+
+
+class BoardRenderer:
+    '''
+    surface is the display surface. square, the size of a square in
+    pixels, is worked out from the size of the surface unless it is given.
+    '''
+    def __init__(self, surface, square=None):
+        self.shown = [None] * 32
+        self.stats = FrameStats()
+        self.resize(surface, square)
+
+    '''
+    This function fits the board to surface, e.g. after the window was
+    resized, and fetches the background, lines and piece images for the new
+    size. The next render redraws everything.
+    '''
+    def resize(self, surface, square=None):
+        self.surface = surface
+        width, height = surface.get_size()
+        if square is None:
+            square = max(MIN_SQUARE, min(width, height) // 8)
+        self.square = square
+        self.origin = ((width - 8 * square) // 2, (height - 8 * square) // 2)
+        self.background, self.lines = assets.board_layers(square)
+        self.icons = {type: assets.get_icon(type, square)
+                      for type in assets.IMAGE_FILES}
+        self.offset = assets.icon_offset(square)
+        self.invalidate()
+
+    '''
+    This function returns the (row, col) of the square at a position in the
+    window, or None if the position is off the board.
+    '''
+    def square_at(self, pos):
+        x = pos[0] - self.origin[0]
+        y = pos[1] - self.origin[1]
+        size = 8 * self.square
+        if not (0 <= x < size and 0 <= y < size):
+            return None
+        return y // self.square, x // self.square
+
+    '''
+    This function forgets what is on the screen so that the next render
+    redraws everything, e.g. after a title or game over screen was shown.
+    '''
+    def invalidate(self):
+        self.shown = [None] * 32
+
+    '''
+    This function draws the board for the given Board and set of highlighted
+    (row, col) squares. Only the dark squares whose piece or highlight differ
+    from the last frame are redrawn, and only those squares are pushed to the
+    screen. It returns the list of rectangles that were updated.
+    '''
+    def render(self, board, highlights=()):
+        start = time.perf_counter()
+        full = self.shown[0] is None
+        left, top = self.origin
+        if full:
+            self.surface.fill(assets.BLACK)
+            self.surface.blit(self.background, self.origin)
+        bitboard = board.bitboard
+        square = self.square
+        offset = self.offset
+        rects = []
+        for sq in range(32):
+            row, col = square_coords(sq)
+            state = (bitboard.kind_at(sq), (row, col) in highlights)
+            if state == self.shown[sq]:
+                continue
+            self.shown[sq] = state
+            area = pygame.Rect(col * square, row * square, square, square)
+            rect = area.move(left, top)
+            self.surface.blit(self.background, rect, area)
+            if state[1]:
+                self.surface.fill(BLUE, rect=rect)
+            if state[0] is not None:
+                self.surface.blit(self.icons[state[0]],
+                                  (rect.x + offset, rect.y + offset))
+            self.surface.blit(self.lines, rect, area)
+            rects.append(rect)
+        if full:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+        self.stats.record(time.perf_counter() - start, len(rects))
+        return rects
@@ -0,0 +1,103 @@
+'''
+The repetition module contains PositionHistory, which keeps the positions
+of a game so that draws can be found in constant time. English draughts
+declares a draw when the same position (with the same side to move) has
+come about three times, or when NO_PROGRESS_PLIES plies in a row have passed
+without a capture or a man moving. Every position is recorded by its
+Zobrist hash (bitboard.key) in a dictionary of how many times it has come
+about, and the number of plies since the last capture or man move is kept
+for each ply, so both questions are answered with a lookup.
+
+The history is a stack: push records the position after a move and pop
+takes it back, which is how Board.make_move/unmake_move and the search's
+make_move/unmake_move keep it up to date. The search also uses it to stop at
+a position that has already come about in the game or earlier in the line
+it is searching, scoring it as a draw.
+'''
+
+NO_PROGRESS_PLIES = 80
+REPETITIONS = 3
+
+
+class PositionHistory:
+    def __init__(self, key=None):
+        self.keys = []
+        self.quiet = []
+        self.counts = {}
+        if key is not None:
+            self.push(key, True)
+
+    '''
+    This function records the position with hash key. irreversible is True
+    if the move that led to it was a capture or a man's move, which no later
+    position can undo, so the count of quiet plies starts again.
+    '''
+    def push(self, key, irreversible):
+        self.keys.append(key)
+        self.quiet.append(0 if irreversible or not self.quiet
+                          else self.quiet[-1] + 1)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def pop(self):
+        key = self.keys.pop()
+        self.quiet.pop()
+        count = self.counts[key] - 1
+        if count:
+            self.counts[key] = count
+        else:
+            del self.counts[key]
+
+    '''
+    These functions play a (src, dst, captured) move on bitboard and record
+    the position it leads to, and take it back again.
+    '''
+    def make_move(self, bitboard, move):
+        irreversible = move[2] or not bitboard.kings >> move[0] & 1
+        undo = bitboard.make_move(move)
+        self.push(bitboard.key, irreversible)
+        return undo
+
+    def unmake_move(self, bitboard, undo):
+        self.pop()
+        bitboard.unmake_move(undo)
+
+    '''
+    This function returns how many times the position with hash key has come
+    about.
+    '''
+    def count(self, key):
+        return self.counts.get(key, 0)
+
+    '''
+    This function returns the number of plies since the last capture or man
+    move.
+    '''
+    def quiet_plies(self):
+        return self.quiet[-1] if self.quiet else 0
+
+    '''
+    This function returns True if the current position is a draw by
+    repetition or by the no-progress rule.
+    '''
+    def is_draw(self):
+        if not self.keys:
+            return False
+        return self.counts[self.keys[-1]] >= REPETITIONS or \
+            self.quiet[-1] >= NO_PROGRESS_PLIES
+
+    '''
+    This function returns True if the current position has come about
+    before, or if the no-progress rule has been reached. The search scores
+    such positions as draws, since the side that could avoid repeating would
+    have done so.
+    '''
+    def repeated(self):
+        return self.counts[self.keys[-1]] > 1 or \
+            self.quiet[-1] >= NO_PROGRESS_PLIES
+
+    def copy(self):
+        other = PositionHistory()
+        other.keys = list(self.keys)
+        other.quiet = list(self.quiet)
+        other.counts = dict(self.counts)
+        return other
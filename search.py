@@ -0,0 +1,425 @@
+import sys
+import time
+from bitboard import BitBoard
+from evaluation import tuned_evaluator
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from repetition import PositionHistory
+
+'''
+The search module contains the alpha-beta engine the CPU uses at the MEDIUM
+and HARD strengths. It searches BitBoard positions with negamax and
+alpha-beta pruning, deepening one ply at a time until it runs out of time or
+nodes, and applies and takes back moves with make_move/unmake_move instead of
+copying the board at every node. Positions reached again through a different
+move order are looked up in a transposition table keyed by the bitboard's
+Zobrist hash. A position that has already come about, in the game or earlier
+in the line being searched, is scored as a draw without being searched (see
+repetition.py).
+'''
+
+WIN = 100000
+INFINITY = 1000000
+MAN_VALUE = 100
+KING_VALUE = 160
+
+'''
+The transposition table's counters, which run from when it was made, so
+each search reports how much they went up during it.
+'''
+TABLE_COUNTERS = ('tt_hits', 'tt_misses', 'tt_collisions', 'tt_stores')
+
+'''
+The settings used for each CPU strength. EASY is the original one-ply
+scoring in Board.cpu_next_move and does not use the engine. PARALLEL is HARD
+searched on a pool of worker processes (see parallel_search.py); its
+workers setting is the number of processes, None meaning one per core. MCTS
+is the Monte Carlo tree search player in mcts.py instead of alpha-beta.
+'''
+STRENGTHS = {'EASY': None,
+             'MEDIUM': {'max_depth': 4, 'time_limit': 0.5, 'tt_size_mb': 4},
+             'HARD': {'max_depth': 64, 'time_limit': 1.0, 'tt_size_mb': 16},
+             'PARALLEL': {'max_depth': 64, 'time_limit': 1.0,
+                          'tt_size_mb': 16, 'workers': None},
+             'MCTS': {'time_limit': 1.0, 'max_playouts': None,
+                      'max_nodes': 100000}}
+
+
+def other_side(side):
+    return 'CPU' if side == 'USER' else 'USER'
+
+
+'''
+This function scores a position from the point of view of side: the
+difference in material, with kings worth more than men.
+'''
+def evaluate(bitboard, side):
+    kings = bitboard.kings
+    user = bitboard.user
+    cpu = bitboard.cpu
+    score = (MAN_VALUE * ((user & ~kings).bit_count() -
+                          (cpu & ~kings).bit_count()) +
+             KING_VALUE * ((user & kings).bit_count() -
+                           (cpu & kings).bit_count()))
+    return score if side == 'USER' else -score
+
+
+'''
+Win and loss scores depend on how many plies away the end of the game is, so
+they are stored in the transposition table relative to the node that stores
+them and converted back when they are read at a different ply.
+'''
+def score_to_table(score, ply):
+    if score >= WIN - 1000:
+        return score + ply
+    if score <= -WIN + 1000:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= WIN - 1000:
+        return score - ply
+    if score <= -WIN + 1000:
+        return score + ply
+    return score
+
+
+class SearchStopped(Exception):
+    pass
+
+
+'''
+This function creates the engine for a STRENGTHS entry: an mcts.MCTS if the
+settings have a playout limit, a ParallelSearch if they have a workers count
+and a Search otherwise.
+'''
+def make_engine(settings):
+    if 'max_playouts' in settings:
+        from mcts import MCTS
+        return MCTS(**settings)
+    if 'workers' in settings:
+        from parallel_search import ParallelSearch
+        return ParallelSearch(**settings)
+    return Search(**settings)
+
+
+'''
+The Search class holds the state that is kept between the nodes of one
+search (killer moves, the history table, the transposition table and the
+node count) and the limits that end it. tt_size_mb caps the memory used by
+the transposition table. A Search can be reused from move to move.
+
+evaluator replaces evaluate with an object that has an evaluate(bitboard,
+side) method, such as evaluation.Evaluator or batch_eval.BatchEvaluator. By
+default the tuned weights written by tuner.py are used if there are any
+(see evaluation.tuned_evaluator) and evaluate otherwise. If batch_leaves is
+True the evaluator's child_scores is also used to score all the children of
+a node one ply from the horizon in a single batch; quiesce then takes its
+stand-pat score from those instead of evaluating each child on its own.
+'''
+
+
+class Search:
+    def __init__(self, max_depth=64, time_limit=None, node_limit=None,
+                 tt_size_mb=16, evaluator=None, batch_leaves=False):
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.table = TranspositionTable(tt_size_mb)
+        self.stop_requested = False
+        self.nodes = 0
+        self.deadline = None
+        self.killers = []
+        self.history = [0] * 1024
+        self.stats = {}
+        if evaluator is None:
+            evaluator = tuned_evaluator()
+        self.evaluator = evaluator
+        self.evaluate = evaluate if evaluator is None else evaluator.evaluate
+        self.batch_leaves = batch_leaves and evaluator is not None
+        self.leaf_scores = {}
+        self.positions = None
+
+    '''
+    This function runs the iterative deepening loop and returns the best
+    (src, dst, captured) move for side, or None if side has no moves. The
+    legal moves of the position can be passed in as moves if the caller
+    already has them, and the game's repetition.PositionHistory (ending with
+    this position) as positions, so that repeating an earlier position of
+    the game is seen as a draw. If the limits are hit part way through an
+    iteration, the best move found by that iteration so far is kept, since
+    the previous best move is always searched first. The statistics of the
+    search are left in self.stats; the transposition table's counters in
+    them count this search only.
+    '''
+    def best_move(self, bitboard, side, moves=None, positions=None):
+        start = self.prepare(bitboard, positions)
+        self.new_search()
+        table_before = self.table.stats()
+        if moves is None:
+            moves = bitboard.generate_moves(side)
+        moves = list(moves)
+        best = moves[0] if moves else None
+        score = 0
+        completed = 0
+        for depth in range(1, self.max_depth + 1):
+            if len(moves) <= 1:
+                break
+            self.order(moves, 0)
+            if best in moves:
+                moves.remove(best)
+                moves.insert(0, best)
+            try:
+                score = self.root(bitboard, side, moves, depth)
+                completed = depth
+            except SearchStopped:
+                break
+            finally:
+                best = self.root_best
+            if abs(score) >= WIN - self.max_depth:
+                break
+
+        elapsed = time.perf_counter() - start
+        self.stats = {'nodes': self.nodes, 'depth': completed,
+                      'score': score, 'seconds': elapsed,
+                      'nps': int(self.nodes / elapsed) if elapsed else 0}
+        table = self.table.stats()
+        for key in TABLE_COUNTERS:
+            table[key] -= table_before[key]
+        self.stats.update(table)
+        return best
+
+    '''
+    This function resets the node count and the limits, takes a copy of the
+    game's positions (or starts them from bitboard) and returns the time it
+    started.
+    '''
+    def prepare(self, bitboard, positions=None):
+        start = time.perf_counter()
+        self.positions = positions.copy() if positions is not None else \
+            PositionHistory(bitboard.key)
+        self.nodes = 0
+        self.stop_requested = False
+        self.deadline = None
+        if self.time_limit is not None:
+            self.deadline = start + self.time_limit
+        return start
+
+    '''
+    This function clears the killer moves and ages the history table when
+    the search moves on to a new position. The killers of one position's
+    iterations (or of its root moves, in a parallel_search.py worker) are
+    kept, since they are indexed by ply from the same root.
+    '''
+    def new_search(self):
+        self.killers = [[None, None] for i in range(self.max_depth + 64)]
+        self.history = [h // 8 for h in self.history]
+
+    '''
+    This function searches the position after move to the given depth
+    (counting move as the first ply) and returns its score for side. It is
+    how parallel_search.py searches one root move in a worker process. Only
+    scores above alpha are exact: a move that is no better than alpha gets
+    a score of at most alpha, which is all the caller needs to know to pass
+    it over. It raises SearchStopped if the limits are hit first.
+    '''
+    def score_move(self, bitboard, side, move, depth, positions=None,
+                   alpha=-INFINITY):
+        self.prepare(bitboard, positions)
+        undo = self.positions.make_move(bitboard, move)
+        try:
+            return -self.negamax(bitboard, other_side(side), depth - 1,
+                                 -INFINITY, -alpha, 1)
+        finally:
+            self.positions.unmake_move(bitboard, undo)
+
+    def root(self, bitboard, side, moves, depth):
+        alpha = -INFINITY
+        self.root_best = moves[0]
+        opponent = other_side(side)
+        positions = self.positions
+        for move in moves:
+            undo = positions.make_move(bitboard, move)
+            try:
+                score = -self.negamax(bitboard, opponent, depth - 1,
+                                      -INFINITY, -alpha, 1)
+            finally:
+                positions.unmake_move(bitboard, undo)
+            if score > alpha:
+                alpha = score
+                self.root_best = move
+        return alpha
+
+    '''
+    This is the recursive negamax search with alpha-beta pruning. A side with
+    no moves has lost, and a position that repeats an earlier one (or has
+    reached the no-progress limit) is a draw. At the horizon the search
+    carries on through captures only (see quiesce) so that it does not stop
+    in the middle of an exchange. Before searching a node, the transposition
+    table is checked for a result from a search at least as deep whose bound
+    settles this node, and its best move is tried first otherwise.
+    '''
+    def negamax(self, bitboard, side, depth, alpha, beta, ply):
+        self.count_node()
+        positions = self.positions
+        if positions.repeated():
+            return 0
+        table_move = None
+        if depth > 0:
+            entry = self.table.probe(bitboard.key)
+            if entry is not None:
+                score, entry_depth, flag, table_move = entry
+                if entry_depth >= depth:
+                    score = score_from_table(score, ply)
+                    if flag == EXACT or \
+                            (flag == LOWER and score >= beta) or \
+                            (flag == UPPER and score <= alpha):
+                        return score
+        moves = bitboard.generate_moves(side)
+        if not moves:
+            return -WIN + ply
+        if depth <= 0:
+            return self.quiesce(bitboard, side, alpha, beta, ply, moves)
+
+        self.order(moves, ply, table_move)
+        if depth == 1 and self.batch_leaves:
+            self.leaf_scores = self.evaluator.child_scores(bitboard, moves)
+        opponent = other_side(side)
+        original_alpha = alpha
+        best_move = None
+        for move in moves:
+            undo = positions.make_move(bitboard, move)
+            try:
+                score = -self.negamax(bitboard, opponent, depth - 1,
+                                      -beta, -alpha, ply + 1)
+            finally:
+                positions.unmake_move(bitboard, undo)
+            if score >= beta:
+                if not move[2]:
+                    self.store_killer(move, ply)
+                    self.history[move[0] * 32 + move[1]] += depth * depth
+                self.table.store(bitboard.key, score_to_table(score, ply),
+                                 depth, LOWER, move)
+                return score
+            if score > alpha:
+                alpha = score
+                best_move = move
+        flag = EXACT if alpha > original_alpha else UPPER
+        self.table.store(bitboard.key, score_to_table(alpha, ply), depth,
+                         flag, best_move)
+        return alpha
+
+    def quiesce(self, bitboard, side, alpha, beta, ply, moves):
+        stand_pat = self.leaf_scores.pop(bitboard.key, None)
+        if stand_pat is None:
+            stand_pat = self.evaluate(bitboard, side)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        opponent = other_side(side)
+        for move in moves:
+            if not move[2]:
+                continue
+            undo = bitboard.make_move(move)
+            try:
+                self.count_node()
+                replies = bitboard.generate_moves(opponent)
+                if replies:
+                    score = -self.quiesce(bitboard, opponent, -beta, -alpha,
+                                          ply + 1, replies)
+                else:
+                    score = WIN - ply - 1
+            finally:
+                bitboard.unmake_move(undo)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    '''
+    Moves are searched starting with the transposition table's best move (a
+    (src, dst) pair), then captures (most pieces taken first), then the two
+    killer moves of this ply, then the rest by their history score.
+    '''
+    def order(self, moves, ply, table_move=None):
+        killers = self.killers[ply]
+        history = self.history
+
+        def key(move):
+            if table_move is not None and \
+                    (move[0], move[1]) == table_move:
+                return 1 << 41
+            if move[2]:
+                return 1 << 40 | move[2].bit_count()
+            if move == killers[0]:
+                return 1 << 39
+            if move == killers[1]:
+                return 1 << 38
+            return history[move[0] * 32 + move[1]]
+        moves.sort(key=key, reverse=True)
+
+    def store_killer(self, move, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+    '''
+    This function returns the (src, dst) move the last search expected to be
+    played from bitboard, the position after its own move, or None if it
+    did not get that far. It is the best move the transposition table holds
+    for the position, and is what the MoveProvider ponders first.
+    '''
+    def expected_reply(self, bitboard):
+        entry = self.table.probe(bitboard.key)
+        return entry[3] if entry is not None else None
+
+    '''
+    This function can be called from another thread to end the current
+    search early. best_move then returns the best move it has found so far.
+    '''
+    def stop(self):
+        self.stop_requested = True
+
+    '''
+    A Search holds nothing that needs releasing; close is here so that it
+    can be swapped for a ParallelSearch, which has a process pool to shut.
+    '''
+    def close(self):
+        pass
+
+    def count_node(self):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_limits()
+
+    '''
+    This function is called every 1024 nodes and raises SearchStopped if the
+    search has been asked to stop or has reached its node or time limit.
+    '''
+    def check_limits(self):
+        if self.stop_requested:
+            raise SearchStopped()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped()
+        if self.deadline is not None and \
+                time.perf_counter() >= self.deadline:
+            raise SearchStopped()
+
+
+'''
+Running this file searches the starting pieces with the CPU to move (as
+parallel_search.py and mcts.py do) and prints the depth reached and the
+engine's throughput in nodes per second, e.g. python search.py 2.0 to
+search for two seconds.
+'''
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    start_position = BitBoard(0xFFF00000, 0x00000FFF, 0, 'CPU')
+    engine = Search(time_limit=seconds)
+    src, dst, captured = engine.best_move(start_position,
+                                          start_position.side)
+    print('best move:', src, '->', dst)
+    for name in ('depth', 'nodes', 'seconds', 'nps', 'tt_hits', 'tt_misses',
+                 'tt_collisions'):
+        print(name + ':', engine.stats[name])
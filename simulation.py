@@ -0,0 +1,156 @@
+import sys
+import time
+import random
+import metrics
+from checkers_rules import Board
+from bitboard import square_coords
+from search import STRENGTHS, other_side, make_engine
+
+'''
+The simulation module plays complete games between two policies without
+opening a window or waiting between moves, so that batches of games can be
+run on machines without a display. Nothing here imports pygame or PIL.
+
+A policy is a function that takes the Board and the side to move ('USER' or
+'CPU') and returns the move to make as (old_row, old_col, new_row, new_col),
+the same form Board.cpu_next_move returns and Board.update_board accepts.
+'''
+
+
+'''
+This function returns a policy that picks uniformly among the legal moves,
+using rng (a random.Random) if one is given.
+'''
+def random_policy(rng=None):
+    rng = rng or random.Random()
+
+    def policy(board, side):
+        src, dst, captured = rng.choice(board.legal_moves())
+        return square_coords(src) + square_coords(dst)
+    return policy
+
+
+'''
+This policy plays the CPU's side with Board.cpu_next_move at whatever
+strength the board was created with. It can only be used for the CPU.
+'''
+def cpu_policy(board, side):
+    return board.cpu_next_move()
+
+
+'''
+This function returns a policy that plays either side with its own
+alpha-beta engine, created with the given search.Search settings (or
+parallel_search.ParallelSearch settings if they include workers, or
+mcts.MCTS settings if they include max_playouts).
+'''
+def search_policy(**settings):
+    engine = make_engine(settings)
+
+    def policy(board, side):
+        src, dst, captured = engine.best_move(board.bitboard, side, None,
+                                              board.position_history)
+        return square_coords(src) + square_coords(dst)
+    return policy
+
+
+'''
+This function turns a policy name into a policy, so that policies can be
+chosen on the command line or sent to another process. The names are:
+  random       random_policy
+  easy         Board.cpu_next_move at EASY (CPU side only)
+  medium/hard  Board.cpu_next_move at that strength for the CPU, or a
+               search_policy with the same settings for the user
+  search:N     a search_policy searching exactly N plies
+It returns the policy and the cpu_strength the Board should be created with.
+'''
+def make_policy(name, side, rng=None):
+    name = name.lower()
+    if name == 'random':
+        return random_policy(rng), 'EASY'
+    if name.startswith('search:'):
+        return search_policy(max_depth=int(name[7:])), 'EASY'
+    strength = name.upper()
+    if strength not in STRENGTHS:
+        raise ValueError('unknown policy: ' + name)
+    if side == 'CPU':
+        return cpu_policy, strength
+    if STRENGTHS[strength] is None:
+        raise ValueError(name + ' can only play the CPU side')
+    return search_policy(**STRENGTHS[strength]), 'EASY'
+
+
+'''
+This function plays one game from the starting position, the user moving
+first as in the GUI, and returns a dictionary with the winner ('USER', 'CPU',
+'DRAW' or None if max_plies was reached first), the number of plies played,
+the number of pieces each side has left, the average time each side took
+per move and the counters of the board's move cache (see
+legal_moves.MoveCache.stats). The game ends as Board.check_game_over says:
+a side with no pieces or no legal move on its turn loses, and repetitions
+and long stretches without progress are draws. If seed is given, the
+board's tie-breaking is seeded with it so the game can be replayed. If
+record is a position_io.GameWriter, the game is written to it move by move,
+and tablebase and book are passed on to the Board for cpu_next_move to use.
+'''
+def play_game(policy_user, policy_cpu, max_plies=400, cpu_strength='EASY',
+              seed=None, record=None, tablebase=None, book=None):
+    board = Board(cpu_strength, random.Random(seed), tablebase, book)
+    board.initialize_game()
+    if record is not None:
+        record.begin(board.bitboard,
+                     None if seed is None else {'Seed': seed})
+    policies = {'USER': policy_user, 'CPU': policy_cpu}
+    seconds = {'USER': 0.0, 'CPU': 0.0}
+    side = 'USER'
+    plies = 0
+    while board.check_game_over() is None and plies < max_plies:
+        start = time.perf_counter()
+        move = policies[side](board, side)
+        seconds[side] += time.perf_counter() - start
+        if record is not None:
+            record.move(board.find_move(move[0], move[1], move[2], move[3]))
+        board.update_board(move[0], move[1], move[2], move[3])
+        side = other_side(side)
+        plies += 1
+    if record is not None:
+        record.end(board.winner)
+    user_moves = (plies + 1) // 2
+    cpu_moves = plies // 2
+    return {'winner': board.winner, 'plies': plies,
+            'user_pieces': board.num_user_pieces,
+            'cpu_pieces': board.num_cpu_pieces,
+            'user_seconds_per_move':
+                seconds['USER'] / user_moves if user_moves else 0.0,
+            'cpu_seconds_per_move':
+                seconds['CPU'] / cpu_moves if cpu_moves else 0.0,
+            'move_cache': board.move_cache.stats()}
+
+
+'''
+Running this file plays a batch of games between a random user and the EASY
+CPU and prints the results, how long they took and how much move generation
+the move cache saved, e.g. python simulation.py 100.
+'''
+if __name__ == '__main__':
+    metrics.enable_from_env()
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rng = random.Random(0)
+    results = {'USER': 0, 'CPU': 0, 'DRAW': 0, None: 0}
+    cache = {}
+    start = time.perf_counter()
+    for i in range(games):
+        result = play_game(random_policy(rng), cpu_policy)
+        results[result['winner']] += 1
+        for key, value in result['move_cache'].items():
+            cache[key] = cache.get(key, 0) + value
+    elapsed = time.perf_counter() - start
+    print('user wins:', results['USER'], 'cpu wins:', results['CPU'],
+          'draws:', results['DRAW'], 'unfinished:', results[None])
+    print('%d games in %.2f s (%.1f ms per game)' %
+          (games, elapsed, 1000 * elapsed / games))
+    print('move cache: %d move lists built, %d reused; %d pieces\' simple '
+          'moves generated, %d reused; %d capture expansions' %
+          (cache['builds'], cache['hits'], cache['piece_generations'],
+           cache['pieces_reused'], cache['capture_expansions']))
+    metrics.finish()
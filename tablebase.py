@@ -0,0 +1,412 @@
+import os
+import sys
+import mmap
+import time
+import random
+import struct
+import argparse
+from itertools import combinations
+from bitboard import BitBoard, bits, PROMOTION_ROW, FULL
+
+'''
+The tablebase module builds and probes endgame tables: for every position
+with at most a few pieces on the board it stores whether the side to move
+wins, loses or draws with perfect play and, for a win or a loss, in how many
+plies the game ends.
+
+Positions are grouped by their material signature, the number of user men,
+user kings, CPU men and CPU kings, and each signature has its own table. A
+position's index in its table is worked out from the squares of each of the
+four groups of pieces (see position_index), times two for the side to move.
+Each entry is one byte:
+  0          draw (neither side can force a win)
+  odd v      the side to move loses in v - 1 plies
+  even v     the side to move wins in v - 1 plies
+  INVALID    not a position (two pieces on a square, or a man on the row
+             where it would have been crowned)
+A side with no legal move loses, as in English draughts.
+
+The tables are generated by retrograde analysis, one signature at a time,
+in an order where a capture (fewer pieces) or a crowning (fewer men) always
+leads to a table that is already finished. Within a signature the values are
+found in passes: pass d resolves exactly the positions that end in d plies,
+so every distance is the shortest win or the longest loss. Whatever is left
+unresolved when no more passes can change anything is a draw. A distance
+that would not fit in the byte below INVALID is an error rather than being
+cut short, since the passes rely on every distance being exact.
+
+The file starts with a header (MAGIC, the piece limit and the number of
+tables), followed by one directory entry per table (its signature and the
+offset and length of its data) and then the tables themselves. Tablebase
+memory-maps the file, so probing does not read it into memory.
+
+Examples:
+  python tablebase.py --generate --pieces 3
+  python tablebase.py --bench --probes 100000
+'''
+
+MAGIC = b'CKTB'
+HEADER = struct.Struct('<4sII')
+ENTRY = struct.Struct('<BBBBII')
+INVALID = 255
+DRAW = 0
+MAX_PIECES = 3
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'endgame.cktb')
+
+'''
+COMB[n][k] is the binomial coefficient n choose k.
+'''
+COMB = [[0] * 33 for n in range(33)]
+for n in range(33):
+    COMB[n][0] = 1
+    for k in range(1, n + 1):
+        COMB[n][k] = COMB[n - 1][k - 1] + COMB[n - 1][k]
+
+USER_MAN_SQUARES = FULL & ~PROMOTION_ROW['USER']
+CPU_MAN_SQUARES = FULL & ~PROMOTION_ROW['CPU']
+
+
+def signature(bitboard):
+    kings = bitboard.kings
+    return ((bitboard.user & ~kings).bit_count(),
+            (bitboard.user & kings).bit_count(),
+            (bitboard.cpu & ~kings).bit_count(),
+            (bitboard.cpu & kings).bit_count())
+
+
+'''
+This function returns the number of entries in a signature's table.
+'''
+def table_size(sig):
+    size = 2
+    for count in sig:
+        size *= COMB[32][count]
+    return size
+
+
+'''
+The rank of a set of squares among all sets of the same size, in the
+combinatorial number system.
+'''
+def rank(mask):
+    total = 0
+    i = 1
+    for sq in bits(mask):
+        total += COMB[sq][i]
+        i += 1
+    return total
+
+
+def position_index(bitboard, sig):
+    kings = bitboard.kings
+    index = 0
+    for count, mask in zip(sig, (bitboard.user & ~kings,
+                                 bitboard.user & kings,
+                                 bitboard.cpu & ~kings,
+                                 bitboard.cpu & kings)):
+        index = index * COMB[32][count] + rank(mask)
+    return index * 2 + (bitboard.side == 'CPU')
+
+
+'''
+This function returns every material signature with at most max_pieces
+pieces and at least one piece on each side, in the order they must be
+generated: by number of pieces, then by number of men.
+'''
+def signatures(max_pieces):
+    sigs = []
+    for um in range(max_pieces):
+        for uk in range(max_pieces - um + 1):
+            for cm in range(max_pieces - um - uk + 1):
+                for ck in range(max_pieces - um - uk - cm + 1):
+                    if um + uk and cm + ck:
+                        sigs.append((um, uk, cm, ck))
+    sigs.sort(key=lambda sig: (sum(sig), sig[0] + sig[2], sig))
+    return sigs
+
+
+'''
+This generator yields the masks (user, cpu, kings) of every valid position
+of a signature.
+'''
+def positions(sig):
+    um, uk, cm, ck = sig
+    for user_men in combinations(range(32), um):
+        user_men = sum(1 << sq for sq in user_men)
+        if user_men & ~USER_MAN_SQUARES:
+            continue
+        for user_kings in combinations(range(32), uk):
+            user_kings = sum(1 << sq for sq in user_kings)
+            if user_kings & user_men:
+                continue
+            user = user_men | user_kings
+            for cpu_men in combinations(range(32), cm):
+                cpu_men = sum(1 << sq for sq in cpu_men)
+                if cpu_men & (user | ~CPU_MAN_SQUARES):
+                    continue
+                for cpu_kings in combinations(range(32), ck):
+                    cpu_kings = sum(1 << sq for sq in cpu_kings)
+                    if cpu_kings & (user | cpu_men):
+                        continue
+                    yield user, cpu_men | cpu_kings, user_kings | cpu_kings
+
+
+'''
+This function works out the table of one signature. tables holds the
+finished tables of the signatures generated before it, which every capture
+and crowning leads to. It returns the table as a bytearray.
+'''
+def generate_table(sig, tables):
+    table = bytearray([INVALID]) * table_size(sig)
+    bitboard = BitBoard()
+    children = {}
+    longest = 0
+    for user, cpu, kings in positions(sig):
+        for side in ('USER', 'CPU'):
+            bitboard.user, bitboard.cpu = user, cpu
+            bitboard.kings, bitboard.side = kings, side
+            index = position_index(bitboard, sig)
+            table[index] = DRAW
+            inside = []
+            win = None
+            lost = True
+            worst = 0
+            for move in bitboard.generate_moves(side):
+                undo = bitboard.make_move(move)
+                child_sig = signature(bitboard)
+                if child_sig == sig:
+                    inside.append(position_index(bitboard, sig))
+                else:
+                    if not bitboard.user or not bitboard.cpu:
+                        value = 1
+                    else:
+                        value = tables[child_sig][
+                            position_index(bitboard, child_sig)]
+                    if value & 1:
+                        win = value if win is None else min(win, value)
+                    elif value:
+                        worst = max(worst, value)
+                    else:
+                        lost = False
+                    longest = max(longest, value)
+                bitboard.unmake_move(undo)
+            children[index] = (inside, win, lost and win is None, worst)
+
+    unresolved = set(children)
+    d = 0
+    quiet = 0
+    while unresolved and (quiet < 2 or d <= longest + 1):
+        resolved = {}
+        for index in unresolved:
+            value = value_at(d, children[index], table)
+            if value:
+                resolved[index] = value
+        if resolved and d + 1 >= INVALID:
+            raise ValueError('a table of signature %s needs distances of '
+                             '%d plies or more, which do not fit in a byte'
+                             % (sig, d))
+        for index, value in resolved.items():
+            table[index] = value
+        unresolved.difference_update(resolved)
+        quiet = 0 if resolved else quiet + 1
+        d += 1
+    return table
+
+
+'''
+This function returns the value of a position if the game ends exactly d
+plies from it, or 0 if it does not. node holds the indices of its children
+in the same table, the shortest win reached by a move into another table,
+whether every move into another table loses, and the longest such loss.
+Unresolved children still read as DRAW (0). On odd d the side to move wins
+if it can move to a position the other side loses in d - 1 plies; on even d
+it loses if every move leads to a position the other side wins, the longest
+in d - 1 plies.
+'''
+def value_at(d, node, table):
+    inside, win, lost, worst = node
+    if d & 1:
+        if win == d:
+            return d + 1
+        for child in inside:
+            if table[child] == d:
+                return d + 1
+        return 0
+    if not lost:
+        return 0
+    for child in inside:
+        value = table[child]
+        if not value or value & 1:
+            return 0
+        worst = max(worst, value)
+    return d + 1 if worst == d else 0
+
+
+'''
+This function generates the tables of every signature with at most
+max_pieces pieces and writes them to path. If report is True it prints the
+time each table took. It returns the total time.
+'''
+def generate(path=DEFAULT_PATH, max_pieces=MAX_PIECES, report=False):
+    tables = {}
+    total = time.perf_counter()
+    for sig in signatures(max_pieces):
+        start = time.perf_counter()
+        tables[sig] = generate_table(sig, tables)
+        if report:
+            table = tables[sig]
+            counts = [0, 0, 0]
+            for value in table:
+                if value != INVALID:
+                    counts[0 if value == 0 else 1 + (value & 1)] += 1
+            print('%-14s %8d positions  %6.2f s  %d wins  %d losses  '
+                  '%d draws' % (sig, sum(counts), time.perf_counter() - start,
+                                counts[1], counts[2], counts[0]))
+    sigs = list(tables)
+    offset = HEADER.size + ENTRY.size * len(sigs)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, max_pieces, len(sigs)))
+        for sig in sigs:
+            f.write(ENTRY.pack(*sig, offset, len(tables[sig])))
+            offset += len(tables[sig])
+        for sig in sigs:
+            f.write(tables[sig])
+    return time.perf_counter() - total
+
+
+'''
+The Tablebase class probes a file written by generate. probe returns the
+result for the side to move ('WIN', 'LOSS' or 'DRAW') and the number of
+plies to the end of the game (None for a draw), or None if the position has
+too many pieces for the tables. best_moves returns the moves that win
+fastest, or failing that draw, or failing that lose slowest.
+'''
+
+
+class Tablebase:
+    def __init__(self, path=DEFAULT_PATH):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.max_pieces, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(path + ' is not a tablebase file')
+        self.offsets = {}
+        for i in range(count):
+            um, uk, cm, ck, offset, length = ENTRY.unpack_from(
+                self.map, HEADER.size + i * ENTRY.size)
+            self.offsets[(um, uk, cm, ck)] = offset
+        self.probes = 0
+        self.hits = 0
+
+    def value(self, bitboard):
+        self.probes += 1
+        if not bitboard.user or not bitboard.cpu:
+            self.hits += 1
+            return 1
+        sig = signature(bitboard)
+        offset = self.offsets.get(sig)
+        if offset is None:
+            return None
+        self.hits += 1
+        return self.map[offset + position_index(bitboard, sig)]
+
+    def probe(self, bitboard):
+        value = self.value(bitboard)
+        if value is None or value == INVALID:
+            return None
+        if value == DRAW:
+            return 'DRAW', None
+        return ('LOSS' if value & 1 else 'WIN'), value - 1
+
+    def best_moves(self, bitboard, moves=None):
+        if (bitboard.user | bitboard.cpu).bit_count() > self.max_pieces:
+            return None
+        if moves is None:
+            moves = bitboard.generate_moves(bitboard.side)
+        bitboard = bitboard.copy()
+        best = []
+        best_score = None
+        for move in moves:
+            undo = bitboard.make_move(move)
+            value = self.value(bitboard)
+            bitboard.unmake_move(undo)
+            if value is None or value == INVALID:
+                return None
+            if value & 1:
+                score = 1000 - value
+            elif value:
+                score = -1000 + value
+            else:
+                score = 0
+            if best_score is None or score > best_score:
+                best, best_score = [move], score
+            elif score == best_score:
+                best.append(move)
+        return best or None
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+'''
+This function returns a Tablebase for the file at path, or None if there is
+no such file (the tables are optional).
+'''
+def load(path=DEFAULT_PATH):
+    if not os.path.exists(path):
+        return None
+    return Tablebase(path)
+
+
+'''
+This function times probe on count random positions covered by the
+tablebase and returns the average time per probe in microseconds.
+'''
+def bench_probe(tablebase, count=100000, seed=0):
+    rng = random.Random(seed)
+    sigs = list(tablebase.offsets)
+    samples = []
+    while len(samples) < count:
+        sig = rng.choice(sigs)
+        squares = rng.sample(range(32), sum(sig))
+        groups = []
+        for n in sig:
+            groups.append(sum(1 << sq for sq in squares[:n]))
+            squares = squares[n:]
+        user_men, user_kings, cpu_men, cpu_kings = groups
+        if user_men & ~USER_MAN_SQUARES or cpu_men & ~CPU_MAN_SQUARES:
+            continue
+        samples.append(BitBoard(user_men | user_kings, cpu_men | cpu_kings,
+                                user_kings | cpu_kings,
+                                rng.choice(('USER', 'CPU'))))
+    start = time.perf_counter()
+    for bitboard in samples:
+        tablebase.probe(bitboard)
+    return 1e6 * (time.perf_counter() - start) / count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate, check and benchmark endgame tables.')
+    parser.add_argument('--generate', action='store_true')
+    parser.add_argument('--pieces', type=int, default=MAX_PIECES,
+                        help='largest number of pieces to generate')
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--bench', action='store_true',
+                        help='time probes of random positions')
+    parser.add_argument('--probes', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.generate:
+        seconds = generate(args.path, args.pieces, report=True)
+        print('generated %s (%d bytes) in %.2f s' %
+              (args.path, os.path.getsize(args.path), seconds))
+    if args.bench:
+        tablebase = load(args.path)
+        if tablebase is None:
+            sys.exit('no tablebase at %s; run with --generate first' %
+                     args.path)
+        print('%.2f us per probe over %d positions' %
+              (bench_probe(tablebase, args.probes), args.probes))
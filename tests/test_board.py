@@ -0,0 +1,107 @@
+import copy
+import random
+import unittest
+from checkers_rules import Board
+from bitboard import square_coords
+
+'''
+These tests check that Board.make_move and unmake_move, and the undo and
+redo built on them, put back exactly the board they started from, and that
+make_move leaves the same board as playing the move on a deep copy with
+update_board, over seeded random games.
+'''
+
+GAMES = 60
+MAX_PLIES = 200
+
+
+'''
+This function returns everything about board that a move changes: the
+pieces on every square, the bitboard and its hash, the piece counts, the
+winner, the positions in the game's history and the legal moves.
+'''
+def snapshot(board):
+    pieces = [(piece.code, piece.row, piece.col, piece.is_user, piece.is_king)
+              for row in board.board for piece in row if piece is not None]
+    bitboard = board.bitboard
+    return (pieces, bitboard.user, bitboard.cpu, bitboard.kings,
+            bitboard.side, bitboard.key, board.num_user_pieces,
+            board.num_cpu_pieces, board.winner,
+            list(board.position_history.keys),
+            list(board.position_history.quiet),
+            sorted(board.legal_moves()))
+
+
+def random_game(seed):
+    rng = random.Random(seed)
+    board = Board(rng=random.Random(seed))
+    board.initialize_game()
+    return board, rng
+
+
+class MakeUnmakeTest(unittest.TestCase):
+    def test_unmake_restores_every_position(self):
+        for game in range(GAMES):
+            board, rng = random_game(game)
+            for ply in range(MAX_PLIES):
+                if board.check_game_over() is not None:
+                    break
+                before = snapshot(board)
+                for move in board.legal_moves():
+                    undo = board.make_move(move)
+                    board.unmake_move(undo)
+                    self.assertEqual(snapshot(board), before)
+                board.make_move(rng.choice(board.legal_moves()))
+
+    def test_make_move_matches_update_board_on_a_copy(self):
+        for game in range(GAMES):
+            board, rng = random_game(game)
+            for ply in range(MAX_PLIES):
+                if board.check_game_over() is not None:
+                    break
+                move = rng.choice(board.legal_moves())
+                other = copy.deepcopy(board)
+                other.update_board(*square_coords(move[0]),
+                                   *square_coords(move[1]))
+                board.make_move(move)
+                self.assertEqual(snapshot(board), snapshot(other))
+
+
+class UndoRedoTest(unittest.TestCase):
+    def test_undo_and_redo_a_whole_game(self):
+        for game in range(GAMES):
+            board, rng = random_game(game)
+            positions = [snapshot(board)]
+            moves = []
+            for ply in range(MAX_PLIES):
+                if board.check_game_over() is not None:
+                    break
+                move = rng.choice(board.legal_moves())
+                board.update_board(*square_coords(move[0]),
+                                   *square_coords(move[1]))
+                moves.append(move)
+                positions.append(snapshot(board))
+            for i in range(len(moves) - 1, -1, -1):
+                self.assertEqual(board.undo_move(), moves[i])
+                self.assertEqual(snapshot(board), positions[i])
+            self.assertIsNone(board.undo_move())
+            for i, move in enumerate(moves):
+                self.assertEqual(board.redo_move(), move)
+                self.assertEqual(snapshot(board), positions[i + 1])
+            self.assertIsNone(board.redo_move())
+
+    def test_new_move_clears_redo(self):
+        board, rng = random_game(0)
+        for ply in range(4):
+            move = rng.choice(board.legal_moves())
+            board.update_board(*square_coords(move[0]),
+                               *square_coords(move[1]))
+        board.undo_move()
+        board.undo_move()
+        move = board.legal_moves()[0]
+        board.update_board(*square_coords(move[0]), *square_coords(move[1]))
+        self.assertIsNone(board.redo_move())
+
+
+if __name__ == '__main__':
+    unittest.main()
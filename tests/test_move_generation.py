@@ -0,0 +1,169 @@
+import random
+import unittest
+from bitboard import BitBoard, square_index, square_coords
+from perft import Timer, bitboard_perft, undo_perft, make_position
+
+'''
+These tests check the bitboard move generator against a plain
+square-by-square generator on an 8 by 8 grid, the way the Board worked out
+moves before bitboard.py, over seeded random games, and pin the perft counts
+of the starting position.
+'''
+
+GAMES = 200
+MAX_PLIES = 150
+
+
+'''
+This function returns the position of bitboard as an 8 by 8 grid of None,
+'u' and 'c' for men and 'U' and 'C' for kings.
+'''
+def to_grid(bitboard):
+    grid = [[None] * 8 for i in range(8)]
+    for sq in range(32):
+        row, col = square_coords(sq)
+        if bitboard.user >> sq & 1:
+            grid[row][col] = 'u'
+        elif bitboard.cpu >> sq & 1:
+            grid[row][col] = 'c'
+        if grid[row][col] is not None and bitboard.kings >> sq & 1:
+            grid[row][col] = grid[row][col].upper()
+    return grid
+
+
+'''
+This function returns the legal moves of side on grid as a set of
+(src, dst, captured) moves, found one square at a time: every capture
+sequence of every piece if there is one, and every simple move otherwise.
+'''
+def grid_moves(grid, side):
+    own = 'u' if side == 'USER' else 'c'
+    forward = -1 if side == 'USER' else 1
+    captures = set()
+    simple = set()
+    for row in range(8):
+        for col in range(8):
+            piece = grid[row][col]
+            if piece is None or piece.lower() != own:
+                continue
+            king = piece.isupper()
+            directions = [(dr, dc) for dr in (-1, 1) for dc in (-1, 1)
+                          if king or dr == forward]
+            grid_jumps(grid, (row, col), (row, col), directions, king,
+                       side, (), captures)
+            for dr, dc in directions:
+                r, c = row + dr, col + dc
+                if 0 <= r < 8 and 0 <= c < 8 and grid[r][c] is None:
+                    simple.add((square_index(row, col), square_index(r, c),
+                                0))
+    return captures or simple
+
+
+def grid_jumps(grid, start, at, directions, king, side, captured, found):
+    opponent = 'c' if side == 'USER' else 'u'
+    far_row = 0 if side == 'USER' else 7
+    extended = False
+    for dr, dc in directions:
+        over = (at[0] + dr, at[1] + dc)
+        land = (at[0] + 2 * dr, at[1] + 2 * dc)
+        if not (0 <= land[0] < 8 and 0 <= land[1] < 8):
+            continue
+        piece = grid[over[0]][over[1]]
+        if piece is None or piece.lower() != opponent or over in captured:
+            continue
+        if grid[land[0]][land[1]] is not None and land != start:
+            continue
+        extended = True
+        if not king and land[0] == far_row:
+            found.add(grid_move(start, land, captured + (over,)))
+        else:
+            grid_jumps(grid, start, land, directions, king, side,
+                       captured + (over,), found)
+    if not extended and captured:
+        found.add(grid_move(start, at, captured))
+
+
+def grid_move(start, end, captured):
+    mask = 0
+    for row, col in captured:
+        mask |= 1 << square_index(row, col)
+    return square_index(*start), square_index(*end), mask
+
+
+class MoveGenerationTest(unittest.TestCase):
+    def test_random_games_match_grid_generator(self):
+        rng = random.Random(2024)
+        multi_jumps = 0
+        king_moves = 0
+        for game in range(GAMES):
+            bitboard = BitBoard(user=0xFFF00000, cpu=0x00000FFF)
+            for ply in range(MAX_PLIES):
+                side = bitboard.side
+                moves = bitboard.generate_moves(side)
+                self.assertEqual(len(moves), len(set(moves)))
+                self.assertEqual(set(moves), grid_moves(to_grid(bitboard),
+                                                        side))
+                if not moves:
+                    break
+                multi_jumps += sum(1 for move in moves
+                                   if move[2].bit_count() > 1)
+                king_moves += sum(1 for move in moves
+                                  if bitboard.kings >> move[0] & 1)
+                bitboard.make_move(rng.choice(moves))
+        self.assertGreater(multi_jumps, 0)
+        self.assertGreater(king_moves, 0)
+
+    def test_multi_jump_branches(self):
+        bitboard = BitBoard()
+        bitboard.put(square_index(6, 1), 'USER')
+        bitboard.put(square_index(0, 7), 'CPU')
+        for row, col in ((5, 2), (3, 2), (3, 4)):
+            bitboard.put(square_index(row, col), 'CPU')
+        first = 1 << square_index(5, 2)
+        expected = {
+            (square_index(6, 1), square_index(2, 1),
+             first | 1 << square_index(3, 2)),
+            (square_index(6, 1), square_index(2, 5),
+             first | 1 << square_index(3, 4)),
+        }
+        self.assertEqual(set(bitboard.generate_moves('USER')), expected)
+        self.assertEqual(grid_moves(to_grid(bitboard), 'USER'), expected)
+
+    def test_king_circuit_lands_on_its_own_square(self):
+        bitboard = BitBoard()
+        bitboard.put(square_index(6, 3), 'USER_KING')
+        captured = 0
+        for row, col in ((5, 4), (3, 4), (3, 2), (5, 2)):
+            bitboard.put(square_index(row, col), 'CPU')
+            captured |= 1 << square_index(row, col)
+        moves = bitboard.generate_moves('USER')
+        self.assertIn((square_index(6, 3), square_index(6, 3), captured),
+                      moves)
+        self.assertEqual(set(moves), grid_moves(to_grid(bitboard), 'USER'))
+
+    def test_man_stops_when_crowned(self):
+        bitboard = BitBoard()
+        bitboard.put(square_index(2, 1), 'USER')
+        bitboard.put(square_index(1, 2), 'CPU')
+        bitboard.put(square_index(1, 4), 'CPU')
+        moves = bitboard.generate_moves('USER')
+        self.assertEqual(moves, [(square_index(2, 1), square_index(0, 3),
+                                  1 << square_index(1, 2))])
+        self.assertEqual(grid_moves(to_grid(bitboard), 'USER'), set(moves))
+
+
+class PerftTest(unittest.TestCase):
+    START = {1: 7, 2: 49, 3: 302, 4: 1469, 5: 7361}
+
+    def test_bitboard_start(self):
+        for depth, nodes in self.START.items():
+            position = make_position('start', 'bitboard')
+            self.assertEqual(bitboard_perft(position, depth, Timer()), nodes)
+
+    def test_board_start(self):
+        position = make_position('start', 'undo')
+        self.assertEqual(undo_perft(position, 5, Timer()), self.START[5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import random
+import unittest
+from checkers_rules import Board
+from move_provider import MoveProvider
+
+'''
+These tests check that pondering answers the user's replies before they are
+played, so that the CPU's move is ready as soon as it is asked for.
+'''
+
+
+def wait_for(provider, seconds=10.0):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        move = provider.poll()
+        if move is not None:
+            return move
+        time.sleep(0.01)
+    return None
+
+
+class PonderTest(unittest.TestCase):
+    def ponder(self, strength):
+        board = Board(strength, rng=random.Random(0))
+        board.initialize_game()
+        board.make_move(board.legal_moves()[0])
+        board.make_move(board.legal_moves()[0])
+        provider = MoveProvider(5.0)
+        provider.ponder(board)
+        provider.thread.join()
+        return board, provider
+
+    def test_every_reply_is_answered(self):
+        for strength in ('EASY', 'MEDIUM'):
+            board, provider = self.ponder(strength)
+            keys = set()
+            for move in board.legal_moves():
+                undo = board.make_move(move)
+                keys.add(board.bitboard.key)
+                board.unmake_move(undo)
+            self.assertEqual(set(provider.pondered), keys)
+            board.make_move(board.legal_moves()[-1])
+            provider.request(board)
+            self.assertIsNotNone(provider.poll())
+            self.assertEqual(provider.ponder_hits, 1)
+
+    def test_hit_while_still_pondering_without_an_engine(self):
+        board, provider = self.ponder('EASY')
+        self.assertIsNone(provider.engine)
+        provider.busy = lambda: True
+        board.make_move(board.legal_moves()[0])
+        provider.request(board)
+        self.assertIsNotNone(provider.poll())
+        self.assertEqual(provider.ponder_hits, 1)
+
+    def test_miss_is_searched(self):
+        board, provider = self.ponder('MEDIUM')
+        provider.pondered.clear()
+        board.make_move(board.legal_moves()[0])
+        provider.request(board)
+        self.assertIsNotNone(wait_for(provider))
+        self.assertEqual(provider.ponder_misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
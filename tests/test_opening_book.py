@@ -0,0 +1,107 @@
+import os
+import random
+import tempfile
+import unittest
+from checkers_rules import Board
+from opening_book import BookBuilder, OpeningBook, load
+
+'''
+These tests build small opening books from hand-made games and check that
+lookups find every position the games reached in their first plies with
+the right counts, that positions outside the book are not found, and that
+choose only ever picks legal moves from the book.
+'''
+
+
+def start_position():
+    board = Board(rng=random.Random(0))
+    board.initialize_game()
+    return board.bitboard.copy()
+
+
+'''
+This function plays plies moves from start, each the legal move numbered
+pick (or the last one if there are fewer), and returns the moves with the
+position each was played from.
+'''
+def first_moves(start, plies, pick=0):
+    bitboard = start.copy()
+    played = []
+    for ply in range(plies):
+        moves = bitboard.generate_moves(bitboard.side)
+        move = moves[min(pick, len(moves) - 1)]
+        played.append((bitboard.copy(), move))
+        bitboard.make_move(move)
+    return played
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.book')
+        self.start = start_position()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def build(self, games, plies=4, min_games=1):
+        builder = BookBuilder(plies)
+        for pick, winner in games:
+            moves = first_moves(self.start, 6, pick)
+            builder.add_game(self.start, [move[:2] for _, move in moves],
+                             winner)
+        count = builder.save(self.path, min_games)
+        book = OpeningBook(self.path)
+        self.addCleanup(book.close)
+        self.assertEqual(len(book), count)
+        return book
+
+    def test_lookup_counts(self):
+        book = self.build([(0, 'USER'), (0, 'CPU'), (0, 'DRAW'), (1, None)])
+        for ply, (bitboard, move) in enumerate(first_moves(self.start, 4)):
+            entries = {entry[:2]: entry[2:]
+                       for entry in book.lookup(bitboard.key)}
+            self.assertEqual(len(entries), 2 if ply == 0 else 1)
+            self.assertEqual(entries[move[:2]], (3, 1, 1))
+
+    def test_only_the_first_plies(self):
+        book = self.build([(0, 'USER')], plies=2)
+        played = first_moves(self.start, 3)
+        self.assertTrue(book.lookup(played[1][0].key))
+        self.assertEqual(book.lookup(played[2][0].key), [])
+        self.assertEqual(book.probes, 2)
+        self.assertEqual(book.hits, 1)
+
+    def test_min_games(self):
+        side = self.start.side
+        book = self.build([(0, side), (0, side), (1, 'DRAW')], min_games=2)
+        entries = book.lookup(self.start.key)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0][2:], (2, 2, 0))
+
+    def test_choose(self):
+        book = self.build([(0, 'USER'), (1, 'CPU'), (2, 'DRAW')])
+        moves = self.start.generate_moves(self.start.side)
+        book_moves = {entry[:2] for entry in book.lookup(self.start.key)}
+        rng = random.Random(0)
+        for i in range(50):
+            move = book.choose(self.start, moves, rng)
+            self.assertIn(move, moves)
+            self.assertIn(move[:2], book_moves)
+        self.assertIsNone(book.choose(self.start, [m for m in moves
+                                                   if m[:2] not in book_moves],
+                                      rng))
+        outside = first_moves(self.start, 6)[5][0]
+        self.assertIsNone(book.choose(outside, outside.generate_moves(
+            outside.side), rng))
+
+    def test_load(self):
+        self.assertIsNone(load(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'not a book')
+        with self.assertRaises(ValueError):
+            load(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import unittest
+from checkers_rules import Board
+from bitboard import BitBoard, square_index
+from position_io import (GameWriter, read_games, resolve_move, move_text,
+                         to_fen, from_fen, pack_position, unpack_position)
+
+'''
+These tests check that positions survive being written as FEN and packed
+records and read back, and that the games GameWriter records replay move
+for move with read_games and resolve_move, including captures whose ends
+are shared by another capture sequence.
+'''
+
+GAMES = 20
+MAX_PLIES = 200
+
+
+'''
+This function plays a seeded random game from the starting position and
+returns the starting BitBoard and the moves played.
+'''
+def random_game(seed):
+    rng = random.Random(seed)
+    board = Board(rng=random.Random(seed))
+    board.initialize_game()
+    start = board.bitboard.copy()
+    bitboard = start.copy()
+    moves = []
+    for ply in range(MAX_PLIES):
+        legal = bitboard.generate_moves(bitboard.side)
+        if not legal:
+            break
+        moves.append(rng.choice(legal))
+        bitboard.make_move(moves[-1])
+    return start, moves
+
+
+'''
+This function returns a position where the user's man on (6, 3) can take
+two pieces either way round to land on (2, 3), and the two captures.
+'''
+def shared_ends():
+    cpu = 0
+    for row, col in ((5, 2), (3, 2), (5, 4), (3, 4)):
+        cpu |= 1 << square_index(row, col)
+    bitboard = BitBoard(1 << square_index(6, 3), cpu, side='USER')
+    moves = bitboard.generate_moves('USER')
+    return bitboard, moves
+
+
+class PositionTest(unittest.TestCase):
+    def test_fen_and_packed_round_trip(self):
+        for seed in range(GAMES):
+            start, moves = random_game(seed)
+            bitboard = start.copy()
+            for move in moves:
+                bitboard.make_move(move)
+                self.assertEqual(from_fen(to_fen(bitboard)), bitboard)
+                self.assertEqual(unpack_position(pack_position(bitboard)),
+                                 bitboard)
+
+    def test_bad_fen(self):
+        for text in ('', 'X:W1', 'W:W33', 'W:Q1'):
+            with self.assertRaises(ValueError):
+                from_fen(text)
+
+
+class GameRecordTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'games.pdn')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, games):
+        with GameWriter(self.path) as writer:
+            for start, moves, winner in games:
+                writer.begin(start, {'Event': 'test'})
+                for move in moves:
+                    writer.move(move)
+                writer.end(winner)
+
+    def replay(self, game):
+        bitboard = game['start'].copy()
+        played = []
+        for squares in game['moves']:
+            move = resolve_move(bitboard, squares)
+            self.assertIsNotNone(move)
+            played.append(move)
+            bitboard.make_move(move)
+        return played
+
+    def test_games_replay(self):
+        games = [random_game(seed) + (random.choice(['USER', 'CPU', 'DRAW',
+                                                     None]),)
+                 for seed in range(GAMES)]
+        self.write(games)
+        read = list(read_games(self.path))
+        self.assertEqual(len(read), len(games))
+        for (start, moves, winner), game in zip(games, read):
+            self.assertEqual(game['start'], start)
+            self.assertEqual(game['winner'], winner)
+            self.assertEqual(game['tags']['Event'], 'test')
+            self.assertEqual(self.replay(game), moves)
+
+    def test_captures_with_shared_ends(self):
+        bitboard, moves = shared_ends()
+        self.assertEqual(len(moves), 2)
+        self.assertEqual(moves[0][:2], moves[1][:2])
+        self.assertNotEqual(moves[0][2], moves[1][2])
+        self.assertNotEqual(move_text(moves[0]), move_text(moves[1]))
+        self.write([(bitboard, [move], None) for move in moves])
+        for move, game in zip(moves, read_games(self.path)):
+            self.assertEqual(self.replay(game), [move])
+
+    def test_capture_written_by_its_ends(self):
+        bitboard, moves = shared_ends()
+        src, dst = moves[0][:2]
+        self.assertIn(resolve_move(bitboard, (src, dst)), moves)
+        self.assertIsNone(resolve_move(bitboard, (src, dst + 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import random
+import tempfile
+import unittest
+from itertools import product
+from bitboard import BitBoard
+from tablebase import signatures, positions, generate, Tablebase
+
+'''
+These tests check that the tablebase lists every material signature in an
+order it can be generated in, and that a generated file can be probed for
+every signature and agrees with itself: a position's value follows from the
+values of the positions its moves lead to.
+'''
+
+MAX_PIECES = 3
+SAMPLES = 40
+
+
+'''
+This function returns every signature with at most max_pieces pieces and a
+piece on each side, by trying every count of every kind of piece.
+'''
+def all_signatures(max_pieces):
+    return {sig for sig in product(range(max_pieces + 1), repeat=4)
+            if sum(sig) <= max_pieces and sig[0] + sig[1] and
+            sig[2] + sig[3]}
+
+
+class SignatureTest(unittest.TestCase):
+    def test_every_signature_is_listed_once(self):
+        for max_pieces in range(2, 6):
+            sigs = signatures(max_pieces)
+            self.assertEqual(len(sigs), len(set(sigs)))
+            self.assertEqual(set(sigs), all_signatures(max_pieces))
+
+    def test_captures_and_crownings_are_generated_first(self):
+        for max_pieces in range(2, 6):
+            order = {sig: i for i, sig in enumerate(signatures(max_pieces))}
+            for (um, uk, cm, ck), i in order.items():
+                for child in ((um - 1, uk, cm, ck), (um, uk - 1, cm, ck),
+                              (um, uk, cm - 1, ck), (um, uk, cm, ck - 1),
+                              (um - 1, uk + 1, cm, ck),
+                              (um, uk, cm - 1, ck + 1)):
+                    if child in order:
+                        self.assertLess(order[child], i)
+
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'endgame.cktb')
+        generate(path, MAX_PIECES)
+        cls.tablebase = Tablebase(path)
+        rng = random.Random(0)
+        cls.samples = {}
+        for sig in signatures(MAX_PIECES):
+            masks = list(positions(sig))
+            cls.samples[sig] = [BitBoard(*rng.choice(masks), side)
+                                for i in range(SAMPLES)
+                                for side in ('USER', 'CPU')]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebase.close()
+        cls.directory.cleanup()
+
+    def test_every_signature_can_be_probed(self):
+        for sig in all_signatures(MAX_PIECES):
+            for bitboard in self.samples[sig]:
+                self.assertIsNotNone(self.tablebase.probe(bitboard), sig)
+
+    def test_values_follow_from_the_moves(self):
+        tablebase = self.tablebase
+        for sig, samples in self.samples.items():
+            for bitboard in samples:
+                values = []
+                for move in bitboard.generate_moves(bitboard.side):
+                    undo = bitboard.make_move(move)
+                    values.append(tablebase.value(bitboard))
+                    bitboard.unmake_move(undo)
+                losses = [value for value in values if value & 1]
+                if not values:
+                    expected = 1
+                elif losses:
+                    expected = min(losses) + 1
+                elif all(values):
+                    expected = max(values) + 1
+                else:
+                    expected = 0
+                self.assertEqual(tablebase.value(bitboard), expected, sig)
+
+    def test_cpu_man_takes_the_last_user_man(self):
+        bitboard = BitBoard(user=1 << 21, cpu=1 << 17, side='CPU')
+        self.assertEqual(self.tablebase.probe(bitboard), ('WIN', 1))
+        best = self.tablebase.best_moves(bitboard)
+        self.assertEqual(best, [(17, 24, 1 << 21)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from multiprocessing import Pool
+from simulation import play_game, make_policy
+
+'''
+The tournament module plays many headless games between two policies (see
+simulation.make_policy for their names) on all of the machine's cores. Every
+game gets its own seed, worked out from the tournament's seed and the game's
+number, so any single game can be replayed on its own. Results are written
+to a JSONL file, one line per game, as soon as each game finishes; if the
+run is interrupted, running the same command again skips the games already
+in the file and plays only the rest.
+
+Example: python tournament.py --games 1000 --user hard --cpu easy
+'''
+
+
+'''
+The PARALLEL strength runs its search on a pool of worker processes, which
+the tournament's own worker processes are not allowed to start, so it
+cannot be used here.
+'''
+def check_policy(name):
+    if name.upper() == 'PARALLEL':
+        raise ValueError('parallel cannot be used in a tournament, whose '
+                         'games already run in worker processes')
+
+
+def game_seed(seed, game):
+    return seed * 1000003 + game
+
+
+'''
+This function plays the game numbered game and returns its result. It runs
+in a worker process, so it is given the policies by name and builds them
+there.
+'''
+def run_game(args):
+    game, user, cpu, seed, max_plies = args
+    rng = random.Random(game_seed(seed, game))
+    policy_user, ignored = make_policy(user, 'USER', rng)
+    policy_cpu, cpu_strength = make_policy(cpu, 'CPU', rng)
+    start = time.perf_counter()
+    result = play_game(policy_user, policy_cpu, max_plies, cpu_strength,
+                       game_seed(seed, game))
+    result.update({'game': game, 'user': user, 'cpu': cpu, 'seed': seed,
+                   'max_plies': max_plies,
+                   'seconds': time.perf_counter() - start})
+    return result
+
+
+'''
+This function reads the results already in the output file and returns the
+numbers of the games that were played with the same settings (the
+policies, the seed and the ply limit; records written before the ply limit
+was recorded never match). A line cut
+short by an interruption is removed so that new results start on a line of
+their own.
+'''
+def completed_games(path, user, cpu, seed, max_plies=400):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+            data = data[:data.rfind(b'\n') + 1]
+    for line in data.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if (record.get('user'), record.get('cpu'), record.get('seed'),
+                record.get('max_plies')) == (user, cpu, seed, max_plies):
+            done.add(record['game'])
+    return done
+
+
+def run_tournament(games, user, cpu, out, seed=0, workers=None,
+                   max_plies=400):
+    check_policy(user)
+    check_policy(cpu)
+    done = completed_games(out, user, cpu, seed, max_plies)
+    todo = [(game, user, cpu, seed, max_plies)
+            for game in range(games) if game not in done]
+    print('%d games already played, %d to go' % (len(done), len(todo)))
+    with open(out, 'a') as f, Pool(workers) as pool:
+        for result in pool.imap_unordered(run_game, todo):
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+    return summarize(out, user, cpu, seed, max_plies)
+
+
+def summarize(path, user, cpu, seed, max_plies=400):
+    wins = {'USER': 0, 'CPU': 0, 'DRAW': 0, None: 0}
+    plies = 0
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if (record['user'], record['cpu'], record['seed'],
+                    record.get('max_plies')) == (user, cpu, seed, max_plies):
+                wins[record['winner']] += 1
+                plies += record['plies']
+    total = sum(wins.values())
+    print('user (%s) wins: %d  cpu (%s) wins: %d  draws: %d  unfinished: %d'
+          % (user, wins['USER'], cpu, wins['CPU'], wins['DRAW'], wins[None]))
+    if total:
+        print('average length: %.1f plies' % (plies / total))
+    return wins
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play a tournament between two policies.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--user', default='random')
+    parser.add_argument('--cpu', default='easy')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--max-plies', type=int, default=400)
+    parser.add_argument('--out', default='tournament.jsonl')
+    args = parser.parse_args()
+    for name, side in ((args.user, 'USER'), (args.cpu, 'CPU')):
+        try:
+            check_policy(name)
+            make_policy(name, side)
+        except ValueError as error:
+            sys.exit(str(error))
+    run_tournament(args.games, args.user, args.cpu, args.out, args.seed,
+                   args.workers, args.max_plies)
@@ -0,0 +1,108 @@
+from array import array
+
+'''
+The transposition module contains the fixed-size table the search uses to
+remember positions it has already searched. Every entry takes 16 bytes (the
+64-bit Zobrist key and 64 bits of packed data) and all entries are
+allocated up front, so the memory a table uses never grows past the size it
+was created with, no matter how long the engine runs.
+'''
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+ENTRY_BYTES = 16
+SCORE_OFFSET = 1 << 20
+
+'''
+The packed data of an entry holds, from the low bits up: the score plus
+SCORE_OFFSET (21 bits), the depth (7 bits), the bound type (2 bits), a flag
+saying whether a best move is stored (1 bit), and the best move's source
+and destination squares (5 bits each).
+'''
+def pack(score, depth, flag, move):
+    data = (score + SCORE_OFFSET) | min(depth, 127) << 21 | flag << 28
+    if move is not None:
+        data |= 1 << 30 | move[0] << 31 | move[1] << 36
+    return data
+
+
+def unpack(data):
+    move = None
+    if data >> 30 & 1:
+        move = (data >> 31 & 31, data >> 36 & 31)
+    return ((data & 0x1FFFFF) - SCORE_OFFSET, data >> 21 & 127,
+            data >> 28 & 3, move)
+
+
+'''
+The TranspositionTable class stores entries in buckets of two slots. The
+first slot is depth-preferred: it only gives way to a search that was at
+least as deep (its old contents move down to the second slot). The second
+slot is always replaced. The counters record how many probes found their
+position (hits), how many did not (misses), and how many of those misses
+found the bucket taken by a different position (collisions).
+'''
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        entries = max(2, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1 << (entries // 2).bit_length() - 1
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(8 * 2 * buckets))
+        self.data = array('Q', bytes(8 * 2 * buckets))
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def size_bytes(self):
+        return len(self.keys) * ENTRY_BYTES
+
+    def clear(self):
+        n = len(self.keys)
+        self.keys = array('Q', bytes(8 * n))
+        self.data = array('Q', bytes(8 * n))
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    '''
+    This function returns (score, depth, flag, move) for the position with
+    the given key, or None if it is not in the table. move is a (src, dst)
+    pair or None.
+    '''
+    def probe(self, key):
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        if keys[slot] == key and self.data[slot]:
+            self.hits += 1
+            return unpack(self.data[slot])
+        if keys[slot + 1] == key and self.data[slot + 1]:
+            self.hits += 1
+            return unpack(self.data[slot + 1])
+        self.misses += 1
+        if self.data[slot] or self.data[slot + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, score, depth, flag, move):
+        slot = (key & self.mask) << 1
+        data = pack(score, depth, flag, move)
+        self.stores += 1
+        keys = self.keys
+        if keys[slot] == key or not self.data[slot] or \
+                depth >= self.data[slot] >> 21 & 127:
+            if keys[slot] != key and self.data[slot]:
+                keys[slot + 1] = keys[slot]
+                self.data[slot + 1] = self.data[slot]
+            keys[slot] = key
+            self.data[slot] = data
+        else:
+            keys[slot + 1] = key
+            self.data[slot + 1] = data
+
+    def stats(self):
+        return {'tt_hits': self.hits, 'tt_misses': self.misses,
+                'tt_collisions': self.collisions, 'tt_stores': self.stores,
+                'tt_bytes': self.size_bytes()}
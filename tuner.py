@@ -0,0 +1,247 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from multiprocessing import Pool
+from position_io import PositionWriter, read_games, resolve_move, \
+    RECORD_SIZE
+from opening_book import self_play
+from evaluation import FEATURES, DEFAULT_WEIGHTS, save_weights, WEIGHTS_PATH
+from batch_eval import from_buffer, features
+
+'''
+The tuner module fits the weights of the evaluation (see evaluation.py) to
+the results of games, in the manner of the Texel tuning method. Every
+position of a set of games is labelled with the game's result (1 if the
+user won, 0 if the CPU won, 1/2 for a draw), the evaluation is turned into
+an expected result with a logistic function, 1 / (1 + 10 ** (-K * score /
+400)), and the weights are moved to make the mean squared difference
+between the expected and actual results as small as possible.
+
+The training data is a file of packed positions (see position_io.py) in
+which the game's result is kept in bits 8 and 9 of each record's flags word
+(RESULTS). Only quiet positions are kept (no capture available for the side
+to move, and past the first few plies), since a score cannot describe a
+position in the middle of an exchange. The features of every position are
+worked out once, in parallel, with batch_eval.py and saved next to the data
+as a .npy file; each step of the fit then works out the error and its
+gradient for a slice of them on each worker process, with NumPy. The man
+weight is left at 100 so that the scores stay in the same units.
+
+Examples:
+  python tuner.py --self-play 500 --data tuning.bin
+  python tuner.py --records games.pdn --data tuning.bin
+  python tuner.py --data tuning.bin --tune --workers 4
+'''
+
+RESULTS = {'USER': 1, 'CPU': 2, 'DRAW': 3}
+RESULT_SHIFT = 8
+TARGETS = np.array([0.5, 1.0, 0.0, 0.5])
+SKIP_PLIES = 8
+FIXED = 'man'
+
+
+'''
+This function appends the quiet positions of the games in a record file to
+the training data and returns how many it wrote. Unfinished games are
+counted as draws.
+'''
+def add_records(path, writer):
+    written = 0
+    for game in read_games(path):
+        result = RESULTS.get(game['winner'], RESULTS['DRAW'])
+        bitboard = game['start'].copy()
+        for ply, squares in enumerate(game['moves']):
+            moves = bitboard.generate_moves(bitboard.side)
+            move = resolve_move(bitboard, squares)
+            if move is None:
+                break
+            if ply >= SKIP_PLIES and not move[2] and \
+                    not any(m[2] for m in moves):
+                writer.write(bitboard, result << RESULT_SHIFT)
+                written += 1
+            bitboard.make_move(move)
+    return written
+
+
+def features_path(data_path):
+    return data_path + '.features.npy'
+
+
+def chunk_features(args):
+    path, start, stop = args
+    with open(path, 'rb') as f:
+        f.seek(start * RECORD_SIZE)
+        data = f.read((stop - start) * RECORD_SIZE)
+    return features(from_buffer(data))
+
+
+'''
+This function works out the features and results of the training data on
+the pool's processes and saves them, memory-mapped, as a .npy file with one
+row per position: the features followed by the target result.
+'''
+def prepare(data_path, pool, chunk=100000):
+    count = os.path.getsize(data_path) // RECORD_SIZE
+    records = np.memmap(data_path, dtype='<u4', mode='r',
+                        shape=(count, 4))
+    table = np.lib.format.open_memmap(
+        features_path(data_path), mode='w+', dtype=np.float64,
+        shape=(count, len(FEATURES) + 1))
+    chunks = [(data_path, start, min(start + chunk, count))
+              for start in range(0, count, chunk)]
+    for (path, start, stop), values in zip(
+            chunks, pool.imap(chunk_features, chunks)):
+        table[start:stop, :-1] = values
+        table[start:stop, -1] = TARGETS[
+            (records[start:stop, 3] >> RESULT_SHIFT) & 3]
+    table.flush()
+    return count
+
+
+'''
+This function runs on a worker process. For the rows start to stop of the
+feature table it returns the sum of the squared errors and of their
+gradient with respect to each weight, for the given weights and K.
+'''
+def chunk_gradient(args):
+    path, start, stop, weights, k = args
+    table = np.load(path, mmap_mode='r')[start:stop]
+    x = table[:, :-1]
+    target = table[:, -1]
+    c = k * np.log(10) / 400
+    expected = 1 / (1 + np.exp(-c * (x @ weights)))
+    error = expected - target
+    slope = 2 * error * expected * (1 - expected) * c
+    return float(error @ error), slope @ x
+
+
+class Tuner:
+    def __init__(self, data_path, pool, chunk=200000):
+        self.path = features_path(data_path)
+        self.pool = pool
+        self.count = np.load(self.path, mmap_mode='r').shape[0]
+        self.chunks = [(start, min(start + chunk, self.count))
+                       for start in range(0, self.count, chunk)]
+
+    '''
+    This function returns the mean squared error and its gradient for
+    the weights (an array in the order of FEATURES) and K, adding up the
+    work of every chunk.
+    '''
+    def error(self, weights, k):
+        total = 0.0
+        gradient = np.zeros(len(FEATURES))
+        for chunk_error, chunk_gradient_sum in self.pool.imap_unordered(
+                chunk_gradient, [(self.path, start, stop, weights, k)
+                                 for start, stop in self.chunks]):
+            total += chunk_error
+            gradient += chunk_gradient_sum
+        return total / self.count, gradient / self.count
+
+    '''
+    This function finds the K that gives the smallest error for the
+    weights, by a golden section search.
+    '''
+    def fit_k(self, weights, low=0.1, high=10.0, steps=30):
+        ratio = (5 ** 0.5 - 1) / 2
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        error_a = self.error(weights, a)[0]
+        error_b = self.error(weights, b)[0]
+        for i in range(steps):
+            if error_a < error_b:
+                high, b, error_b = b, a, error_a
+                a = high - ratio * (high - low)
+                error_a = self.error(weights, a)[0]
+            else:
+                low, a, error_a = a, b, error_b
+                b = low + ratio * (high - low)
+                error_b = self.error(weights, b)[0]
+        return (low + high) / 2
+
+    '''
+    This function fits the weights with the Adam gradient method, keeping
+    the man weight fixed, and returns them as a dictionary with the final
+    error. report is called with the iteration, the error and the weights
+    every few iterations.
+    '''
+    def tune(self, weights, k, iterations=300, rate=1.0, report=None):
+        weights = np.array([weights[name] for name in FEATURES], dtype=float)
+        free = np.array([name != FIXED for name in FEATURES])
+        mean = np.zeros(len(FEATURES))
+        variance = np.zeros(len(FEATURES))
+        for i in range(1, iterations + 1):
+            error, gradient = self.error(weights, k)
+            gradient = gradient * free
+            mean = 0.9 * mean + 0.1 * gradient
+            variance = 0.999 * variance + 0.001 * gradient ** 2
+            step = rate * (mean / (1 - 0.9 ** i)) / \
+                (np.sqrt(variance / (1 - 0.999 ** i)) + 1e-12)
+            weights -= step
+            if report is not None and (i % 25 == 0 or i == iterations):
+                report(i, error, weights)
+        error = self.error(weights, k)[0]
+        tuned = {name: int(round(value))
+                 for name, value in zip(FEATURES, weights)}
+        return tuned, error
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fit the evaluation weights to the results of games.')
+    parser.add_argument('--data', required=True,
+                        help='training data file (packed positions)')
+    parser.add_argument('--records', nargs='*', default=[],
+                        help='game record files to add to the data')
+    parser.add_argument('--self-play', type=int, default=0, metavar='GAMES',
+                        help='play this many games and add them to the data')
+    parser.add_argument('--user', default='search:3')
+    parser.add_argument('--cpu', default='search:3')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tune', action='store_true')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default=WEIGHTS_PATH)
+    args = parser.parse_args()
+
+    records = list(args.records)
+    if args.self_play:
+        handle, path = tempfile.mkstemp(suffix='.pdn')
+        os.close(handle)
+        start = time.perf_counter()
+        self_play(path, args.self_play, args.user, args.cpu, seed=args.seed)
+        print('played %d games in %.1f s' %
+              (args.self_play, time.perf_counter() - start))
+        records.append(path)
+    if records:
+        with PositionWriter(args.data) as writer:
+            for path in records:
+                print('%s: %d positions' % (path, add_records(path, writer)))
+        if args.self_play:
+            os.remove(records[-1])
+
+    if args.tune:
+        with Pool(args.workers) as pool:
+            start = time.perf_counter()
+            count = prepare(args.data, pool)
+            print('features of %d positions in %.1f s' %
+                  (count, time.perf_counter() - start))
+            tuner = Tuner(args.data, pool)
+            start = time.perf_counter()
+            weights = dict(DEFAULT_WEIGHTS)
+            k = tuner.fit_k(np.array([weights[name] for name in FEATURES],
+                                     dtype=float))
+            print('K = %.3f' % k)
+
+            def report(i, error, values):
+                print('%4d  error %.6f  %s  (%.2f s per iteration)' %
+                      (i, error, ' '.join('%s %.1f' % item for item in
+                                          zip(FEATURES, values)),
+                       (time.perf_counter() - start) / i))
+            weights, error = tuner.tune(weights, k, args.iterations,
+                                        report=report)
+        save_weights(weights, args.out)
+        print('weights %s (error %.6f) saved to %s' %
+              (weights, error, args.out))
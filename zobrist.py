@@ -0,0 +1,35 @@
+import random
+
+'''
+The zobrist module contains the random 64-bit keys used to hash positions.
+The hash of a position is the XOR of one key for every piece on the board
+(chosen by its type and square) and, when it is the CPU's turn, SIDE_KEY.
+Because XOR is its own inverse, a move can update the hash by XORing out the
+keys of the pieces it removes and XORing in the keys of the pieces it adds,
+which is what BitBoard.make_move does. The keys come from a fixed seed so
+that hashes are the same from run to run and can be stored on disk.
+'''
+
+KINDS = ('USER', 'CPU', 'USER_KING', 'CPU_KING')
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+
+_rng = random.Random(0x636865636B657273)
+PIECE_KEYS = tuple(tuple(_rng.getrandbits(64) for sq in range(32))
+                   for kind in KINDS)
+SIDE_KEY = _rng.getrandbits(64)
+
+
+'''
+This function computes the hash of a position from scratch from its three
+masks and the side to move.
+'''
+def position_key(user, cpu, kings, side):
+    key = SIDE_KEY if side == 'CPU' else 0
+    for index, mask in ((0, user & ~kings), (1, cpu & ~kings),
+                        (2, user & kings), (3, cpu & kings)):
+        keys = PIECE_KEYS[index]
+        while mask:
+            low = mask & -mask
+            key ^= keys[low.bit_length() - 1]
+            mask ^= low
+    return key